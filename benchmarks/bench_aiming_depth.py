@@ -0,0 +1,110 @@
+"""AimingService の3次元座標計算のマイクロベンチマーク
+
+物体ごとに中心の1画素を読んで rs.rs2_deproject_pixel_to_point を呼ぶ従来の
+compute_object_coordinates と、全ボックスの深度をまとめて読み NumPy で逆投影する
+compute_object_coordinates_batch を、物体数 1 / 10 / 50 で比較する。
+深度画像には欠損 (0) の穴をランダムに開け、座標が (0,0,0) になった物体の割合も表示する。
+従来の処理の計測には pyrealsense2 が必要 (なければバッチ処理だけを計測する)。
+
+例:
+    python benchmarks/bench_aiming_depth.py --iterations 500 --hole_ratio 0.2
+"""
+
+import argparse
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from core_auto_app.detector.aiming.depth_sampling import deproject_pixels, sample_box_depths
+
+try:
+    import pyrealsense2 as rs
+except ImportError:
+    rs = None
+
+
+def make_intrinsics():
+    """D435 のカラー 1280x720 相当の内部パラメータ"""
+    values = dict(width=1280, height=720, ppx=640.0, ppy=360.0, fx=910.0, fy=910.0)
+    if rs is None:
+        return SimpleNamespace(model="none", coeffs=[0.0] * 5, **values)
+    intrinsics = rs.intrinsics()
+    for key, value in values.items():
+        setattr(intrinsics, key, value)
+    intrinsics.model = rs.distortion.inverse_brown_conrady
+    intrinsics.coeffs = [0.0] * 5
+    return intrinsics
+
+
+def make_scene(num_objects: int, hole_ratio: float, seed: int = 0):
+    """物体ごとに距離の異なる矩形を置き、欠損の穴を開けた深度画像とボックスを作る"""
+    rng = np.random.default_rng(seed)
+    depth = np.full((720, 1280), 6000, dtype=np.uint16)
+    boxes = []
+    for track_id in range(num_objects):
+        x1, y1 = rng.integers(0, 1200), rng.integers(0, 620)
+        x2, y2 = x1 + rng.integers(20, 80), y1 + rng.integers(40, 100)
+        depth[y1:y2, x1:x2] = rng.integers(1000, 5000)
+        boxes.append((int(x1), int(y1), int(x2), int(y2), track_id + 1))
+    depth[rng.random(depth.shape) < hole_ratio] = 0
+    return depth, boxes
+
+
+def legacy_coordinates(intrinsics, depth_image, tracked_objects):
+    """従来の AimingService.compute_object_coordinates と同じ処理"""
+    results = []
+    for (x1, y1, x2, y2, t_id) in tracked_objects:
+        cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
+        depth_value = depth_image[cy, cx]
+        if depth_value == 0:
+            results.append((t_id, 0.0, 0.0, 0.0))
+            continue
+        X, Y, Z = rs.rs2_deproject_pixel_to_point(intrinsics, [cx, cy], float(depth_value) / 1000.0)
+        results.append((t_id, X, Y, Z))
+    return results
+
+
+def batch_coordinates(intrinsics, depth_image, tracked_objects):
+    """AimingService.compute_object_coordinates_batch と同じ処理"""
+    objects = np.asarray(tracked_objects, dtype=np.float64)
+    depths = sample_box_depths(depth_image, objects[:, :4])
+    centers = np.floor((objects[:, :2] + objects[:, 2:4]) / 2)
+    valid = ~np.isnan(depths)
+    points = np.zeros((len(objects), 3))
+    points[valid] = deproject_pixels(intrinsics, centers[valid], depths[valid])
+    return [(int(t_id), *point) for t_id, point in zip(objects[:, 4], points.tolist())]
+
+
+def measure(func, intrinsics, depth, boxes, iterations):
+    """1回あたりの処理時間[ms]と、座標が求まらなかった物体の割合を返す"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        results = func(intrinsics, depth, boxes)
+    elapsed_ms = (time.perf_counter() - start) * 1000.0 / iterations
+    misses = sum(1 for (_, X, Y, Z) in results if Z == 0.0) / len(results)
+    return elapsed_ms, misses
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", default=500, type=int, help="number of calls per case")
+    parser.add_argument("--hole_ratio", default=0.2, type=float, help="ratio of invalid (zero) depth pixels")
+    args = parser.parse_args()
+
+    intrinsics = make_intrinsics()
+    if rs is None:
+        print("pyrealsense2 is not available: measuring the batched path only")
+    print(f"{'objects':>7} {'per-object [ms]':>16} {'batched [ms]':>13} {'miss (per-object)':>18} {'miss (batched)':>15}")
+    for num_objects in (1, 10, 50):
+        depth, boxes = make_scene(num_objects, args.hole_ratio)
+        batch_ms, batch_miss = measure(batch_coordinates, intrinsics, depth, boxes, args.iterations)
+        legacy_time, legacy_miss = f"{'-':>16}", f"{'-':>18}"
+        if rs is not None:
+            legacy_ms, miss = measure(legacy_coordinates, intrinsics, depth, boxes, args.iterations)
+            legacy_time, legacy_miss = f"{legacy_ms:>16.3f}", f"{miss:>18.1%}"
+        print(f"{num_objects:>7} {legacy_time} {batch_ms:>13.3f} {legacy_miss} {batch_miss:>15.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""弾道計算のマイクロベンチマーク
+
+射出速度ごとの表の作成時間と、表を引いて仰角とリード角を求める1回あたりの時間を、
+空気抵抗の有無で比較する。表の作成はマイコンから受信した射出速度がずれたときだけ別スレッドで行われ、
+毎フレームの照準では表を引く処理だけが実行される。
+
+例:
+    python benchmarks/bench_ballistics.py --iterations 100000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from core_auto_app.detector.aiming.ballistics import BallisticSolver
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", default=100000, type=int, help="number of solves per case")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    positions = np.stack(
+        [rng.uniform(-2, 2, 1000), rng.uniform(-1.5, 0.5, 1000), rng.uniform(1, 9, 1000)], axis=1
+    ).tolist()
+    velocities = rng.uniform(-2, 2, (1000, 3)).tolist()
+
+    print(f"{'drag [1/m]':>10} {'build [ms]':>11} {'solve [us]':>11} {'solve+lead [us]':>16} {'reachable':>10}")
+    for drag in (0.0, 0.05):
+        start = time.perf_counter()
+        solver = BallisticSolver(15.0, drag)
+        build_ms = (time.perf_counter() - start) * 1000.0
+
+        start = time.perf_counter()
+        for i in range(args.iterations):
+            solver.solve(positions[i % 1000])
+        solve_us = (time.perf_counter() - start) * 1e6 / args.iterations
+
+        start = time.perf_counter()
+        for i in range(args.iterations):
+            solver.solve(positions[i % 1000], velocities[i % 1000])
+        lead_us = (time.perf_counter() - start) * 1e6 / args.iterations
+
+        reachable = sum(solver.solve(p) is not None for p in positions) / len(positions)
+        print(f"{drag:>10.2f} {build_ms:>11.1f} {solve_us:>11.2f} {lead_us:>16.2f} {reachable:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""検出を別プロセスで行った場合のループのジッタのベンチマーク
+
+30fps でフレームを生成するカメラのスレッドと、周期 --period_ms で回るメインループ (表示・シリアル送信に相当) を動かし、
+前処理・後処理に Python の処理を多く含む擬似的な検出器を
+(1) 同じプロセスのスレッドで動かした場合、(2) DetectionWorker で別プロセスで動かした場合、
+(3) 検出なしの場合 のメインループの周期のずれ (平均・p99・最大) と、検出したフレーム数を比較する。
+
+例:
+    python benchmarks/bench_detection_process.py --seconds 5
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from core_auto_app.detector.detection_worker import DetectionWorker
+from core_auto_app.detector.tracker_utils import ObjectTracker
+from core_auto_app.detector.aiming.aiming_target_selector import AimingTargetSelector
+from core_auto_app.domain.frame_ring import FrameRing
+from core_auto_app.domain.messages import FrameData
+
+SHAPE = (720, 1280, 3)
+
+
+class PythonHeavyDetector:
+    """推論の代わりに縮小と閾値処理を行い、候補ごとの Python の後処理で GIL を保持する擬似的な検出器"""
+
+    def __init__(self, candidates=60000):
+        self.candidates = candidates
+
+    def predict(self, frame, target_classes=None):
+        small = frame[::8, ::8, 0].astype(np.float32)  # 前処理
+        ys, xs = np.nonzero(small > 128)
+        detections = []
+        # NMS の前の候補の絞り込みを Python で行う後処理に相当
+        for i in range(self.candidates):
+            score = (i * 7919 % 1000) / 1000.0
+            if score > 0.999 and len(xs):
+                detections.append((xs.min() * 8, ys.min() * 8, xs.max() * 8 + 8, ys.max() * 8 + 8, score, 0))
+        return detections
+
+
+class FakeCamera:
+    """30fps で明るい矩形が動くフレームを生成するカメラ"""
+
+    def __init__(self, fps=30.0):
+        self._period = 1.0 / fps
+        self._ring = FrameRing()
+        self._cond = threading.Condition()
+        self._frame_id = 0
+        self._latest = None
+        self._is_running = False
+        self._thread = None
+
+    def start(self):
+        self._is_running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._is_running = False
+        self._thread.join()
+
+    def _run(self):
+        next_time = time.perf_counter()
+        while self._is_running:
+            slot = self._ring.acquire(SHAPE)
+            slot.array.fill(0)
+            x = (self._frame_id * 8) % 1100
+            slot.array[300:400, x:x + 100] = 255
+            with self._cond:
+                self._ring.publish(slot)
+                self._frame_id += 1
+                self._latest = FrameData(self._frame_id, time.time() * 1000.0, self._ring.get_latest())
+                self._cond.notify_all()
+            next_time += self._period
+            time.sleep(max(next_time - time.perf_counter(), 0.0))
+
+    def wait_for_frame(self, last_frame_id, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frame_id > last_frame_id, timeout):
+                return None
+            return self._latest
+
+
+def run_thread_detection(camera, stop, counter):
+    """同じプロセスのスレッドで検出・追跡・照準対象の選択を行う"""
+    detector = PythonHeavyDetector()
+    tracker = ObjectTracker(fps=30.0)
+    selector = AimingTargetSelector()
+    last_frame_id = 0
+    while not stop.is_set():
+        frame_data = camera.wait_for_frame(last_frame_id, timeout=0.1)
+        if frame_data is None:
+            continue
+        last_frame_id = frame_data.frame_id
+        tracked_objects = tracker.update(detector.predict(frame_data.color, (0,)), frame_data.timestamp)
+        selector.select_target(tracked_objects)
+        counter[0] += 1
+
+
+def measure_loop(seconds, period_ms, get_results):
+    """周期 period_ms のループを回し、周期のずれ[ms]の配列を返す"""
+    intervals = []
+    period = period_ms / 1000.0
+    last = time.perf_counter()
+    next_time = last + period
+    end = last + seconds
+    while last < end:
+        time.sleep(max(next_time - time.perf_counter(), 0.0))
+        get_results()
+        now = time.perf_counter()
+        intervals.append(now - last)
+        last = now
+        next_time += period
+    return np.abs(np.array(intervals) * 1000.0 - period_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", default=5.0, type=float)
+    parser.add_argument("--period_ms", default=10.0, type=float, help="period of the main loop")
+    args = parser.parse_args()
+
+    for mode in ["none", "thread", "process"]:
+        camera = FakeCamera()
+        camera.start()
+        stop = threading.Event()
+        counter = [0]
+        get_results = lambda: None
+        worker = None
+        if mode == "thread":
+            thread = threading.Thread(target=run_thread_detection, args=(camera, stop, counter), daemon=True)
+            thread.start()
+        elif mode == "process":
+            worker = DetectionWorker(PythonHeavyDetector)
+            worker.start()
+            worker.wait_until_ready()
+            worker.set_source(lambda last_frame_id: camera.wait_for_frame(last_frame_id, timeout=0.1))
+            get_results = worker.get_detection_results
+
+        jitter = measure_loop(args.seconds, args.period_ms, get_results)
+
+        stop.set()
+        if worker is not None:
+            counter[0] = worker.get_stats()["detected"]
+            worker.stop()
+        camera.stop()
+        print(
+            f"{mode:8s}: loop jitter mean {jitter.mean():.3f} ms, p99 {np.percentile(jitter, 99):.3f} ms, "
+            f"max {jitter.max():.3f} ms, detected {counter[0] / args.seconds:.1f} fps"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""推論バックエンドごとのYOLOXDetector.predictのレイテンシ比較
+
+同一フレームを各バックエンドで繰り返し推論し、1フレームあたりの処理時間を比較する。
+
+例:
+    python benchmarks/bench_detector_backends.py \
+        --weight_path models/yolox_s/phase1_2_best_ckpt.pth \
+        --onnx_path models/yolox_s/phase1_2_best_ckpt.onnx
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from core_auto_app.detector.object_detector import YOLOXDetector
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weight_path", required=True, type=str, help="YOLOX weight file (.pth)")
+    parser.add_argument("--onnx_path", default=None, type=str, help="exported ONNX model (.onnx)")
+    parser.add_argument("--image", default=None, type=str, help="input image (random frame if omitted)")
+    parser.add_argument("--backends", default=["cuda", "cpu", "onnx"], nargs="+", help="backends to compare")
+    parser.add_argument("--warmup", default=5, type=int, help="number of warm-up iterations")
+    parser.add_argument("--iterations", default=50, type=int, help="number of measured iterations")
+    return parser.parse_args()
+
+
+def measure(detector: YOLOXDetector, frame: np.ndarray, warmup: int, iterations: int) -> np.ndarray:
+    """predict()の処理時間[ms]を計測する"""
+    for _ in range(warmup):
+        detector.predict(frame)
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        detector.predict(frame)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    return np.array(latencies)
+
+
+def main():
+    args = parse_args()
+
+    # 全バックエンドで同一のフレームを使う
+    if args.image is not None:
+        frame = cv2.resize(cv2.imread(args.image), (1280, 720))
+    else:
+        frame = np.random.default_rng(0).integers(0, 256, (720, 1280, 3), dtype=np.uint8)
+
+    print(f"{'backend':>8} {'mean[ms]':>10} {'p50[ms]':>10} {'p95[ms]':>10}")
+    for backend in args.backends:
+        model_path = args.onnx_path if backend == "onnx" else args.weight_path
+        if model_path is None:
+            print(f"{backend:>8} skipped (model path is not specified)")
+            continue
+        try:
+            detector = YOLOXDetector(model_path, backend=backend)
+        except (RuntimeError, ImportError) as err:
+            print(f"{backend:>8} skipped ({err})")
+            continue
+        latencies = measure(detector, frame, args.warmup, args.iterations)
+        print(
+            f"{backend:>8} {latencies.mean():>10.2f} "
+            f"{np.percentile(latencies, 50):>10.2f} {np.percentile(latencies, 95):>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
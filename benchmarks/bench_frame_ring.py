@@ -0,0 +1,66 @@
+"""フレームの受け渡しのマイクロベンチマーク
+
+USBカメラの1フレームあたりの処理を再現し、1280x720 のカラー画像について
+従来の方式 (読み込みごとに新しい配列を確保し、表示と検出の読み出しごとにコピーする) と
+FrameRing (事前に確保したスロットに書き込み、読み出し側には読み取り専用の配列を渡し、
+描画する表示側だけがコピーする) の処理時間と、1フレームあたりに確保・コピーするバイト数を比較する。
+デコードは画像を埋める処理で代用する。
+
+例:
+    python benchmarks/bench_frame_ring.py --frames 300
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from core_auto_app.domain.frame_ring import FrameRing, writable
+
+SHAPE = (720, 1280, 3)
+
+
+def legacy_frame(value: int):
+    """従来の UsbCamera: read() ごとに確保し、get_frame() と wait_for_frame() でコピーする"""
+    frame = np.empty(SHAPE, dtype=np.uint8)
+    frame.fill(value)
+    display = frame.copy()
+    detection = frame.copy()
+    return display, detection
+
+
+def ring_frame(ring: FrameRing, value: int):
+    """FrameRing: スロットに直接書き込み、表示側だけが描画前にコピーする"""
+    slot = ring.acquire(SHAPE)
+    slot.array.fill(value)
+    ring.publish(slot)
+    display = writable(ring.get_latest())
+    detection = ring.get_latest()
+    return display, detection
+
+
+def measure(func, frames: int) -> float:
+    """1フレームあたりの処理時間[ms]"""
+    start = time.perf_counter()
+    for i in range(frames):
+        func(i % 256)
+    return (time.perf_counter() - start) * 1000.0 / frames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", default=300, type=int, help="number of frames per case")
+    args = parser.parse_args()
+
+    frame_mb = np.prod(SHAPE) / 1e6
+    ring = FrameRing()
+    legacy_ms = measure(legacy_frame, args.frames)
+    ring_ms = measure(lambda value: ring_frame(ring, value), args.frames)
+    print(f"{'method':>8} {'[ms/frame]':>11} {'allocated [MB/frame]':>21} {'copied [MB/frame]':>18}")
+    print(f"{'legacy':>8} {legacy_ms:>11.3f} {3 * frame_mb:>21.1f} {2 * frame_mb:>18.1f}")
+    print(f"{'ring':>8} {ring_ms:>11.3f} {frame_mb:>21.1f} {frame_mb:>18.1f}")
+    print(f"frame ring: {ring.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
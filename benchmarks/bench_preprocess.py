@@ -0,0 +1,75 @@
+"""検出器の前処理のマイクロベンチマーク
+
+YOLOXのpreproc + torch.from_numpy(...).unsqueeze(0).float() による従来の前処理と、
+事前確保バッファを使う FramePreprocessor を比較し、
+1フレームあたりの処理時間とメモリ確保量 (tracemalloc) を表示する。
+
+例:
+    python benchmarks/bench_preprocess.py --iterations 200
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import torch
+from yolox.data.data_augment import preproc
+
+from core_auto_app.detector.preprocess import FramePreprocessor
+
+INPUT_SIZE = (704, 1280)
+
+
+def legacy_preprocess(frame: np.ndarray):
+    """従来の前処理 (YOLOXDetector.predict の旧実装と同じ)"""
+    img, ratio = preproc(frame, INPUT_SIZE)
+    img = torch.from_numpy(img).unsqueeze(0)
+    return img.float(), ratio
+
+
+def buffered_preprocess(preprocessor: FramePreprocessor):
+    def run(frame: np.ndarray):
+        img, ratio, _ = preprocessor(frame)
+        return torch.from_numpy(img), ratio
+
+    return run
+
+
+def measure(func, frame: np.ndarray, iterations: int):
+    """1フレームあたりの処理時間[ms]と確保メモリ量[MB]を返す"""
+    func(frame)  # バッファ確保などの初回処理は計測しない
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(frame)
+    elapsed_ms = (time.perf_counter() - start) * 1000.0 / iterations
+
+    tracemalloc.start()
+    func(frame)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    allocated_mb = peak / 1024 / 1024
+    return elapsed_ms, allocated_mb
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", default=200, type=int, help="number of measured iterations")
+    args = parser.parse_args()
+
+    frame = np.random.default_rng(0).integers(0, 256, (720, 1280, 3), dtype=np.uint8)
+    cases = {
+        "preproc (legacy)": legacy_preprocess,
+        "buffer (resize)": buffered_preprocess(FramePreprocessor(INPUT_SIZE, crop_tolerance=0)),
+        "buffer (crop)": buffered_preprocess(FramePreprocessor(INPUT_SIZE)),
+    }
+
+    print(f"{'method':>18} {'time[ms]':>10} {'alloc[MB]':>10}")
+    for name, func in cases.items():
+        elapsed_ms, allocated_mb = measure(func, frame, args.iterations)
+        print(f"{name:>18} {elapsed_ms:>10.2f} {allocated_mb:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
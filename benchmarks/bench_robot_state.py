@@ -0,0 +1,115 @@
+"""ロボットの状態の読み出し・更新のコストのベンチマーク
+
+Application.spin() はループのたびに get_robot_state() を呼び、受信スレッドは受信した行ごとに状態を作る。
+以前の実装 (pydantic の RobotState をロック付きで保持し、読み出しのたびに deepcopy する) と、
+読み取り専用のスナップショット (RobotStateSnapshot) を参照ごと差し替える実装について、
+1回の読み出しと1回の更新 (受信した値から状態を作って差し替える) の時間を比較する。
+受信スレッドが更新し続けている間の読み出しの時間も計測する。
+
+例:
+    PYTHONPATH=src python benchmarks/bench_robot_state.py --iterations 100000
+"""
+
+import argparse
+import threading
+import time
+from copy import deepcopy
+
+from core_auto_app.domain.messages import RobotState, RobotStateId, RobotStateSnapshot
+from core_auto_app.infra.serial_protocol import robot_state_from_fields
+
+FIELDS = (2, 153, 12345, 3, 4, 1, 0b1101, 0)
+
+
+def model_from_fields(state_id, pitch, muzzle_velocity, left, right, video_id, flags, reserved) -> RobotState:
+    """以前の実装と同じく、受信した値から pydantic のモデルを作る"""
+    return RobotState(
+        state_id=RobotStateId(state_id),
+        pitch_deg=pitch / 10.0,
+        muzzle_velocity=muzzle_velocity / 1000,
+        reloaded_left_disks=left,
+        reloaded_right_disks=right,
+        video_id=video_id,
+        target_panel=bool((flags >> 3) & 0b00000001),
+        auto_aim=bool((flags >> 2) & 0b00000001),
+        record_video=bool((flags >> 1) & 0b00000001),
+        ready_to_fire=bool((flags >> 0) & 0b00000001),
+        reserved=reserved,
+    )
+
+
+class LockedModelStore:
+    """以前の実装: ロックの中で差し替え、読み出しのたびに deepcopy する"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = RobotState()
+
+    def update(self, fields):
+        state = model_from_fields(*fields)
+        with self._lock:
+            self._state = state
+
+    def get(self):
+        with self._lock:
+            return deepcopy(self._state)
+
+
+class SnapshotStore:
+    """新しい実装: スナップショットの参照を差し替え、そのまま返す"""
+
+    def __init__(self):
+        self._state = RobotStateSnapshot()
+
+    def update(self, fields):
+        self._state = robot_state_from_fields(*fields)
+
+    def get(self):
+        return self._state
+
+
+def measure(function, count):
+    """1回あたりの処理時間[us]を返す"""
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return (time.perf_counter() - start) * 1e6 / count
+
+
+def measure_contended_read(store, count):
+    """別スレッドが100Hzで更新している間の読み出し1回あたりの時間[us]を返す"""
+    stop = threading.Event()
+
+    def update_loop():
+        while not stop.is_set():
+            store.update(FIELDS)
+            time.sleep(0.01)
+
+    thread = threading.Thread(target=update_loop, daemon=True)
+    thread.start()
+    try:
+        return measure(store.get, count)
+    finally:
+        stop.set()
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", default=100000, type=int)
+    args = parser.parse_args()
+    n = args.iterations
+
+    for name, store in (("pydantic+lock+deepcopy", LockedModelStore()), ("snapshot", SnapshotStore())):
+        store.update(FIELDS)
+        read_us = measure(store.get, n)
+        update_us = measure(lambda: store.update(FIELDS), n)
+        contended_us = measure_contended_read(store, n)
+        print(
+            f"{name:22s}: read {read_us:7.3f} us, update {update_us:7.3f} us, "
+            f"read while updating at 100Hz {contended_us:7.3f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
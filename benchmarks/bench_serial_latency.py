@@ -0,0 +1,87 @@
+"""シリアル通信の送信遅延のベンチマーク ("polling" と "event" の比較)
+
+pty の組 (os.openpty) をシリアルポートの代わりに使い、SerialRobotDriver.set_send_values() で
+新しい値を設定してから、その値の行が pty のマスター側に届くまでの時間を計測する。
+照準の更新はループと無関係なタイミングで届くので、値を設定する間隔はランダムにずらす。
+(tests/test_serial_robot_driver.py は socat で pty の組を作るが、ここでは socat を使わない)
+
+例:
+    PYTHONPATH=src python benchmarks/bench_serial_latency.py --updates 300
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import selectors
+import time
+import tty
+
+import numpy as np
+
+from core_auto_app.infra.serial_robot_driver import SerialRobotDriver
+
+
+def wait_for_line(master: int, buffer: bytearray, expected: bytes, timeout: float = 1.0) -> bool:
+    """expected の行がマスター側に届くまで読む"""
+    deadline = time.perf_counter() + timeout
+    with selectors.DefaultSelector() as selector:
+        selector.register(master, selectors.EVENT_READ)
+        while True:
+            end = buffer.rfind(b"\n")
+            if end >= 0:
+                lines = buffer[:end].split(b"\n")
+                del buffer[:end + 1]
+                if expected in lines:
+                    return True
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return False
+            if selector.select(remaining):
+                buffer += os.read(master, 4096)
+
+
+def measure(io_mode: str, updates: int, max_send_rate_hz: float):
+    """値の設定から到着までの遅延[ms]のリストを返す"""
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    buffer = bytearray()
+    latencies = []
+    # 計測結果と混ざらないように、ドライバの表示 (通信の要約など) は捨てる
+    with contextlib.redirect_stdout(io.StringIO()):
+        driver = SerialRobotDriver(os.ttyname(slave), io_mode=io_mode, max_send_rate_hz=max_send_rate_hz)
+        try:
+            time.sleep(0.1)
+            for i in range(1, updates + 1):
+                time.sleep(random.uniform(0.005, 0.025))
+                start = time.perf_counter()
+                driver.set_send_values(i, 0, 0, 0)
+                if wait_for_line(master, buffer, f"{i},0,0,0".encode()):
+                    latencies.append((time.perf_counter() - start) * 1000.0)
+        finally:
+            driver.close()
+            os.close(master)
+            os.close(slave)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", default=300, type=int)
+    parser.add_argument("--max_send_rate_hz", default=200.0, type=float)
+    args = parser.parse_args()
+
+    random.seed(0)
+    for io_mode in ("polling", "event"):
+        latencies = np.array(measure(io_mode, args.updates, args.max_send_rate_hz))
+        print(
+            f"{io_mode:7s}: received {len(latencies)}/{args.updates}, "
+            f"mean {latencies.mean():6.2f} ms, p50 {np.percentile(latencies, 50):6.2f} ms, "
+            f"p99 {np.percentile(latencies, 99):6.2f} ms, max {latencies.max():6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""シリアル通信の形式ごとの解析速度のマイクロベンチマーク
+
+マイコンから 100Hz で届くロボットの状態を想定し、ASCII 形式 (カンマ区切りの行) とバイナリ形式
+(同期ヘッダ・バージョン・struct で詰めたペイロード・CRC16) について、ストリーミングデコーダで
+値のタプルを取り出すまでの時間と、RobotState を作るまでの時間、送信値を1つ作る時間を比較する。
+
+例:
+    python benchmarks/bench_serial_protocol.py --messages 20000
+"""
+
+import argparse
+import time
+
+from core_auto_app.infra.serial_protocol import (
+    AsciiCodec,
+    BinaryCodec,
+    BinaryFrameDecoder,
+    MSG_STATE,
+    encode_frame,
+    parse_ascii_fields,
+)
+
+FIELDS = (2, 153, 12345, 3, 4, 1, 0b1101, 0)
+
+
+def measure(function, count):
+    """1件あたりの処理時間[us]を返す"""
+    start = time.perf_counter()
+    function()
+    return (time.perf_counter() - start) * 1e6 / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", default=20000, type=int)
+    args = parser.parse_args()
+    n = args.messages
+
+    line = ",".join(str(v) for v in FIELDS).encode() + b"\n"
+    frame = encode_frame(MSG_STATE, *FIELDS)
+    # 1回の読み込みで数件ずつ届く場合を想定して、4件ずつまとめて渡す
+    ascii_chunks = [line * 4] * (n // 4)
+    binary_chunks = [frame * 4] * (n // 4)
+
+    def ascii_fields():
+        buffer = bytearray()
+        for chunk in ascii_chunks:
+            buffer += chunk
+            end = buffer.rfind(b"\n")
+            for part in buffer[:end].split(b"\n"):
+                parse_ascii_fields(part)
+            del buffer[:end + 1]
+
+    def binary_fields():
+        decoder = BinaryFrameDecoder()
+        for chunk in binary_chunks:
+            decoder.feed(chunk)
+
+    def ascii_states():
+        codec = AsciiCodec()
+        for chunk in ascii_chunks:
+            codec.feed(chunk)
+
+    def binary_states():
+        codec = BinaryCodec()
+        for chunk in binary_chunks:
+            codec.feed(chunk)
+
+    values = (640, 360, 12, 95)
+    ascii_codec, binary_codec = AsciiCodec(), BinaryCodec()
+
+    print(f"message size: ascii {len(line)} bytes, binary {len(frame)} bytes")
+    print(f"decode to fields     : ascii {measure(ascii_fields, n):6.2f} us, binary {measure(binary_fields, n):6.2f} us")
+    print(f"decode to RobotState : ascii {measure(ascii_states, n):6.2f} us, binary {measure(binary_states, n):6.2f} us")
+    print(
+        f"encode command       : ascii {measure(lambda: [ascii_codec.encode_command(values) for _ in range(n)], n):6.2f} us, "
+        f"binary {measure(lambda: [binary_codec.encode_command(values) for _ in range(n)], n):6.2f} us"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""照準対象の選択のマイクロベンチマーク
+
+物体ごとに辞書を作って距離を計算する従来の AimingTargetSelector.select_target と、
+全候補のコストを NumPy でまとめて計算する現在の select_target (全ての重みを有効にしたもの) を、
+候補数 1 / 10 / 100 / 1000 で比較し、1回あたりの処理時間を表示する。
+
+例:
+    python benchmarks/bench_target_selector.py --iterations 2000
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+
+from core_auto_app.detector.aiming.aiming_target_selector import AimingTargetSelector
+
+
+class LegacyAimingTargetSelector:
+    """従来の AimingTargetSelector.select_target と同じ処理"""
+
+    def __init__(self, image_center=(640, 360)):
+        self.image_center = image_center
+        self.prev_target_id = None
+
+    def select_target(self, tracked_objects):
+        center_x, center_y = self.image_center
+        obj_list = []
+        for (x1, y1, x2, y2, t_id) in tracked_objects:
+            cx = (x1 + x2) // 2
+            cy = (y1 + y2) // 2
+            dx = cx - center_x
+            dy = cy - center_y
+            obj_list.append({'t_id': t_id, 'cx': cx, 'cy': cy, 'dist': math.sqrt(dx*dx + dy*dy), 'width': x2 - x1})
+        min_dist = min(o['dist'] for o in obj_list)
+        tie_list = [o for o in obj_list if abs(o['dist'] - min_dist) < 1e-9]
+        if len(tie_list) == 1:
+            chosen = tie_list[0]
+        else:
+            tie_list_id_match = [o for o in tie_list if o['t_id'] == self.prev_target_id]
+            if len(tie_list_id_match) == 1:
+                chosen = tie_list_id_match[0]
+            elif len(tie_list_id_match) > 1:
+                chosen = max(tie_list_id_match, key=lambda x: x['width'])
+            else:
+                chosen = max(tie_list, key=lambda x: x['width'])
+        self.prev_target_id = chosen['t_id']
+        return (chosen['cx'], chosen['cy'])
+
+
+def make_candidates(num_candidates: int, seed: int = 0):
+    """画像内にランダムに置いたトラッキング結果と深度を作る"""
+    rng = np.random.default_rng(seed)
+    x1 = rng.integers(0, 1200, num_candidates)
+    y1 = rng.integers(0, 620, num_candidates)
+    w = rng.integers(10, 80, num_candidates)
+    h = rng.integers(20, 100, num_candidates)
+    objects = [
+        (int(a), int(b), int(a + c), int(b + d), i + 1) for i, (a, b, c, d) in enumerate(zip(x1, y1, w, h))
+    ]
+    return objects, rng.uniform(0.5, 8.0, num_candidates)
+
+
+def measure(func, iterations: int) -> float:
+    """1回あたりの処理時間[us]"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) * 1e6 / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", default=2000, type=int, help="number of selections per case")
+    args = parser.parse_args()
+
+    print(f"{'candidates':>10} {'legacy [us]':>12} {'distance only [us]':>19} {'all weights [us]':>17}")
+    for num_candidates in (1, 10, 100, 1000):
+        objects, depths = make_candidates(num_candidates)
+        legacy = LegacyAimingTargetSelector()
+        distance_only = AimingTargetSelector()
+        all_weights = AimingTargetSelector(
+            weights={"distance": 1.0, "size": 0.2, "depth": 0.3, "age": 0.1, "stickiness": 0.05}
+        )
+        legacy_us = measure(lambda: legacy.select_target(objects), args.iterations)
+        distance_us = measure(lambda: distance_only.select_target(objects), args.iterations)
+        all_us = measure(lambda: all_weights.select_target(objects, depths), args.iterations)
+        print(f"{num_candidates:>10} {legacy_us:>12.1f} {distance_us:>19.1f} {all_us:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
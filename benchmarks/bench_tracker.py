@@ -0,0 +1,131 @@
+"""トラッカーのマイクロベンチマーク
+
+motpy + 組ごとのIoU計算による従来の ObjectTracker と、配列ベースの VectorizedTracker を使う
+現在の ObjectTracker を、物体数 1 / 10 / 50 で比較し、1回の update() あたりの処理時間と
+両者の出力の一致率を表示する。motpy が必要。
+
+例:
+    python benchmarks/bench_tracker.py --frames 300
+"""
+
+import argparse
+import time
+
+import numpy as np
+from motpy import Detection, MultiObjectTracker
+
+from core_auto_app.detector.tracker_utils import ObjectTracker, compute_iou
+
+
+class LegacyObjectTracker:
+    """従来の ObjectTracker.update (motpy) と同じ処理"""
+
+    def __init__(self, fps=30.0):
+        self.tracker = MultiObjectTracker(
+            dt=1/fps,
+            model_spec={
+                'order_pos': 1, 'dim_pos': 2,
+                'order_size': 0, 'dim_size': 2,
+                'q_var_pos': 5000., 'r_var_pos': 0.1
+            }
+        )
+        self.track_id_counter = 1
+        self.track_ids = {}
+        self.track_cls = {}
+
+    def update(self, detections):
+        motpy_dets = []
+        for (x1, y1, x2, y2, score, cls_id) in detections:
+            d = Detection(box=[x1, y1, x2, y2], score=score)
+            d.cls_id = cls_id
+            motpy_dets.append(d)
+        self.tracker.step(motpy_dets)
+        tracks = self.tracker.active_tracks()
+
+        results = []
+        self.track_cls = {}
+        for track in tracks:
+            if track.id not in self.track_ids:
+                self.track_ids[track.id] = self.track_id_counter
+                self.track_id_counter += 1
+            box = list(map(int, track.box))
+            results.append((box[0], box[1], box[2], box[3], self.track_ids[track.id]))
+            best_iou = 0.0
+            best_cls = None
+            for (x1, y1, x2, y2, score, cls_id) in detections:
+                iou = compute_iou(box, [x1, y1, x2, y2])
+                if iou > best_iou:
+                    best_iou = iou
+                    best_cls = cls_id
+            self.track_cls[track.id] = best_cls if best_iou > 0.3 else None
+        return results
+
+
+def make_sequence(num_objects: int, frames: int, seed: int = 0):
+    """格子状に並んだ物体が等速で動く検出結果の列を作る (時々検出漏れを入れる)"""
+    rng = np.random.default_rng(seed)
+    cols = int(np.ceil(np.sqrt(num_objects)))
+    spacing = 1200 / cols
+    start = np.array([(40 + (i % cols) * spacing, 40 + (i // cols) * spacing * 0.5) for i in range(num_objects)])
+    velocity = rng.uniform(-1.0, 1.0, size=(num_objects, 2))
+    size = np.array([20.0, 60.0])
+    sequence = []
+    for t in range(frames):
+        detections = []
+        for i in range(num_objects):
+            if rng.random() < 0.05:
+                continue
+            x, y = start[i] + velocity[i] * t + rng.normal(0, 0.5, size=2)
+            detections.append((int(x), int(y), int(x + size[0]), int(y + size[1]), 0.9, i % 2))
+        sequence.append(detections)
+    return sequence
+
+
+def measure(tracker, sequence):
+    """1回の update() あたりの処理時間[ms]と全フレームの出力を返す"""
+    outputs = []
+    start = time.perf_counter()
+    for detections in sequence:
+        outputs.append(tracker.update(detections))
+    elapsed_ms = (time.perf_counter() - start) * 1000.0 / len(sequence)
+    return elapsed_ms, outputs
+
+
+def agreement(outputs_a, outputs_b) -> float:
+    """ボックスが一致し、トラックIDの対応が全フレームで矛盾しないフレームの割合
+
+    同じフレームで生まれたトラックへのIDの振り方は実装によって異なるので、IDは対応関係で比較する
+    """
+    id_map = {}
+    same = 0
+    for a, b in zip(outputs_a, outputs_b):
+        boxes_a = {obj[:4]: obj[4] for obj in a}
+        boxes_b = {obj[:4]: obj[4] for obj in b}
+        if len(a) != len(b) or boxes_a.keys() != boxes_b.keys():
+            continue
+        consistent = True
+        for box, id_a in boxes_a.items():
+            if id_map.setdefault(id_a, boxes_b[box]) != boxes_b[box]:
+                consistent = False
+        same += consistent
+    return same / len(outputs_a)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", default=300, type=int, help="number of tracker updates per case")
+    args = parser.parse_args()
+
+    print(f"{'objects':>7} {'motpy [ms]':>11} {'vectorized [ms]':>16} {'speedup':>8} {'agreement':>10}")
+    for num_objects in (1, 10, 50):
+        sequence = make_sequence(num_objects, args.frames)
+        legacy_ms, legacy_outputs = measure(LegacyObjectTracker(fps=30.0), sequence)
+        vectorized_ms, vectorized_outputs = measure(ObjectTracker(fps=30.0), sequence)
+        print(
+            f"{num_objects:>7} {legacy_ms:>11.3f} {vectorized_ms:>16.3f} "
+            f"{legacy_ms / vectorized_ms:>7.1f}x {agreement(legacy_outputs, vectorized_outputs):>9.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""USBカメラの待機モードで節約できるCPU時間のマイクロベンチマーク
+
+V4L2 のキャプチャでは grab() はドライバのバッファを取り出すだけで、MJPG のデコードと
+BGR への変換は retrieve() で行われる。そこで 1280x720 の JPEG を用意し、
+待機中のカメラが省略する retrieve() の処理 (JPEG のデコード) の1フレームあたりの時間を測る。
+30fps の2台のカメラのうち1台を待機させたときに、1秒あたりに空くCPU時間も表示する。
+(動画ファイルを開く FFMPEG バックエンドは grab() でデコードするので、動画ファイルでは差が出ない)
+
+例:
+    python benchmarks/bench_usb_standby.py --frames 300
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+
+def make_jpeg(width=1280, height=720, quality=90):
+    """ノイズを含む画像の JPEG を作る (一様な画像だとデコードが軽くなりすぎるため)"""
+    rng = np.random.default_rng(0)
+    image = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (5, 5), 0)
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    assert ok
+    return encoded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", default=300, type=int)
+    parser.add_argument("--fps", default=30.0, type=float, help="frame rate of the standby camera")
+    args = parser.parse_args()
+
+    encoded = make_jpeg()
+    cv2.imdecode(encoded, cv2.IMREAD_COLOR)  # 初回の確保を除く
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    for _ in range(args.frames):
+        cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+    wall = (time.perf_counter() - start) * 1000.0 / args.frames
+    cpu = (time.process_time() - cpu_start) * 1000.0 / args.frames
+
+    print(f"jpeg size          : {len(encoded) / 1024:.0f} KiB")
+    print(f"retrieve (decode)  : {wall:.3f} ms/frame (cpu {cpu:.3f} ms/frame)")
+    print(f"saved per standby camera at {args.fps:.0f} fps: {cpu * args.fps:.1f} ms of cpu per second")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,15 +6,24 @@ from core_auto_app.application.interfaces import (
     RobotDriver,
 )
 from core_auto_app.domain.messages import Command
+from core_auto_app.domain.frame_ring import writable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional
 import time
 import cv2
 
+if TYPE_CHECKING:
+    from core_auto_app.detector.aiming.ballistics import BallisticSolver
+
 class Application(ApplicationInterface):
     """Implementation for the CoRE auto-pilot application.
        トラッキング対象物体の中心ピクセル座標を画面に表示するだけ。
        奥行き情報(深度)・3次元変換は不要。
     """
 
+    # Realsenseの表示で、検出に使ったフレームが最新のフレームから何フレームまで遅れていたら検出に使ったフレームを表示するか
+    MAX_DETECTION_LAG_FRAMES = 3
+
     def __init__(
         self,
         realsense_camera: Camera,
@@ -23,29 +32,50 @@ class Application(ApplicationInterface):
         presenter: Presenter,
         robot_driver: RobotDriver,
         # 重い検出処理はrealsense_camera側で行うので、ここでは重みの初期化は不要
+        ballistic_solver: Optional["BallisticSolver"] = None,
+        send_latency_info: bool = False,
     ):
+        """
+        送信値の3, 4番目は既定では0, 0 (意味はREADMEの「マイコンへの送信値」を参照)
+
+        ballistic_solver: 指定すると、送信値の3, 4番目を弾道を考慮した仰角と水平方向のリード角
+            (どちらも[deg]の10倍) にする (send_latency_info より優先)
+        send_latency_info: Trueなら送信値の3, 4番目を撮影から送信までの見込みの遅延[ms]と照準点の信頼度[%] にする
+            (--latency_compensation を指定したときのみ)
+        """
         self._realsense_camera = realsense_camera
         self._a_camera = a_camera
         self._b_camera = b_camera
         self._presenter = presenter
         self._robot_driver = robot_driver
+        self._ballistic_solver = ballistic_solver
+        self._send_latency_info = send_latency_info
 
         self._is_recording = False
+        self._is_started = False
 
         # Application側では、Realsenseで計算された検出結果を参照する
         self.aiming_target = (0, 0)  # (cx, cy) を入れる想定
 
+    def start(self):
+        """各カメラを並列に開始する (spin() の前に呼べば起動を早められる。2回目以降は何もしない)"""
+        if self._is_started:
+            return
+        cameras = [self._realsense_camera, self._a_camera, self._b_camera]
+        with ThreadPoolExecutor(max_workers=len(cameras)) as executor:
+            for future in [executor.submit(camera.start) for camera in cameras]:
+                future.result()
+        self._is_started = True
+
     def spin(self):
         # 各カメラ開始
-        self._a_camera.start()
-        self._b_camera.start()
-        self._realsense_camera.start()
+        self.start()
 
         # フレーム計測開始
         prev_time = time.time()
         frame_count = 0
         fps = 0.0  # 初期値を設定
-        prev_frame_hash = None
+        prev_frame_id = None
 
         while True:
             # ロボットの状態取得
@@ -59,37 +89,103 @@ class Application(ApplicationInterface):
                 self._realsense_camera.stop_recording()
                 self._is_recording = False
             self._realsense_camera.set_target_panel(robot_state.target_panel)  # 照準対象のパネルの色を設定
+            self._realsense_camera.set_robot_state_id(robot_state.state_id)  # 待機中は推論を間引く
+            self._a_camera.set_target_panel(robot_state.target_panel)
+            self._b_camera.set_target_panel(robot_state.target_panel)
+            if self._ballistic_solver is not None:
+                # 射出速度が変わったら弾道の表を作り直す
+                self._ballistic_solver.set_muzzle_velocity(robot_state.muzzle_velocity)
+                # カメラが発射機と一緒に上下する場合は、標的の座標を発射機の仰角だけ回して水平にする
+                self._ballistic_solver.set_launcher_pitch(robot_state.pitch_deg)
+
+            # 表示していないUSBカメラは待機させる (待機の設定がないカメラでは何もしない)
+            self._a_camera.set_active(robot_state.video_id not in (1, 2))
+            self._b_camera.set_active(robot_state.video_id == 1)
 
             # カメラ画像取得 (video_idで切り替え)
-            if robot_state.video_id == 0:
-                color = self._a_camera.get_image()
-            elif robot_state.video_id == 1:
-                color = self._b_camera.get_image()
-            elif robot_state.video_id == 2:
-                color, depth = self._realsense_camera.get_images()
-                # Realsense側で常時検出している結果を取得して描画する
+            display_target = None  # 表示中のUSBカメラで選んだ照準対象 (表示のみに使い、マイコンには送らない)
+            frame = None
+            if robot_state.video_id == 2:
+                # Realsense側で常時検出している結果は、検出に使ったフレームが新しければそのフレームに描画する
+                frame = self._realsense_camera.get_frame()
+                detection_frame = self._realsense_camera.get_detection_frame()
                 detection_results = self._realsense_camera.get_detection_results()
-                if detection_results is not None:
+                if (
+                    detection_frame is not None
+                    and detection_results is not None
+                    and (frame is None or frame.frame_id - detection_frame.frame_id <= self.MAX_DETECTION_LAG_FRAMES)
+                ):
+                    frame = detection_frame
+                    color = writable(detection_frame.color)  # 検出結果と共有しているので描画前にコピーする
                     self._realsense_camera.draw_detection_results(color, detection_results)
+                else:
+                    # 検出が遅れている (CPU推論・動き検出で間引いている・別プロセスなど) 場合は表示を止めず、
+                    # 最新のフレームに各トラックをそのフレームの時刻まで外挿したボックスを描画する
+                    color = writable(frame.color) if frame is not None else None
+                    if frame is not None and detection_results is not None:
+                        predicted_results = self._realsense_camera.get_predicted_detection_results(frame.timestamp)
+                        self._realsense_camera.draw_detection_results(color, predicted_results)
             else:
                 # デフォルトでカメラA表示
-                color = self._a_camera.get_image()
-
-            # Realsenseによる最新の照準対象を取得
-            self.aiming_target = self._realsense_camera.get_aiming_target()
+                usb_camera = self._b_camera if robot_state.video_id == 1 else self._a_camera
+                frame = usb_camera.get_frame()
+                # カメラのフレームは読み取り専用で共有しているので、描画前にコピーする
+                color = writable(frame.color) if frame is not None else None
+                # 共有の検出サービスでUSBカメラも検出している場合は、操作者の照準の補助として結果を描画する
+                # (座標はUSBカメラの画素なので、マイコンにはRealsenseの照準対象を送る)
+                detection_results = usb_camera.get_detection_results()
+                if detection_results is not None and color is not None:
+                    usb_camera.draw_detection_results(color, detection_results)
+                    display_target = usb_camera.get_aiming_target()
+
+            # Realsenseによる最新の照準対象を、撮影からシリアル送信までの遅延を補償して取得
+            aim = self._realsense_camera.get_compensated_aiming_target(self._robot_driver.get_send_delay_ms())
+            self.aiming_target = aim.point if aim is not None else None
             if self.aiming_target is None:
                 self.aiming_target = (640, 360)  # 照準対象がいない場合は(0, 0)を送信
 
-            self.draw_aiming_target_info(color, self.aiming_target)
+            self.draw_aiming_target_info(color, display_target if display_target is not None else self.aiming_target)
             # マイコンに送信する値を更新（形式: "%d,%d,%d,%d\n"）
-            self._robot_driver.set_send_values(self.aiming_target[0], self.aiming_target[1], 0, 0)
-
-            # フレーム計測
-            if color is not None:
-                frame_hash = hash(color.tobytes())  # フレームの簡易ハッシュを計算
-                if frame_hash != prev_frame_hash:
-                    frame_count += 1
-                    prev_frame_hash = frame_hash
+            # 3, 4番目の値は既定では0, 0。弾道計算を行う場合は仰角とリード角[deg]の10倍、
+            # 遅延補償を有効にした場合は撮影から送信までの見込みの遅延[ms]と照準点の信頼度[%]
+            # (どちらも照準対象がないか届かなければ0)
+            if self._ballistic_solver is not None:
+                solution = None
+                if aim is not None:
+                    target = self._realsense_camera.get_aiming_target_position(aim.point)
+                    if target is not None:
+                        solution = self._ballistic_solver.solve(*target)
+                if solution is not None:
+                    self._robot_driver.set_send_values(
+                        self.aiming_target[0],
+                        self.aiming_target[1],
+                        round(solution.pitch_deg * 10),
+                        round(solution.lead_deg * 10),
+                        capture_time=aim.capture_time,
+                    )
+                else:
+                    self._robot_driver.set_send_values(self.aiming_target[0], self.aiming_target[1], 0, 0)
+            elif self._send_latency_info and aim is not None:
+                self._robot_driver.set_send_values(
+                    self.aiming_target[0],
+                    self.aiming_target[1],
+                    int(aim.latency_ms),
+                    int(aim.confidence * 100),
+                    capture_time=aim.capture_time,
+                )
+            else:
+                self._robot_driver.set_send_values(
+                    self.aiming_target[0],
+                    self.aiming_target[1],
+                    0,
+                    0,
+                    capture_time=aim.capture_time if aim is not None else None,
+                )
+
+            # フレーム計測 (フレームの通し番号が変わったら新しいフレームとして数える)
+            if frame is not None and frame.frame_id != prev_frame_id:
+                frame_count += 1
+                prev_frame_id = frame.frame_id
 
             now = time.time()
             elapsed = now - prev_time
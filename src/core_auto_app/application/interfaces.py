@@ -3,7 +3,7 @@ from typing import Optional, Tuple
 
 import numpy as np
 
-from core_auto_app.domain.messages import Command, RobotState
+from core_auto_app.domain.messages import Command, FrameData, RobotStateSnapshot
 
 
 class ApplicationInterface(ABC):
@@ -36,6 +36,16 @@ class Camera(ABC):
         """Get both color and depth images."""
         pass
 
+    @abstractmethod
+    def get_frame(self) -> Optional[FrameData]:
+        """Get the latest frame with its frame id and timestamp."""
+        pass
+
+    @abstractmethod
+    def wait_for_frame(self, last_frame_id: int, timeout: Optional[float] = None) -> Optional[FrameData]:
+        """Block until a frame newer than last_frame_id arrives (None on timeout)."""
+        pass
+
     @abstractmethod
     def close(self) -> None:
         pass
@@ -63,6 +73,36 @@ class ColorCamera(ABC):
         """Get color image."""
         pass
 
+    @abstractmethod
+    def get_frame(self) -> Optional[FrameData]:
+        """Get the latest frame with its frame id and timestamp."""
+        pass
+
+    @abstractmethod
+    def wait_for_frame(self, last_frame_id: int, timeout: Optional[float] = None) -> Optional[FrameData]:
+        """Block until a frame newer than last_frame_id arrives (None on timeout)."""
+        pass
+
+    def set_target_panel(self, flag: bool) -> None:
+        """Set the panel color to aim at (only for cameras with detection)."""
+        pass
+
+    def set_active(self, active: bool) -> None:
+        """Set whether the camera is the displayed view (standby cameras may skip decoding)."""
+        pass
+
+    def get_detection_results(self):
+        """Get the latest tracking results (None if the camera has no detection)."""
+        return None
+
+    def get_aiming_target(self) -> Optional[Tuple[int, int]]:
+        """Get the latest aiming target (None if the camera has no detection)."""
+        return None
+
+    def draw_detection_results(self, frame: np.ndarray, detection_results) -> np.ndarray:
+        """Draw tracking results on the frame."""
+        return frame
+
     @abstractmethod
     def close(self) -> None:
         pass
@@ -118,7 +158,7 @@ class RobotDriver(ABC):
         self.close()
 
     @abstractmethod
-    def get_robot_state(self) -> RobotState:
+    def get_robot_state(self) -> RobotStateSnapshot:
         pass
 
     @abstractmethod
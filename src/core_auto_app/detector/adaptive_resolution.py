@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 切り替える推論画像サイズ (高さ, 幅)。YOLOXのストライド32の倍数で、先頭ほど高解像度
+DEFAULT_RESOLUTIONS = ((704, 1280), (544, 960), (352, 640))
+
+
+class AdaptiveResolutionController:
+    """推論時間の目標 (レイテンシ予算) を守るように推論画像サイズを切り替えるクラス
+
+    現在のサイズでの直近 window 回の推論時間の平均が目標を超えたら1段小さいサイズに切り替える。
+    1段大きいサイズでの推論時間 (画素数に比例すると仮定して見積もる) が目標の upscale_margin 倍に
+    収まる場合は1段大きいサイズに戻す。
+    小さい標的や遠い標的を追跡中は、目標を small_target_budget 倍まで緩めて高い解像度を優先する。
+    """
+
+    def __init__(
+        self,
+        target_latency_ms: float = 30.0,
+        resolutions: Sequence[Tuple[int, int]] = DEFAULT_RESOLUTIONS,
+        window: int = 10,
+        upscale_margin: float = 0.8,
+        small_target_budget: float = 1.5,
+        small_target_px: float = 60.0,
+        far_distance_m: float = 4.0,
+        history_size: int = 300,
+    ):
+        """
+        target_latency_ms: 推論時間の目標[ms]
+        resolutions: 推論画像サイズ (高さ, 幅) のリスト (高解像度の順)
+        window: サイズを切り替えるか判断するのに使う推論回数
+        upscale_margin: 1段大きいサイズに戻すときの、見積もり推論時間の目標に対する割合
+        small_target_budget: 小さい・遠い標的の追跡中に目標を緩める倍率
+        small_target_px: 小さい標的とみなすバウンディングボックスの高さ[px]
+        far_distance_m: 遠い標的とみなす距離[m]
+        history_size: 保持する推論時間の履歴の数
+        """
+        if not resolutions:
+            raise ValueError("resolutions must not be empty")
+        self.target_latency_ms = target_latency_ms
+        self.resolutions = [tuple(size) for size in resolutions]
+        self.upscale_margin = upscale_margin
+        self.small_target_budget = small_target_budget
+        self.small_target_px = small_target_px
+        self.far_distance_m = far_distance_m
+
+        self._lock = threading.Lock()
+        self._level = 0  # resolutions のインデックス
+        self._latencies = deque(maxlen=window)  # 現在のサイズでの直近の推論時間[ms]
+        self._history = deque(maxlen=history_size)  # (時刻[秒], サイズ, 推論時間[ms])
+        self._small_target = False
+
+    @property
+    def current_size(self) -> Tuple[int, int]:
+        """現在の推論画像サイズ (高さ, 幅)"""
+        with self._lock:
+            return self.resolutions[self._level]
+
+    @property
+    def prefers_high_resolution(self) -> bool:
+        """小さい・遠い標的を追跡中で、高い解像度を優先しているか"""
+        return self._small_target
+
+    def set_target(self, box_height: Optional[float] = None, distance_m: Optional[float] = None) -> None:
+        """
+        追跡中の標的の大きさと距離を設定する (標的がいなければ両方None)
+        box_height: 標的のバウンディングボックスの高さ[px]
+        distance_m: 標的までの距離[m]
+        """
+        self._small_target = (box_height is not None and box_height < self.small_target_px) or (
+            distance_m is not None and distance_m > self.far_distance_m
+        )
+
+    def record(self, latency_ms: float, now: Optional[float] = None) -> Tuple[int, int]:
+        """
+        現在のサイズでの推論時間を記録し、必要ならサイズを切り替える
+        latency_ms: 推論時間[ms]
+        now: 現在時刻[秒] (Noneなら time.monotonic())
+        戻り値: 次の推論で使うサイズ (高さ, 幅)
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            self._history.append((now, self.resolutions[self._level], latency_ms))
+            self._latencies.append(latency_ms)
+            if len(self._latencies) == self._latencies.maxlen:
+                self._update_level()
+            return self.resolutions[self._level]
+
+    def _update_level(self) -> None:
+        budget = self.target_latency_ms
+        if self._small_target:
+            budget *= self.small_target_budget
+        mean = sum(self._latencies) / len(self._latencies)
+
+        level = self._level
+        if mean > budget and level < len(self.resolutions) - 1:
+            level += 1
+        elif level > 0:
+            # 推論時間は画素数にほぼ比例するとして、1段大きいサイズでの推論時間を見積もる
+            (h, w), (larger_h, larger_w) = self.resolutions[level], self.resolutions[level - 1]
+            estimate = mean * (larger_h * larger_w) / (h * w)
+            if estimate <= budget * self.upscale_margin:
+                level -= 1
+
+        if level != self._level:
+            self._level = level
+            # 切り替え後のサイズの推論時間で判断し直す
+            self._latencies.clear()
+
+    def get_history(self) -> List[Tuple[float, Tuple[int, int], float]]:
+        """推論時間の履歴 [(時刻[秒], サイズ (高さ, 幅), 推論時間[ms]), ...] を返す"""
+        with self._lock:
+            return list(self._history)
+
+    def get_stats(self) -> Dict[str, object]:
+        """現在のサイズと、サイズごとの推論回数・平均推論時間[ms] を返す"""
+        with self._lock:
+            history = list(self._history)
+            size = self.resolutions[self._level]
+        latencies: Dict[Tuple[int, int], List[float]] = {}
+        for _, hist_size, latency in history:
+            latencies.setdefault(hist_size, []).append(latency)
+        return {
+            "size": size,
+            "prefers_high_resolution": self._small_target,
+            "latency_ms": {
+                hist_size: (len(values), sum(values) / len(values)) for hist_size, values in latencies.items()
+            },
+        }
@@ -1,7 +1,10 @@
 import pyrealsense2 as rs
 import numpy as np
 import cv2
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+
+from core_auto_app.detector.aiming.ballistics import BallisticSolver, FiringSolution
+from core_auto_app.detector.aiming.depth_sampling import deproject_pixels, sample_box_depths
 
 class AimingService:
     """
@@ -16,7 +19,8 @@ class AimingService:
     def __init__(
         self, 
         intrinsics: rs.intrinsics, 
-        camera_offset: Tuple[float, float, float] = (0.0, 0.0, 0.0)
+        camera_offset: Tuple[float, float, float] = (0.0, 0.0, 0.0),
+        ballistic_solver: Optional[BallisticSolver] = None,
     ):
         """
         Args:
@@ -24,9 +28,11 @@ class AimingService:
             camera_offset: (x, y, z) [m] カメラ原点とロボット中心のズレ
                 例: カメラがロボット前方20cm, 上方30cm, 右側0cm の位置にある場合
                 camera_offset = (0.2, 0.3, 0.0)
+            ballistic_solver: 指定すると compute_aim_angle() で重力と空気抵抗を考慮した仰角を求める
         """
         self._intrinsics = intrinsics
         self._camera_offset = camera_offset
+        self._ballistic_solver = ballistic_solver
 
     def compute_3d(self, depth_image: np.ndarray, x: int, y: int) -> Tuple[float, float, float]:
         """
@@ -83,6 +89,45 @@ class AimingService:
 
         return results
 
+    def compute_object_coordinates_batch(
+        self,
+        depth_image: np.ndarray,
+        tracked_objects: List[Tuple[int, int, int, int, int]],
+        shrink: float = 0.5,
+        percentile: float = 50.0,
+    ) -> List[Tuple[int, float, float, float]]:
+        """
+        compute_object_coordinates と同じ結果の形式で、全オブジェクトをまとめて計算する
+
+        中心の1画素ではなく、縮めたボックス内の有効な深度の分位点を使うので、
+        中心が深度の欠損でも座標が求まる。有効な深度が1つもなければ (0,0,0) を返す。
+        Args:
+            depth_image: RealSenseのdepth配列 (aligned to color)
+            tracked_objects: [(x1, y1, x2, y2, track_id), ...]
+            shrink: 深度を取る領域の、ボックスに対する大きさの割合
+            percentile: 有効な深度の分位点 (50で中央値)
+
+        Returns:
+            result: [(track_id, X, Y, Z), ...] 各オブジェクトの3D座標[m]
+        """
+        if not tracked_objects:
+            return []
+        objects = np.asarray(tracked_objects, dtype=np.float64)
+        boxes = objects[:, :4]
+        depths = sample_box_depths(depth_image, boxes, shrink=shrink, percentile=percentile)
+        centers = np.floor((boxes[:, :2] + boxes[:, 2:]) / 2)
+
+        valid = ~np.isnan(depths)
+        points = np.zeros((len(objects), 3))
+        if valid.any():
+            points[valid] = deproject_pixels(self._intrinsics, centers[valid], depths[valid])
+            points[valid] += np.asarray(self._camera_offset, dtype=np.float64)
+
+        return [
+            (int(t_id), float(X), float(Y), float(Z))
+            for t_id, (X, Y, Z) in zip(objects[:, 4], points)
+        ]
+
     def draw_3d_info(
         self,
         frame: np.ndarray,
@@ -107,6 +152,10 @@ class AimingService:
         (ロボット中心→射出口のオフセットや、重力・弾道などは実装次第)
         戻り値: 仰角 [deg] など
         """
+        if self._ballistic_solver is not None:
+            solution = self.compute_firing_solution(X, Y, Z)
+            if solution is not None:
+                return solution.pitch_deg
         # ここでは例としてZが奥行き(前方方向), Yが垂直方向, Xが水平方向と仮定:
         # 単純に「距離」と「高さY」の比から仰角を計算
         dist_xy = np.hypot(X, Z)  # 水平方向距離
@@ -115,3 +164,18 @@ class AimingService:
         angle_rad = np.arctan2(Y, dist_xy)
         angle_deg = np.degrees(angle_rad)
         return angle_deg
+
+    def compute_firing_solution(
+        self,
+        X: float,
+        Y: float,
+        Z: float,
+        velocity: Optional[Tuple[float, float, float]] = None,
+    ) -> Optional[FiringSolution]:
+        """
+        対象物体の(X,Y,Z)と速度[m/s]から、弾道を考慮した仰角とリード角を求める
+        (ballistic_solver が未指定、または届かない場合はNone)
+        """
+        if self._ballistic_solver is None:
+            return None
+        return self._ballistic_solver.solve((X, Y, Z), velocity)
@@ -1,78 +1,177 @@
 # detector/aiming_target_selector.py
 
-import math
+from itertools import chain
+
+import numpy as np
 import cv2
 
+# 照準対象を選ぶコストの重みの既定値 (画像中心からの距離だけで選ぶ)
+DEFAULT_WEIGHTS = {
+    "distance": 1.0,  # 画像中心からの距離 (画像の対角線の半分で割った値)
+    "size": 0.0,  # ボックスの大きさ (面積の平方根を画像の対角線の半分で割った値。大きいほどコストが低い)
+    "depth": 0.0,  # 物体までの距離 (max_depth_m で割った値。不明なら1)
+    "age": 0.0,  # 追跡が続いているフレーム数 (age_frames で割って1で頭打ち。長いほどコストが低い。重みが0の間は数えない)
+    "stickiness": 0.0,  # 前フレームの照準対象以外に加えるコスト
+}
+
+
 class AimingTargetSelector:
     """
     トラッキング結果 (x1, y1, x2, y2, track_id) のリストから、
     照準対象の物体を決定するクラス。
 
-    - 画像中心 (640, 360) とのピクセル距離が最小の物体を優先
-    - 距離が同じ場合は前フレームの対象IDを優先
-    - それでも複数なら横幅が大きい方を優先
+    - 画像中心からの距離・ボックスの大きさ・物体までの距離・追跡の長さ・前フレームの対象であるかの
+      重み付きの和をコストとして、全候補をまとめて NumPy で計算し、コストが最小の物体を選ぶ
+    - 前フレームの対象は、他の物体のコストが hysteresis 以上低くならない限り選び続ける
+      (ほぼ同じ距離の物体の間で照準が行き来しないようにする)
+    - コストが同じ場合は前フレームの対象IDを優先し、それでも複数なら横幅が大きい方を優先
+    - 重みは set_weights(...) で実行中に変更できる
     - select_target(...) で決定したtargetをメンバ変数として保持
     - draw_aiming_target_info(...) で画面に描画できる
     """
 
-    def __init__(self, image_center=(640, 360)):
+    def __init__(
+        self,
+        image_center=(640, 360),
+        weights=None,
+        hysteresis=0.02,
+        max_depth_m=10.0,
+        age_frames=30,
+    ):
+        """
+        image_center: 画像中心 (画像の大きさは中心の2倍とする)
+        weights: コストの重み (DEFAULT_WEIGHTS のキーの一部を指定すると、残りは既定値)
+        hysteresis: 前フレームの対象から切り替えるのに必要なコストの差
+            (距離の重みが1なら、画像の対角線の半分に対する割合)
+        max_depth_m: 物体までの距離を正規化する距離[m]
+        age_frames: 追跡の長さを正規化するフレーム数
+        """
         self.image_center = image_center
         self.prev_target_id = None   # 前フレームで選択されたID
         self.aiming_target = None    # (cx, cy) 現在の照準対象座標
         self.current_target_id = None  # 現在の照準対象ID
+        self.hysteresis = hysteresis
+        self.max_depth_m = max_depth_m
+        self.age_frames = age_frames
+        self._center = np.asarray(image_center, dtype=np.float64)
+        self._half_diagonal = float(np.hypot(*image_center))
+        # 前回のトラックID (昇順) と、それぞれが連続して追跡されているフレーム数
+        self._age_ids = np.zeros(0, dtype=np.int64)
+        self._ages = np.zeros(0, dtype=np.int64)
+        self._weights = dict(DEFAULT_WEIGHTS)
+        if weights is not None:
+            self.set_weights(**weights)
+
+    def set_weights(self, **weights):
+        """コストの重みを変更する (指定しなかった重みはそのまま)"""
+        unknown = set(weights) - set(DEFAULT_WEIGHTS)
+        if unknown:
+            raise ValueError(f"Unknown target weights: {sorted(unknown)}")
+        # 選択中の別スレッドから見ても一貫するよう、辞書ごと差し替える
+        self._weights = {**self._weights, **{key: float(value) for key, value in weights.items()}}
+
+    def get_weights(self):
+        """現在のコストの重みを返す"""
+        return dict(self._weights)
+
+    def compute_costs(self, tracked_objects, depths=None):
+        """
+        全候補のコストをまとめて計算する
+
+        Args:
+            tracked_objects: [(x1, y1, x2, y2, track_id), ...]
+            depths: 各物体までの距離[m] (Noneまたはnanは不明)
 
-    def select_target(self, tracked_objects):
+        Returns:
+            costs: 各物体のコスト (K,)
+        """
+        weights = self._weights
+        objects = self._to_array(tracked_objects)
+        centers = (objects[:, 0:2] + objects[:, 2:4]) // 2
+        sizes = objects[:, 2:4] - objects[:, 0:2]
+
+        costs = np.zeros(len(objects))
+        if weights["distance"]:
+            offsets = centers - self._center
+            costs += weights["distance"] * np.hypot(offsets[:, 0], offsets[:, 1]) / self._half_diagonal
+        if weights["size"]:
+            costs -= weights["size"] * np.sqrt(np.maximum(sizes[:, 0] * sizes[:, 1], 0)) / self._half_diagonal
+        if weights["depth"]:
+            normalized = np.ones(len(objects))
+            if depths is not None:
+                depths = np.asarray(depths, dtype=np.float64)
+                known = ~np.isnan(depths)
+                normalized[known] = np.minimum(depths[known] / self.max_depth_m, 1.0)
+            costs += weights["depth"] * normalized
+        if weights["age"]:
+            costs -= weights["age"] * np.minimum(self._lookup_ages(objects[:, 4]) / self.age_frames, 1.0)
+        if weights["stickiness"]:
+            costs += weights["stickiness"] * (objects[:, 4] != self.prev_target_id)
+        return costs
+
+    @staticmethod
+    def _to_array(tracked_objects):
+        """トラッキング結果を (K, 5) の整数の配列にする (配列ならそのまま)"""
+        if isinstance(tracked_objects, np.ndarray):
+            return tracked_objects.reshape(-1, 5)
+        values = chain.from_iterable(tracked_objects)
+        return np.fromiter(values, dtype=np.int64, count=5 * len(tracked_objects)).reshape(-1, 5)
+
+    def _lookup_ages(self, track_ids):
+        """前回までに記録した、各トラックの連続して追跡されているフレーム数 (初めてのトラックは0)"""
+        if len(self._age_ids) == 0:
+            return np.zeros(len(track_ids), dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._age_ids, track_ids), len(self._age_ids) - 1)
+        return np.where(self._age_ids[pos] == track_ids, self._ages[pos], 0)
+
+    def _update_track_ages(self, track_ids):
+        """今回のトラックの連続して追跡されているフレーム数を更新する (見失ったトラックは消す)"""
+        ages = self._lookup_ages(track_ids) + 1
+        order = np.argsort(track_ids)
+        self._age_ids = track_ids[order]
+        self._ages = ages[order]
+
+    def select_target(self, tracked_objects, depths=None):
         """
         Args:
             tracked_objects: [(x1, y1, x2, y2, track_id), ...]
+            depths: 各物体までの距離[m] (深度の重みを使う場合のみ。Noneまたはnanは不明)
 
         Returns:
             aiming_target: (cx, cy) or None
         """
-        if not tracked_objects:
+        if len(tracked_objects) == 0:
+            self._age_ids = self._age_ids[:0]
+            self._ages = self._ages[:0]
             self.aiming_target = None
             self.current_target_id = None
             return None
 
-        center_x, center_y = self.image_center
-
-        # 1) 物体ごとの距離、幅などをまとめる
-        obj_list = []
-        for (x1, y1, x2, y2, t_id) in tracked_objects:
-            cx = (x1 + x2) // 2
-            cy = (y1 + y2) // 2
-            dx = cx - center_x
-            dy = cy - center_y
-            distance = math.sqrt(dx*dx + dy*dy)
-            width = (x2 - x1)
-
-            obj_list.append({
-                't_id': t_id,
-                'cx': cx,
-                'cy': cy,
-                'dist': distance,
-                'width': width
-            })
-
-        # 2) 最小距離を持つ物体を抽出
-        min_dist = min(o['dist'] for o in obj_list)
-        tie_list = [o for o in obj_list if abs(o['dist'] - min_dist) < 1e-9]
-
-        if len(tie_list) == 1:
-            chosen = tie_list[0]
-        else:
-            # 3) tie_list の中で prev_target_id を含むものがあればそれを優先
-            tie_list_id_match = [o for o in tie_list if o['t_id'] == self.prev_target_id]
-            if len(tie_list_id_match) == 1:
-                chosen = tie_list_id_match[0]
-            elif len(tie_list_id_match) > 1:
-                # 4) width大きい方
-                chosen = max(tie_list_id_match, key=lambda x: x['width'])
-            else:
-                chosen = max(tie_list, key=lambda x: x['width'])
-
-        self.prev_target_id = chosen['t_id']
-        self.current_target_id = chosen['t_id']
-        self.aiming_target = (chosen['cx'], chosen['cy'])
+        objects = self._to_array(tracked_objects)
+        costs = self.compute_costs(objects, depths)
+        if self._weights["age"]:
+            self._update_track_ages(objects[:, 4])
+        elif len(self._age_ids):
+            # 追跡の長さは重みが0でない間だけ数える
+            self._age_ids = self._age_ids[:0]
+            self._ages = self._ages[:0]
+
+        # コスト → 前フレームの対象か → 横幅の大きさ の順に優先する
+        is_prev = objects[:, 4] == self.prev_target_id
+        chosen = int(np.argmin(costs))
+        if np.count_nonzero(costs == costs[chosen]) > 1:
+            widths = objects[:, 2] - objects[:, 0]
+            chosen = np.lexsort((-widths, ~is_prev, costs))[0]
+
+        # 前フレームの対象が残っていれば、十分にコストが低い物体が現れるまで選び続ける
+        if self.hysteresis > 0 and is_prev.any() and not is_prev[chosen]:
+            prev = np.flatnonzero(is_prev)[0]
+            if costs[chosen] > costs[prev] - self.hysteresis:
+                chosen = prev
+
+        x1, y1, x2, y2, t_id = objects[chosen].tolist()
+        self.prev_target_id = t_id
+        self.current_target_id = t_id
+        self.aiming_target = ((x1 + x2) // 2, (y1 + y2) // 2)
 
         return self.aiming_target
@@ -0,0 +1,279 @@
+import math
+import threading
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+
+class FiringSolution(NamedTuple):
+    """標的に当てるための射出角"""
+
+    pitch_deg: float  # 水平からの仰角[deg]
+    yaw_deg: float  # 正面からの水平角[deg] (右が正。標的の移動を見越した位置への角度)
+    lead_deg: float  # 標的の移動を見越して、現在の標的の方向からずらす水平角[deg]
+    flight_time: float  # 射出から到達までの時間[s]
+
+
+class BallisticTable:
+    """射出速度ごとに、水平距離と高さから必要な仰角と飛翔時間を引く表
+
+    空気抵抗 (速度の2乗に比例) と重力を受ける弾道を仰角ごとにまとめて数値積分し、
+    各距離で高さが仰角に対して増える範囲 (低い弾道) を逆引きして格子状の表を作る。
+    引くときは双線形補間するだけなので、1回あたり数マイクロ秒で済む。
+    """
+
+    def __init__(
+        self,
+        muzzle_velocity: float,
+        drag_coefficient: float = 0.0,
+        gravity: float = 9.81,
+        distance_range: Tuple[float, float] = (0.5, 10.0),
+        height_range: Tuple[float, float] = (-1.0, 3.0),
+        grid_step: float = 0.05,
+        pitch_range_deg: Tuple[float, float] = (-30.0, 60.0),
+        pitch_step_deg: float = 0.1,
+        dt: float = 0.005,
+        max_flight_time: float = 3.0,
+    ):
+        """
+        muzzle_velocity: 射出速度[m/s]
+        drag_coefficient: 空気抵抗の係数 k [1/m] (加速度 = -k|v|v。0なら真空中)
+        gravity: 重力加速度[m/s^2]
+        distance_range, height_range: 表の水平距離と高さの範囲[m] (射出口から見た値)
+        grid_step: 表の格子の間隔[m]
+        pitch_range_deg, pitch_step_deg: 積分する仰角の範囲と間隔[deg]
+        dt: 数値積分の時間刻み[s]
+        max_flight_time: 積分する最大の飛翔時間[s]
+        """
+        self.muzzle_velocity = muzzle_velocity
+        self._distance_start = distance_range[0]
+        self._height_start = height_range[0]
+        self._grid_step = grid_step
+        self.distances = np.arange(distance_range[0], distance_range[1] + grid_step / 2, grid_step)
+        self.heights = np.arange(height_range[0], height_range[1] + grid_step / 2, grid_step)
+
+        pitches = np.radians(np.arange(pitch_range_deg[0], pitch_range_deg[1] + pitch_step_deg / 2, pitch_step_deg))
+        heights_at, times_at = self._integrate(
+            muzzle_velocity, pitches, drag_coefficient, gravity, dt, max_flight_time
+        )
+
+        # 各距離で、高さが仰角に対して増える範囲 (最高点を与える仰角まで) を逆引きする
+        self.pitch_table = np.full((len(self.distances), len(self.heights)), np.nan)
+        self.time_table = np.full((len(self.distances), len(self.heights)), np.nan)
+        for j in range(len(self.distances)):
+            h = heights_at[:, j]
+            reachable = np.flatnonzero(~np.isnan(h))
+            if len(reachable) < 2:
+                continue
+            first = reachable[0]
+            not_increasing = np.flatnonzero(~(np.diff(h[first:]) > 0))
+            last = first + (not_increasing[0] if len(not_increasing) else len(h) - 1 - first)
+            if last - first < 1:
+                continue
+            h = h[first:last + 1]
+            in_range = (self.heights >= h[0]) & (self.heights <= h[-1])
+            self.pitch_table[j, in_range] = np.degrees(np.interp(self.heights[in_range], h, pitches[first:last + 1]))
+            self.time_table[j, in_range] = np.interp(self.heights[in_range], h, times_at[first:last + 1, j])
+        # 双線形補間を Python の float で行うための表
+        self._pitch_rows = self.pitch_table.tolist()
+        self._time_rows = self.time_table.tolist()
+
+    def _integrate(self, muzzle_velocity, pitches, drag_coefficient, gravity, dt, max_flight_time):
+        """全仰角の弾道を積分し、表の各水平距離での高さと時刻 (仰角, 距離) を返す (届かなければnan)"""
+        x = np.zeros(len(pitches))
+        y = np.zeros(len(pitches))
+        vx = muzzle_velocity * np.cos(pitches)
+        vy = muzzle_velocity * np.sin(pitches)
+        xs, ys = [x.copy()], [y.copy()]
+
+        def acceleration(vx, vy):
+            speed = np.hypot(vx, vy)
+            return -drag_coefficient * speed * vx, -gravity - drag_coefficient * speed * vy
+
+        for _ in range(int(max_flight_time / dt)):
+            # 中点法 (2次のルンゲ・クッタ法)
+            ax, ay = acceleration(vx, vy)
+            mvx, mvy = vx + ax * dt / 2, vy + ay * dt / 2
+            max_, may = acceleration(mvx, mvy)
+            x = x + mvx * dt
+            y = y + mvy * dt
+            vx = vx + max_ * dt
+            vy = vy + may * dt
+            xs.append(x)
+            ys.append(y)
+            # 全弾道が表の範囲の外に出たら終了する
+            if np.all((x > self.distances[-1]) | ((y < self.heights[0]) & (vy < 0))):
+                break
+        xs = np.array(xs)
+        ys = np.array(ys)
+        times = np.arange(len(xs)) * dt
+
+        heights_at = np.full((len(pitches), len(self.distances)), np.nan)
+        times_at = np.full((len(pitches), len(self.distances)), np.nan)
+        for p in range(len(pitches)):
+            # 水平方向の速度は正のまま減るだけなので、x は単調に増える
+            reach = self.distances <= xs[-1, p]
+            heights_at[p, reach] = np.interp(self.distances[reach], xs[:, p], ys[:, p])
+            times_at[p, reach] = np.interp(self.distances[reach], xs[:, p], times)
+        return heights_at, times_at
+
+    def lookup(self, distance: float, height: float) -> Optional[Tuple[float, float]]:
+        """
+        水平距離と高さ[m]から (仰角[deg], 飛翔時間[s]) を双線形補間で求める (表の範囲外や届かなければNone)
+        """
+        cell_i = _grid_cell((distance - self._distance_start) / self._grid_step, len(self._pitch_rows))
+        cell_j = _grid_cell((height - self._height_start) / self._grid_step, len(self._pitch_rows[0]))
+        if cell_i is None or cell_j is None:
+            return None
+        i, di = cell_i
+        j, dj = cell_j
+        results = []
+        for rows in (self._pitch_rows, self._time_rows):
+            v00, v01 = rows[i][j], rows[i][j + 1]
+            v10, v11 = rows[i + 1][j], rows[i + 1][j + 1]
+            value = (v00 * (1 - dj) + v01 * dj) * (1 - di) + (v10 * (1 - dj) + v11 * dj) * di
+            if value != value:  # nan (届かない格子点を含む)
+                return None
+            results.append(value)
+        return results[0], results[1]
+
+
+_GRID_EPS = 1e-6  # 格子点ちょうどの位置の丸め誤差の許容量 (格子の間隔に対する割合)
+
+
+def _grid_cell(f: float, size: int) -> Optional[Tuple[int, float]]:
+    """
+    格子の番号で表した位置 f から、補間に使うセルの番号と割合を返す (範囲外ならNone)
+    最後の格子点ちょうどの位置は、その手前のセルの端 (割合1) として扱う
+    """
+    if f < 0:
+        if f < -_GRID_EPS:
+            return None
+        f = 0.0
+    i = int(math.floor(f))
+    if i >= size - 1:
+        if f > size - 1 + _GRID_EPS:
+            return None
+        return size - 2, 1.0
+    return i, f - i
+
+
+class BallisticSolver:
+    """標的のカメラ座標と速度から、射出の仰角とリード角を求めるクラス
+
+    マイコンから受信した射出速度が表を作った速度から velocity_tolerance の割合以上ずれたら、
+    別スレッドで表を作り直して差し替える (作り直している間は古い表を使う)。
+    座標はRealSenseのカメラ座標系 (Xが右、Yが下、Zが前方)。カメラが上を向いている場合は、
+    標的の位置と速度をカメラの仰角 (camera_tilt_deg と、camera_on_launcher なら受信した発射機の仰角の和)
+    だけ回して水平な座標系にしてから表を引く。
+    """
+
+    def __init__(
+        self,
+        muzzle_velocity: float = 15.0,
+        drag_coefficient: float = 0.0,
+        muzzle_offset: Tuple[float, float, float] = (0.0, 0.0, 0.0),
+        velocity_tolerance: float = 0.03,
+        lead_iterations: int = 2,
+        rebuild_in_background: bool = True,
+        camera_tilt_deg: float = 0.0,
+        camera_on_launcher: bool = False,
+        **table_kwargs,
+    ):
+        """
+        muzzle_velocity: 射出速度を受信するまで使う射出速度[m/s]
+        drag_coefficient: 空気抵抗の係数 k [1/m] (BallisticTable を参照)
+        muzzle_offset: カメラ座標系での射出口の位置 (X, Y, Z)[m] (カメラと一緒に回るとする)
+        velocity_tolerance: 表を作り直す射出速度のずれの割合
+        lead_iterations: 飛翔時間と標的の移動先を交互に求め直す回数
+        rebuild_in_background: Falseなら表の作り直しを呼び出したスレッドで行う
+        camera_tilt_deg: 発射機が水平のときのカメラの仰角[deg] (上向きが正)
+        camera_on_launcher: Trueならカメラは発射機と一緒に上下するとし、set_launcher_pitch() の仰角を足す
+        table_kwargs: BallisticTable に渡すその他の引数
+        """
+        self._drag_coefficient = drag_coefficient
+        self._muzzle_offset = muzzle_offset
+        self._velocity_tolerance = velocity_tolerance
+        self._lead_iterations = lead_iterations
+        self._rebuild_in_background = rebuild_in_background
+        self._table_kwargs = table_kwargs
+        self._table = BallisticTable(muzzle_velocity, drag_coefficient, **table_kwargs)
+        self._rebuild_thread: Optional[threading.Thread] = None
+        self.rebuild_count = 0
+        self._camera_tilt_deg = camera_tilt_deg
+        self._camera_on_launcher = camera_on_launcher
+        self._launcher_pitch_deg = 0.0
+        self._camera_pitch = math.radians(camera_tilt_deg)  # 水平からのカメラの仰角[rad]
+
+    @property
+    def table_muzzle_velocity(self) -> float:
+        """現在の表を作った射出速度[m/s]"""
+        return self._table.muzzle_velocity
+
+    def set_muzzle_velocity(self, muzzle_velocity: float) -> None:
+        """受信した射出速度[m/s]を設定する (表の速度から大きくずれていれば作り直す。0以下は未計測として無視)"""
+        if muzzle_velocity <= 0:
+            return
+        table_velocity = self._table.muzzle_velocity
+        if abs(muzzle_velocity - table_velocity) <= self._velocity_tolerance * table_velocity:
+            return
+        if not self._rebuild_in_background:
+            self._rebuild(muzzle_velocity)
+        elif self._rebuild_thread is None or not self._rebuild_thread.is_alive():
+            self._rebuild_thread = threading.Thread(target=self._rebuild, args=(muzzle_velocity,), daemon=True)
+            self._rebuild_thread.start()
+
+    def set_launcher_pitch(self, pitch_deg: float) -> None:
+        """受信した発射機の仰角[deg]を設定する (camera_on_launcher の場合のみカメラの仰角に使う)"""
+        self._launcher_pitch_deg = pitch_deg
+        if self._camera_on_launcher:
+            self._camera_pitch = math.radians(self._camera_tilt_deg + pitch_deg)
+
+    @property
+    def camera_pitch_deg(self) -> float:
+        """標的の座標を水平にするのに使うカメラの仰角[deg]"""
+        return math.degrees(self._camera_pitch)
+
+    def _level(self, y: float, z: float) -> Tuple[float, float]:
+        """カメラ座標系の (Y, Z) を、カメラの仰角だけ回して水平な座標系 (Yが鉛直下、Zが水平前方) にする"""
+        cos, sin = math.cos(self._camera_pitch), math.sin(self._camera_pitch)
+        return y * cos - z * sin, y * sin + z * cos
+
+    def _rebuild(self, muzzle_velocity: float) -> None:
+        """表を作り直して差し替える (参照の代入なので、引いている途中の表はそのまま使える)"""
+        self._table = BallisticTable(muzzle_velocity, self._drag_coefficient, **self._table_kwargs)
+        self.rebuild_count += 1
+
+    def solve(
+        self,
+        position: Tuple[float, float, float],
+        velocity: Optional[Tuple[float, float, float]] = None,
+    ) -> Optional[FiringSolution]:
+        """
+        position: 標的のカメラ座標 (X, Y, Z)[m]
+        velocity: 標的のカメラ座標系での速度 (vx, vy, vz)[m/s] (Noneなら静止しているとする)
+        戻り値: 射出角 (仰角は水平から、水平角は水平面内で測る。表の範囲外や届かない場合はNone)
+        """
+        table = self._table
+        x = position[0] - self._muzzle_offset[0]
+        y, z = self._level(position[1] - self._muzzle_offset[1], position[2] - self._muzzle_offset[2])
+        if velocity is not None:
+            velocity = (velocity[0], *self._level(velocity[1], velocity[2]))
+        solution = table.lookup(math.hypot(x, z), -y)
+        if solution is None:
+            return None
+        pitch_deg, flight_time = solution
+        aim_x, aim_y, aim_z = x, y, z
+        if velocity is not None:
+            # 飛翔時間だけ先の標的の位置を狙い、その位置までの飛翔時間で求め直す
+            for _ in range(self._lead_iterations):
+                aim_x = x + velocity[0] * flight_time
+                aim_y = y + velocity[1] * flight_time
+                aim_z = z + velocity[2] * flight_time
+                solution = table.lookup(math.hypot(aim_x, aim_z), -aim_y)
+                if solution is None:
+                    return None
+                pitch_deg, flight_time = solution
+        yaw_deg = math.degrees(math.atan2(aim_x, aim_z))
+        lead_deg = yaw_deg - math.degrees(math.atan2(x, z))
+        return FiringSolution(pitch_deg, yaw_deg, lead_deg, flight_time)
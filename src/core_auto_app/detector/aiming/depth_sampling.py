@@ -0,0 +1,129 @@
+from typing import Sequence
+
+import numpy as np
+
+
+def sample_box_depths(
+    depth_image: np.ndarray,
+    boxes: Sequence[Sequence[float]],
+    shrink: float = 0.5,
+    grid_size: int = 9,
+    percentile: float = 50.0,
+    depth_scale: float = 0.001,
+) -> np.ndarray:
+    """
+    各バウンディングボックスの中央部の深度を、欠損 (0) を除いた画素の分位点でまとめて求める
+
+    ボックスを shrink 倍に縮めた領域に grid_size x grid_size の格子点を取り、
+    全ボックスの格子点の深度を1回のインデックス参照で集めてから分位点を計算する。
+    1画素だけを読む場合と違い、中心が深度の欠損やパネルの縁でも値が求まる。
+
+    depth_image: 深度画像 (H, W)。単位は depth_scale [m]
+    boxes: [(x1, y1, x2, y2), ...]
+    shrink: 深度を取る領域の、ボックスに対する大きさの割合 (背景が混ざらないよう縮める)
+    grid_size: 1辺あたりの格子点の数
+    percentile: 有効な画素の深度の分位点 (50で中央値。手前の物体を優先するなら小さくする)
+    depth_scale: 深度画像の値1あたりの距離[m] (RealSenseの既定は1mm)
+    戻り値: 各ボックスの深度[m] (K,)。有効な画素がなければnan
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if len(boxes) == 0:
+        return np.zeros(0)
+    height, width = depth_image.shape[:2]
+
+    centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+    half_sizes = (boxes[:, 2:] - boxes[:, :2]) * shrink / 2
+    steps = np.linspace(-1.0, 1.0, grid_size)
+    # (K, grid_size) の格子点の座標
+    xs = np.clip(np.rint(centers[:, 0:1] + half_sizes[:, 0:1] * steps), 0, width - 1).astype(np.intp)
+    ys = np.clip(np.rint(centers[:, 1:2] + half_sizes[:, 1:2] * steps), 0, height - 1).astype(np.intp)
+    # (K, grid_size, grid_size) の深度を一度に読み出す
+    samples = depth_image[ys[:, :, None], xs[:, None, :]].reshape(len(boxes), -1).astype(np.float64)
+
+    # 欠損を末尾に並べ、有効な画素の数から分位点の位置を線形補間で求める (np.nanpercentile より速い)
+    samples[samples <= 0] = np.inf
+    samples.sort(axis=1)
+    counts = np.isfinite(samples).sum(axis=1)
+    depths = np.full(len(boxes), np.nan)
+    valid = counts > 0
+    if valid.any():
+        rows = np.flatnonzero(valid)
+        position = (counts[valid] - 1) * (percentile / 100.0)
+        lower = np.floor(position).astype(np.intp)
+        upper = np.minimum(lower + 1, counts[valid] - 1)
+        weight = position - lower
+        values = samples[rows, lower] * (1 - weight) + samples[rows, upper] * weight
+        depths[valid] = values * depth_scale
+    return depths
+
+
+def _distortion_name(model) -> str:
+    """pyrealsense2 の rs.distortion または文字列から歪みモデルの名前を返す"""
+    return str(model).split(".")[-1]
+
+
+def deproject_pixels(intrinsics, pixels: np.ndarray, depths: np.ndarray) -> np.ndarray:
+    """
+    rs.rs2_deproject_pixel_to_point と同じ計算で、複数の画素をまとめてカメラ座標に変換する
+
+    intrinsics: rs.intrinsics (fx, fy, ppx, ppy, model, coeffs を持つもの)
+    pixels: (K, 2) の画素座標 (x, y)
+    depths: (K,) の深度[m]
+    戻り値: (K, 3) のカメラ座標 (X, Y, Z)[m]
+    """
+    pixels = np.asarray(pixels, dtype=np.float64).reshape(-1, 2)
+    depths = np.asarray(depths, dtype=np.float64).reshape(-1)
+    x = (pixels[:, 0] - intrinsics.ppx) / intrinsics.fx
+    y = (pixels[:, 1] - intrinsics.ppy) / intrinsics.fy
+
+    model = _distortion_name(intrinsics.model)
+    coeffs = list(intrinsics.coeffs)
+    if model == "inverse_brown_conrady" and any(coeffs):
+        r2 = x * x + y * y
+        f = 1 + coeffs[0] * r2 + coeffs[1] * r2 * r2 + coeffs[4] * r2 * r2 * r2
+        ux = x * f + 2 * coeffs[2] * x * y + coeffs[3] * (r2 + 2 * x * x)
+        uy = y * f + 2 * coeffs[3] * x * y + coeffs[2] * (r2 + 2 * y * y)
+        x, y = ux, uy
+    elif model == "brown_conrady" and any(coeffs):
+        # 歪みの逆変換は反復で求める (librealsenseと同じ10回)
+        xo, yo = x, y
+        for _ in range(10):
+            r2 = x * x + y * y
+            icdist = 1 / (1 + ((coeffs[4] * r2 + coeffs[1]) * r2 + coeffs[0]) * r2)
+            delta_x = 2 * coeffs[2] * x * y + coeffs[3] * (r2 + 2 * x * x)
+            delta_y = 2 * coeffs[3] * x * y + coeffs[2] * (r2 + 2 * y * y)
+            x = (xo - delta_x) * icdist
+            y = (yo - delta_y) * icdist
+    elif model not in ("none", "inverse_brown_conrady", "brown_conrady"):
+        raise ValueError(f"Unsupported distortion model: {model}")
+
+    return np.stack([depths * x, depths * y, depths], axis=1)
+
+
+def project_points(intrinsics, points: np.ndarray) -> np.ndarray:
+    """
+    rs.rs2_project_point_to_pixel と同じ計算で、複数のカメラ座標をまとめて画素座標に変換する
+
+    intrinsics: rs.intrinsics (fx, fy, ppx, ppy, model, coeffs を持つもの)
+    points: (K, 3) のカメラ座標 (X, Y, Z)[m] (Z > 0)
+    戻り値: (K, 2) の画素座標 (x, y)
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    x = points[:, 0] / points[:, 2]
+    y = points[:, 1] / points[:, 2]
+
+    model = _distortion_name(intrinsics.model)
+    coeffs = list(intrinsics.coeffs)
+    if model in ("modified_brown_conrady", "inverse_brown_conrady", "brown_conrady") and any(coeffs):
+        r2 = x * x + y * y
+        f = 1 + coeffs[0] * r2 + coeffs[1] * r2 * r2 + coeffs[4] * r2 * r2 * r2
+        # brown_conrady は接線方向の歪みを歪める前の座標で計算する
+        tx, ty = (x, y) if model == "brown_conrady" else (x * f, y * f)
+        x, y = (
+            x * f + 2 * coeffs[2] * tx * ty + coeffs[3] * (r2 + 2 * tx * tx),
+            y * f + 2 * coeffs[3] * tx * ty + coeffs[2] * (r2 + 2 * ty * ty),
+        )
+    elif model not in ("none", "modified_brown_conrady", "inverse_brown_conrady", "brown_conrady"):
+        raise ValueError(f"Unsupported distortion model: {model}")
+
+    return np.stack([x * intrinsics.fx + intrinsics.ppx, y * intrinsics.fy + intrinsics.ppy], axis=1)
@@ -0,0 +1,62 @@
+from typing import Callable, NamedTuple, Optional, Tuple
+
+
+class CompensatedAim(NamedTuple):
+    """遅延を補償した照準点"""
+
+    point: Tuple[int, int]  # 送信時刻での照準点 (cx, cy)
+    latency_ms: float  # 撮影から送信までの見込みの遅延[ms]
+    confidence: float  # 照準点の信頼度 (0〜1。外挿する時間が長いほど低い)
+    capture_time: float  # 照準対象を検出したフレームの撮影時刻 (ホストの時刻[ms])
+
+
+class AimLatencyCompensator:
+    """照準点を、撮影からシリアル送信までの遅延だけ先の時刻に外挿するクラス
+
+    検出結果は撮影から推論・トラッキングを経て送信されるまでに古くなっているので、
+    送信時刻 (現在時刻 + 送信待ちの遅延) での位置をトラッカーの速度推定から外挿する。
+    無効にすると最後に検出した位置をそのまま使う (遅延と信頼度は同じように計算するので、
+    有効・無効で命中率を比べられる)。
+    """
+
+    def __init__(self, enabled: bool = True, max_horizon_ms: float = 300.0, default_send_delay_ms: float = 10.0):
+        """
+        enabled: 外挿を行うか
+        max_horizon_ms: 信頼度が0になる撮影からの経過時間[ms]
+        default_send_delay_ms: 送信待ちの遅延が未計測のときに使う値[ms]
+        """
+        self.enabled = enabled
+        self.max_horizon_ms = max_horizon_ms
+        self.default_send_delay_ms = default_send_delay_ms
+
+    def compensate(
+        self,
+        detected_point: Tuple[int, int],
+        capture_timestamp: float,
+        now_timestamp: float,
+        predict: Callable[[float], Optional[Tuple[int, int]]],
+        send_delay_ms: Optional[float] = None,
+        capture_time: Optional[float] = None,
+    ) -> CompensatedAim:
+        """
+        detected_point: 最後に検出した照準点 (cx, cy)
+        capture_timestamp: 照準対象を検出したフレームのタイムスタンプ[ms]
+        now_timestamp: フレームと同じ時計での現在時刻[ms]
+        predict: フレームと同じ時計の時刻[ms]を受け取り、その時刻の照準点を返す関数 (見失っていればNone)
+        send_delay_ms: 照準点を設定してからシリアルに書き込むまでの遅延[ms] (Noneなら既定値)
+        capture_time: 撮影時刻をホストの時刻[ms]で表したもの (Noneなら capture_timestamp と同じ)
+        """
+        if send_delay_ms is None:
+            send_delay_ms = self.default_send_delay_ms
+        send_timestamp = now_timestamp + send_delay_ms
+        latency_ms = max(send_timestamp - capture_timestamp, 0.0)
+
+        point = detected_point
+        if self.enabled:
+            predicted = predict(send_timestamp)
+            if predicted is not None:
+                point = predicted
+        confidence = min(max(1.0 - latency_ms / self.max_horizon_ms, 0.0), 1.0)
+        if capture_time is None:
+            capture_time = capture_timestamp
+        return CompensatedAim(point, latency_ms, confidence, capture_time)
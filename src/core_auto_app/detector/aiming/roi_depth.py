@@ -0,0 +1,144 @@
+import math
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from core_auto_app.detector.aiming.depth_sampling import deproject_pixels, project_points
+
+
+class RoiDepthAligner:
+    """整列前のデプス画像から、カラー画像上のROIに写る深度だけを求めるクラス
+
+    rs.align はデプス画像の全画素をカラー画像に写すが、照準に必要なのは数個の標的の深度だけなので、
+    ROIに写りうるデプス画像の範囲だけを逆投影し、外部パラメータでカラーカメラの座標に変換して
+    ROIに入った点だけを使う。深度はカラーカメラの座標系でのZ[m]で返す。
+    """
+
+    def __init__(
+        self,
+        depth_intrinsics,
+        color_intrinsics,
+        depth_to_color,
+        depth_scale: float = 0.001,
+        min_depth_m: float = 0.2,
+        max_depth_m: float = 10.0,
+        max_samples: int = 4096,
+    ):
+        """
+        depth_intrinsics: デプスストリームの内部パラメータ (rs.intrinsics)
+        color_intrinsics: カラーストリームの内部パラメータ (rs.intrinsics)
+        depth_to_color: デプスからカラーへの外部パラメータ (rs.extrinsics。rotation は列優先の3x3)
+        depth_scale: デプス画像の値1あたりの距離[m]
+        min_depth_m, max_depth_m: ROIに写りうるデプス画像の範囲を求めるときに想定する距離の範囲[m]
+        max_samples: 1つのROIの深度を求めるときに読むデプス画像の画素数の上限 (超える場合は間引く)
+        """
+        self._depth_intrinsics = depth_intrinsics
+        self._color_intrinsics = color_intrinsics
+        self._rotation = np.asarray(depth_to_color.rotation, dtype=np.float64).reshape(3, 3)
+        self._translation = np.asarray(depth_to_color.translation, dtype=np.float64)
+        self._depth_scale = depth_scale
+        self._min_depth_m = min_depth_m
+        self._max_depth_m = max_depth_m
+        self._max_samples = max_samples
+
+    def _depth_window(self, roi: Tuple[float, float, float, float], shape) -> Optional[Tuple[int, int, int, int]]:
+        """カラー画像上のROIに写りうるデプス画像の範囲 (x1, y1, x2, y2) を返す (画像外ならNone)"""
+        x1, y1, x2, y2 = roi
+        corners = np.array([(x1, y1), (x2, y1), (x1, y2), (x2, y2)] * 2, dtype=np.float64)
+        depths = np.repeat([self._min_depth_m, self._max_depth_m], 4)
+        # カラーカメラの座標 → デプスカメラの座標 (rotation は列優先なので p_color = p_depth @ R + t)
+        points = (deproject_pixels(self._color_intrinsics, corners, depths) - self._translation) @ self._rotation.T
+        pixels = project_points(self._depth_intrinsics, points)
+        height, width = shape[:2]
+        wx1, wy1 = np.floor(pixels.min(axis=0)).astype(int) - 1
+        wx2, wy2 = np.ceil(pixels.max(axis=0)).astype(int) + 2
+        wx1, wy1, wx2, wy2 = max(wx1, 0), max(wy1, 0), min(wx2, width), min(wy2, height)
+        if wx1 >= wx2 or wy1 >= wy2:
+            return None
+        return wx1, wy1, wx2, wy2
+
+    def _window_pixels(self, depth_image: np.ndarray, window: Tuple[int, int, int, int], stride: int = 1):
+        """デプス画像の範囲内の有効な画素の座標 (K, 2) と深度[m] (K,) を返す"""
+        wx1, wy1, wx2, wy2 = window
+        values = depth_image[wy1:wy2:stride, wx1:wx2:stride]
+        ys, xs = np.nonzero(values > 0)
+        pixels = np.stack([xs * stride + wx1, ys * stride + wy1], axis=1).astype(np.float64)
+        return pixels, values[ys, xs] * self._depth_scale
+
+    def _to_color(self, pixels: np.ndarray, depths: np.ndarray):
+        """デプス画像の画素をカラー画像の画素座標 (K, 2) とカラーカメラのZ[m] (K,) に写す (カメラの後ろはnan)"""
+        points = deproject_pixels(self._depth_intrinsics, pixels, depths) @ self._rotation + self._translation
+        points[points[:, 2] <= 0] = np.nan
+        return project_points(self._color_intrinsics, points), points[:, 2]
+
+    def sample_depths(
+        self,
+        depth_image: np.ndarray,
+        boxes: Sequence[Sequence[float]],
+        shrink: float = 0.5,
+        percentile: float = 50.0,
+    ) -> np.ndarray:
+        """
+        カラー画像上の各バウンディングボックスの中央部に写る深度の分位点を求める
+
+        depth_image: 整列前のデプス画像
+        boxes: カラー画像上の [(x1, y1, x2, y2), ...]
+        shrink: 深度を取る領域の、ボックスに対する大きさの割合
+        percentile: 深度の分位点 (50で中央値)
+        戻り値: 各ボックスの深度[m] (K,)。有効な画素がなければnan
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        depths = np.full(len(boxes), np.nan)
+        for i, box in enumerate(boxes):
+            center = (box[:2] + box[2:]) / 2
+            half_size = (box[2:] - box[:2]) * shrink / 2
+            roi = (*(center - half_size), *(center + half_size))
+            window = self._depth_window(roi, depth_image.shape)
+            if window is None:
+                continue
+            area = (window[2] - window[0]) * (window[3] - window[1])
+            stride = max(1, math.ceil(math.sqrt(area / self._max_samples)))
+            pixels, z = self._to_color(*self._window_pixels(depth_image, window, stride))
+            inside = (
+                (pixels[:, 0] >= roi[0]) & (pixels[:, 0] <= roi[2])
+                & (pixels[:, 1] >= roi[1]) & (pixels[:, 1] <= roi[3])
+            )
+            if inside.any():
+                depths[i] = np.percentile(z[inside], percentile)
+        return depths
+
+    def align(self, depth_image: np.ndarray, roi: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
+        """
+        カラー画像に整列したデプス画像を、ROIの範囲だけ作る (rs.align の出力の一部に相当)
+
+        depth_image: 整列前のデプス画像
+        roi: カラー画像上の (x1, y1, x2, y2)。Noneならカラー画像全体
+        戻り値: ROIの大きさの整列済みデプス画像 (値の単位は depth_image と同じ。同じ画素に複数写る場合は手前を使う)
+        """
+        if roi is None:
+            roi = (0, 0, self._color_intrinsics.width, self._color_intrinsics.height)
+        x1, y1, x2, y2 = (int(v) for v in roi)
+        aligned = np.zeros((y2 - y1, x2 - x1), dtype=depth_image.dtype)
+        window = self._depth_window((x1, y1, x2 - 1, y2 - 1), depth_image.shape)
+        if window is None:
+            return aligned
+        pixels, depths = self._window_pixels(depth_image, window)
+        # rs.align と同様に、デプスの画素の四隅を写した矩形の範囲の画素に深度を書き込む
+        (p0, z), (p1, _) = (self._to_color(pixels + offset, depths) for offset in (-0.5, 0.5))
+        valid = ~np.isnan(z)
+        u0, v0 = (np.floor(p0[valid] + 0.5).astype(np.intp) - (x1, y1)).T
+        u1, v1 = (np.floor(p1[valid] + 0.5).astype(np.intp) - (x1, y1)).T
+        z = z[valid]
+        index, values = [], []
+        for dv in range(int((v1 - v0).max(initial=0)) + 1):
+            for du in range(int((u1 - u0).max(initial=0)) + 1):
+                u, v = u0 + du, v0 + dv
+                inside = (u <= u1) & (v <= v1) & (u >= 0) & (u < x2 - x1) & (v >= 0) & (v < y2 - y1)
+                index.append(v[inside] * (x2 - x1) + u[inside])
+                values.append(z[inside])
+        index, z = np.concatenate(index), np.concatenate(values)
+        # 同じ画素に写った点のうち最も手前の深度を使う
+        order = np.lexsort((z, index))
+        index, first = np.unique(index[order], return_index=True)
+        aligned.flat[index] = np.rint(z[order][first] / self._depth_scale)
+        return aligned
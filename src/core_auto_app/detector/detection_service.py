@@ -0,0 +1,206 @@
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+from core_auto_app.detector.tracker_utils import ObjectTracker
+from core_auto_app.detector.aiming.aiming_target_selector import AimingTargetSelector
+from core_auto_app.domain.messages import FrameData
+
+if TYPE_CHECKING:
+    from core_auto_app.detector.object_detector import YOLOXDetector
+
+
+class DetectionSubscription:
+    """DetectionServiceに登録したカメラごとの検出状態
+
+    トラッカーと照準対象の選択はカメラごとに独立して持つ
+    """
+
+    def __init__(
+        self,
+        name: str,
+        source: Callable[[int], Optional[FrameData]],
+        image_center=(640, 360),
+        frame_event: Optional[threading.Event] = None,
+    ):
+        """
+        name: カメラの名前
+        source: 引数の通し番号より新しいフレームを待たずに返す関数。なければNoneを返す
+            カラー画像はカメラのフレームリングと共有する読み取り専用の配列で、保持している間はリングのスロットを
+            1つ使い続ける。書き込む場合や長く保持する場合は frame_ring.writable() でコピーする
+        image_center: 照準対象を選ぶときの画像中心
+        frame_event: 新しいフレームが届いたことを検出スレッドに知らせるイベント
+        """
+        self.name = name
+        self.source = source
+        self._frame_event = frame_event
+        self.active = True
+        self.last_frame_id = 0  # 検出済みのフレームの通し番号
+        # False → blue_panel (クラス0) / True → red_panel (クラス1)
+        self.target_panel = False
+
+        self._tracker = ObjectTracker(fps=30.0)
+        self._target_selector = AimingTargetSelector(image_center=image_center)
+
+        self._detection_lock = threading.Lock()
+        self._detection_result = None
+        self._detection_frame: Optional[FrameData] = None
+        self._aiming_target = None
+
+    def notify_new_frame(self):
+        """新しいフレームを公開したことを検出スレッドに知らせる (カメラがフレームを公開するたびに呼ぶ)"""
+        if self._frame_event is not None:
+            self._frame_event.set()
+
+    def set_active(self, active: bool):
+        """検出の対象にするかを設定する"""
+        self.active = active
+
+    def set_target_panel(self, flag: bool):
+        """ターゲットパネルフラグを設定する"""
+        self.target_panel = flag
+
+    @property
+    def target_classes(self):
+        return (1,) if self.target_panel else (0,)
+
+    def update(self, detections, frame_data: FrameData):
+        """検出結果からトラッキングと照準対象の選択を行い、検出したフレームとともに結果を保存する"""
+        tracked_objects = self._tracker.update(detections, frame_data.timestamp)
+        aiming_target = self._target_selector.select_target(tracked_objects)
+        with self._detection_lock:
+            self._detection_result = tracked_objects
+            self._detection_frame = frame_data
+            self._aiming_target = aiming_target
+
+    def get_detection_results(self):
+        """最新の検出結果を取得する"""
+        with self._detection_lock:
+            return self._detection_result
+
+    def get_detection_frame(self) -> Optional[FrameData]:
+        """最新の検出結果が得られたフレームを取得する (カラー画像は source が返した読み取り専用の配列のまま)"""
+        with self._detection_lock:
+            return self._detection_frame
+
+    def get_aiming_target(self):
+        """最新の照準対象を取得する"""
+        with self._detection_lock:
+            return self._aiming_target
+
+    def get_predicted_detection_results(self, timestamp: float):
+        """各トラックの timestamp[ms] (フレームと同じ時計) での位置を外挿した検出結果を取得する"""
+        return self._tracker.predict(timestamp)
+
+    def predict_aiming_target(self, timestamp: float):
+        """照準対象の timestamp[ms] での中心座標を外挿する (照準対象がなければNone)"""
+        return self._tracker.predict_center(self._target_selector.current_target_id, timestamp)
+
+    def draw_detection_results(self, frame, detection_results):
+        """検出結果（トラッキング結果）をフレームに描画する"""
+        if detection_results is not None:
+            self._tracker.draw_boxes(frame, detection_results)
+        return frame
+
+
+class DetectionService:
+    """複数のカメラの最新画像をまとめて1回のバッチ推論で検出するサービス
+
+    カメラごとに subscribe() で登録し、返された DetectionSubscription から結果を取得する。
+    カメラはフレームを公開するたびに DetectionSubscription.notify_new_frame() を呼び、
+    検出スレッドは新しいフレームがなければその通知を待つ。
+    検出器は後から set_detector() で設定してもよく、設定されるまでは推論しない。
+    """
+
+    def __init__(self, detector: Optional["YOLOXDetector"] = None):
+        self._detector = detector
+        self._subscriptions: Dict[str, DetectionSubscription] = {}
+        # 登録したカメラのどれかに新しいフレームが届いたらセットされるイベント
+        self._frame_event = threading.Event()
+        self._is_running = False
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def subscribe(
+        self, name: str, source: Callable[[int], Optional[FrameData]], image_center=(640, 360)
+    ) -> DetectionSubscription:
+        """
+        検出対象のカメラを登録する
+        name: カメラの名前 (重複不可)
+        source: 引数の通し番号より新しいフレームを待たずに返す関数。なければNoneを返す
+            (例: lambda last_frame_id: camera.wait_for_frame(last_frame_id, timeout=0))
+        フレームを公開するたびに、返された DetectionSubscription の notify_new_frame() を呼ぶこと
+        """
+        if name in self._subscriptions:
+            raise ValueError(f"Detection source {name} is already subscribed")
+        subscription = DetectionSubscription(name, source, image_center, self._frame_event)
+        self._subscriptions[name] = subscription
+        return subscription
+
+    def set_detector(self, detector: "YOLOXDetector"):
+        """検出器を設定する (別スレッドで読み込んだ検出器を検出スレッドの開始後に設定してもよい)"""
+        self._detector = detector
+
+    def start(self):
+        """検出スレッドを開始する"""
+        if not self._is_running:
+            print("start detection service")
+            self._is_running = True
+            self._thread = threading.Thread(target=self._update_detection, daemon=True)
+            self._thread.start()
+        else:
+            print("Detection service is already running")
+
+    def stop(self):
+        """検出スレッドを停止する"""
+        if self._is_running:
+            print("stop detection service")
+            self._is_running = False
+            self._frame_event.set()
+            if self._thread is not None:
+                self._thread.join()
+            self._thread = None
+
+    def _update_detection(self):
+        """有効な全カメラの最新画像を集めてバッチ推論し、カメラごとに結果を配るスレッド用メソッド"""
+        while self._is_running:
+            if self._detector is None:
+                # 検出器の読み込みが終わるまで待機する
+                time.sleep(0.01)
+                continue
+            # 取得の前にクリアするので、取得の途中で届いたフレームの通知は次の待機で受け取れる
+            self._frame_event.clear()
+            subscriptions = []
+            frames = []
+            for subscription in list(self._subscriptions.values()):
+                if not subscription.active:
+                    continue
+                # 検出済みのフレームは再検出しない
+                frame_data = subscription.source(subscription.last_frame_id)
+                if frame_data is None:
+                    continue
+                subscriptions.append(subscription)
+                frames.append(frame_data)
+
+            if not frames:
+                # 新しいフレームがなければ、どれかのカメラから通知が来るまで待機する
+                # (通知しないカメラがあっても止まらないように、時間切れでも取得し直す)
+                self._frame_event.wait(0.1)
+                continue
+
+            detections = self._detector.predict_batch(
+                [frame_data.color for frame_data in frames],
+                [subscription.target_classes for subscription in subscriptions],
+            )
+            for subscription, dets, frame_data in zip(subscriptions, detections, frames):
+                subscription.last_frame_id = frame_data.frame_id
+                subscription.update(dets, frame_data)
+
+    def close(self):
+        print("closing detection service")
+        self.stop()
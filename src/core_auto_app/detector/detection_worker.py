@@ -0,0 +1,487 @@
+import contextlib
+import multiprocessing
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Callable, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core_auto_app.domain.messages import FrameData
+
+# 結果のメールボックスの先頭の値
+# (フレームの通し番号, タイムスタンプ[ms], トラッカーの最終更新時刻[秒], 照準対象ID, 照準点 cx, cy,
+#  トラック数, 推論時間[ms], 検出したフレーム数, 書き込み中で読み飛ばしたフレーム数)
+_RESULT_HEADER = 10
+# 1トラックあたりの値 (x1, y1, x2, y2, track_id, vx, vy)
+_TRACK_FIELDS = 7
+# フレームのメールボックスの値 (通し番号, タイムスタンプ[ms], スロット番号, スロットの seq, ターゲットパネル)
+_FRAME_FIELDS = 5
+
+
+class SeqlockBuffer:
+    """共有メモリ上の固定長の配列を、書き込み側が1つの seqlock で受け渡すクラス
+
+    書き込み側は seq を奇数にしてから値を書き、書き終えたら偶数に戻す。読み出し側は前後の seq が
+    同じ偶数のときだけ読んだ値を使うので、書き込み途中の値を読まずに済む。
+
+    NumPy の読み書きにはメモリバリアがないので、ロックなしで正しく受け渡せるのはストアの順番が
+    入れ替わらない x86 だけ。aarch64 (Jetson) などでは値の書き込みより先に偶数の seq が見えることがあるので、
+    lock にプロセス間のロックを渡し、読み書きをそのロックの中で行う (取得・解放がバリアになる)。
+    """
+
+    def __init__(self, shape: Tuple[int, ...], dtype, name: Optional[str] = None, lock=None):
+        """
+        shape, dtype: 受け渡す配列の形と型
+        name: 既存の共有メモリの名前 (Noneなら新しく作る)
+        lock: 読み書きを囲むプロセス間のロック (multiprocessing の Lock。Noneならロックを使わない)
+        """
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self._lock = lock
+        size = 8 + int(np.prod(self.shape)) * self.dtype.itemsize
+        self._owner = name is None
+        # 開いた側 (spawn したワーカープロセス) は作成したプロセスと resource_tracker を共有するので、
+        # 解放の登録は作成したプロセスの unlink() で1回だけ外れる
+        self._shm = shared_memory.SharedMemory(name=name, create=self._owner, size=size)
+        self._seq = np.ndarray((1,), dtype=np.int64, buffer=self._shm.buf)
+        self.data = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf, offset=8)
+        if self._owner:
+            self._seq[0] = 0
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def seq(self) -> int:
+        """書き込みの回数の2倍 (書き込み中は奇数)"""
+        return int(self._seq[0])
+
+    def write(self, values) -> int:
+        """値を書き込み、書き込み後の seq を返す"""
+        with self._lock or contextlib.nullcontext():
+            self._seq[0] += 1
+            np.copyto(self.data, values)
+            self._seq[0] += 1
+            return int(self._seq[0])
+
+    def read(self, out: np.ndarray, retries: int = 3) -> Optional[int]:
+        """
+        値を out にコピーし、読んだ値の seq を返す (書き込みと重なり続けた場合はNone)
+        """
+        for _ in range(retries):
+            with self._lock or contextlib.nullcontext():
+                seq = int(self._seq[0])
+                if not seq & 1:
+                    np.copyto(out, self.data)
+                    if int(self._seq[0]) == seq:
+                        return seq
+            time.sleep(0)
+        return None
+
+    def close(self) -> None:
+        """共有メモリを閉じる (作成したプロセスでは解放もする)"""
+        del self._seq, self.data
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+class _WorkerResult(NamedTuple):
+    """結果のメールボックスから読んだ検出結果"""
+
+    tracked_objects: list  # [(x1, y1, x2, y2, track_id), ...]
+    aiming_target: Optional[Tuple[int, int]]
+    frame: Optional[FrameData]  # 検出したフレーム (送ったフレームが残っていなければNone)
+    target_id: Optional[int]
+    track_ids: np.ndarray  # (K,)
+    boxes: np.ndarray  # (K, 4) 外挿前のボックス
+    velocities: np.ndarray  # (K, 2) [px/秒]
+    last_time: Optional[float]  # トラッカーの最終更新時刻[秒]
+
+
+def create_yolox_detector(
+    weight_path: str,
+    backend: str = "cuda",
+    warmup_iterations: int = 3,
+    target_latency_ms: Optional[float] = None,
+):
+    """ワーカープロセスの中で YOLOXDetector を読み込み、ウォームアップする (DetectionWorker の detector_factory 用)"""
+    from core_auto_app.detector.object_detector import YOLOXDetector
+
+    detector = YOLOXDetector(
+        weight_path, score_thr=0.8, nmsthre=0.45, backend=backend, target_latency_ms=target_latency_ms
+    )
+    detector.warmup(warmup_iterations)
+    return detector
+
+
+def _run_worker(
+    detector_factory: Callable[[], object],
+    frame_shape: Tuple[int, ...],
+    slot_names: Sequence[str],
+    frame_box_name: str,
+    result_box_name: str,
+    locks: Sequence[object],
+    max_tracks: int,
+    max_dt: float,
+    ready_event,
+    frame_event,
+    stop_event,
+):
+    """ワーカープロセスの本体: 共有メモリのフレームを検出・追跡し、結果をメールボックスに書く"""
+    from core_auto_app.detector.tracker_utils import ObjectTracker
+    from core_auto_app.detector.aiming.aiming_target_selector import AimingTargetSelector
+
+    *slot_locks, frame_lock, result_lock = locks
+    slots = [SeqlockBuffer(frame_shape, np.uint8, name, lock) for name, lock in zip(slot_names, slot_locks)]
+    frame_box = SeqlockBuffer((_FRAME_FIELDS,), np.float64, frame_box_name, frame_lock)
+    result_box = SeqlockBuffer(
+        (_RESULT_HEADER + max_tracks * _TRACK_FIELDS,), np.float64, result_box_name, result_lock
+    )
+    try:
+        detector = detector_factory()
+        tracker = ObjectTracker(fps=30.0)
+        tracker.tracker.max_dt = max_dt
+        selector = AimingTargetSelector(image_center=(frame_shape[1] // 2, frame_shape[0] // 2))
+        ready_event.set()
+
+        frame = np.empty(frame_shape, dtype=np.uint8)
+        meta = np.empty(_FRAME_FIELDS)
+        result = np.zeros(result_box.shape)
+        last_frame_id = 0
+        processed = 0
+        torn = 0
+        while not stop_event.is_set():
+            # 新しいフレームの通知を待つ (停止を確認するため、時間切れでも戻る)
+            if not frame_event.wait(0.1):
+                continue
+            # 読む前にクリアするので、読んでいる間に届いたフレームの通知は次の待機で受け取れる
+            frame_event.clear()
+            if frame_box.read(meta) is None or meta[0] <= last_frame_id:
+                continue
+            frame_id, timestamp, slot_index, slot_seq, target_panel = meta.tolist()
+            # 読んでいる間にスロットが次のフレームで上書きされたら、そのフレームは捨てる
+            if slots[int(slot_index)].read(frame) != int(slot_seq):
+                torn += 1
+                continue
+            last_frame_id = frame_id
+
+            start = time.perf_counter()
+            detections = detector.predict(frame, target_classes=(1,) if target_panel else (0,))
+            infer_ms = (time.perf_counter() - start) * 1000.0
+            tracked_objects = tracker.update(detections, timestamp)
+            aiming_target = selector.select_target(tracked_objects)
+            processed += 1
+
+            track_ids, boxes, velocities, tracker_time = tracker.tracker.snapshot()
+            count = min(len(track_ids), max_tracks)
+            result[:_RESULT_HEADER] = (
+                frame_id,
+                timestamp,
+                np.nan if tracker_time is None else tracker_time,
+                np.nan if selector.current_target_id is None else selector.current_target_id,
+                np.nan if aiming_target is None else aiming_target[0],
+                np.nan if aiming_target is None else aiming_target[1],
+                count,
+                infer_ms,
+                processed,
+                torn,
+            )
+            rows = result[_RESULT_HEADER:].reshape(max_tracks, _TRACK_FIELDS)
+            rows[:count, 0:4] = boxes[:count]
+            rows[:count, 4] = track_ids[:count]
+            rows[:count, 5:7] = velocities[:count]
+            result_box.write(result)
+    finally:
+        for buffer in (*slots, frame_box, result_box):
+            buffer.close()
+
+
+class DetectionWorker:
+    """物体検出・トラッキング・照準対象の選択を別プロセスで行うクラス
+
+    前処理・後処理の Python の処理がカメラやシリアル通信のスレッドとGILを取り合わないよう、
+    検出器は detector_factory でワーカープロセスの中に作る。フレームは共有メモリのスロットに書いて
+    メールボックスに置き、イベントでワーカーを起こす。結果は別のメールボックスから読む。
+    スロットとメールボックスはそれぞれプロセス間のロックの中で読み書きする (SeqlockBuffer を参照)。
+
+    結果の取得用のメソッドは DetectionSubscription と同じなので、カメラからは共有の検出サービスと同様に扱える。
+    フレーム全体の推論のみに対応する。
+    """
+
+    def __init__(
+        self,
+        detector_factory: Callable[[], object],
+        frame_shape: Tuple[int, int, int] = (720, 1280, 3),
+        num_slots: int = 3,
+        max_tracks: int = 64,
+        max_dt: float = 1.0,
+    ):
+        """
+        detector_factory: ワーカープロセスの中で検出器を作る関数 (pickle できること。例: functools.partial(create_yolox_detector, ...))
+            検出器は predict(frame, target_classes=...) で [(x1, y1, x2, y2, score, cls_id), ...] を返すこと
+        frame_shape: 受け渡すカラー画像の形
+        num_slots: フレームを書き込む共有メモリのスロット数 (3以上なら、ワーカーが読んでいるスロットは通常上書きされない)
+        max_tracks: 結果で受け渡すトラック数の上限
+        max_dt: 外挿に使う経過時間の上限[秒] (VectorizedTracker と同じ)
+        """
+        self._detector_factory = detector_factory
+        self._frame_shape = tuple(frame_shape)
+        self._num_slots = num_slots
+        self._max_tracks = max_tracks
+        self._max_dt = max_dt
+        self._source: Optional[Callable[[int], Optional[FrameData]]] = None
+        self.active = True
+        # False → blue_panel (クラス0) / True → red_panel (クラス1)
+        self.target_panel = False
+
+        self._context = multiprocessing.get_context("spawn")  # CUDAを使うので fork は使わない
+        self._process = None
+        self._ready_event = self._context.Event()
+        self._frame_event = self._context.Event()  # フレームをメールボックスに置いたらセットする
+        self._stop_event = self._context.Event()
+        self._slots = []
+        self._frame_box: Optional[SeqlockBuffer] = None
+        self._result_box: Optional[SeqlockBuffer] = None
+        self._is_running = False
+        self._feed_thread = None
+        self._next_slot = 0
+        # 検出中のフレームを結果と対応付けるため、送ったフレームをスロット数だけ残しておく
+        self._sent_frames = deque(maxlen=num_slots)
+        self._sent_count = 0
+        self._result_seq = 0
+        self._result: Optional[_WorkerResult] = None
+        # 表示やシリアル通信のスレッドから同時に結果を読んでもよいように、結果の更新をロックする
+        self._result_lock = threading.Lock()
+        self._drawer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def set_source(self, source: Callable[[int], Optional[FrameData]]):
+        """
+        検出するフレームの取得元を設定する
+        source: 引数の通し番号より新しいフレームを返す関数。なければNoneを返す
+            (例: lambda last_frame_id: camera.wait_for_frame(last_frame_id, timeout=0.1))
+        """
+        self._source = source
+
+    def notify_new_frame(self):
+        """DetectionSubscription と同じメソッド (ワーカーはカメラの条件変数で待つので何もしない)"""
+
+    def set_active(self, active: bool):
+        """検出の対象にするかを設定する"""
+        self.active = active
+
+    def set_target_panel(self, flag: bool):
+        """ターゲットパネルフラグを設定する"""
+        self.target_panel = flag
+
+    def start(self):
+        """ワーカープロセスとフレームを送るスレッドを開始する (検出器の読み込みはワーカープロセスで行う)"""
+        if self._is_running:
+            print("Detection worker is already running")
+            return
+        print("start detection worker")
+        # スロットごと・メールボックスごとのロック (ワーカープロセスにも同じ順番で渡す)
+        locks = [self._context.Lock() for _ in range(self._num_slots + 2)]
+        *slot_locks, frame_lock, result_lock = locks
+        self._slots = [SeqlockBuffer(self._frame_shape, np.uint8, lock=lock) for lock in slot_locks]
+        self._frame_box = SeqlockBuffer((_FRAME_FIELDS,), np.float64, lock=frame_lock)
+        self._result_box = SeqlockBuffer(
+            (_RESULT_HEADER + self._max_tracks * _TRACK_FIELDS,), np.float64, lock=result_lock
+        )
+        self._frame_event.clear()
+        self._stop_event.clear()
+        self._process = self._context.Process(
+            target=_run_worker,
+            args=(
+                self._detector_factory,
+                self._frame_shape,
+                [slot.name for slot in self._slots],
+                self._frame_box.name,
+                self._result_box.name,
+                locks,
+                self._max_tracks,
+                self._max_dt,
+                self._ready_event,
+                self._frame_event,
+                self._stop_event,
+            ),
+            daemon=True,
+        )
+        self._process.start()
+        self._is_running = True
+        self._feed_thread = threading.Thread(target=self._feed_frames, daemon=True)
+        self._feed_thread.start()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """ワーカープロセスで検出器の準備ができるまで待つ (タイムアウトしたらFalse)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._ready_event.wait(0.1):
+            if self._process is None or not self._process.is_alive():
+                raise RuntimeError("Detection worker exited before the detector became ready")
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+        return True
+
+    def stop(self):
+        """ワーカープロセスを停止し、共有メモリを解放する"""
+        if not self._is_running:
+            return
+        print("stop detection worker")
+        self._is_running = False
+        self._feed_thread.join()
+        self._feed_thread = None
+        # 強制終了したワーカーがロックを持ったままだと読めないので、止める前に集計する
+        print(f"detection worker: {self.get_stats()}")
+        self._stop_event.set()
+        self._frame_event.set()  # 通知を待っているワーカーを起こす
+        self._process.join(timeout=5.0)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._process = None
+        with self._result_lock:
+            for buffer in (*self._slots, self._frame_box, self._result_box):
+                buffer.close()
+            self._slots = []
+            self._frame_box = None
+            self._result_box = None
+
+    def close(self):
+        print("closing detection worker")
+        self.stop()
+
+    def _feed_frames(self):
+        """新しいフレームを共有メモリのスロットに書き、ワーカープロセスに通知するスレッド用メソッド"""
+        last_frame_id = 0
+        while self._is_running:
+            source = self._source
+            if source is None or not self.active:
+                time.sleep(0.01)
+                continue
+            frame_data = source(last_frame_id)
+            if frame_data is None:
+                continue
+            last_frame_id = frame_data.frame_id
+            if frame_data.color.shape != self._frame_shape:
+                print(f"Detection worker expects frames of shape {self._frame_shape}, got {frame_data.color.shape}")
+                continue
+            # 直前に通知したスロットは読まれている可能性が高いので、順番に次のスロットに書く
+            index = self._next_slot
+            self._next_slot = (index + 1) % self._num_slots
+            slot_seq = self._slots[index].write(frame_data.color)
+            self._sent_frames.append(frame_data)
+            self._frame_box.write(
+                (frame_data.frame_id, frame_data.timestamp, index, slot_seq, float(self.target_panel))
+            )
+            self._frame_event.set()
+            self._sent_count += 1
+
+    def _latest(self) -> Optional[_WorkerResult]:
+        """結果のメールボックスから最新の検出結果を読む (更新がなければ前回の結果を使い回す)"""
+        with self._result_lock:
+            return self._read_result()
+
+    def _read_result(self) -> Optional[_WorkerResult]:
+        """_latest() の本体 (_result_lock の中で呼ぶ)"""
+        result_box = self._result_box
+        if result_box is None:
+            return self._result
+        seq = result_box.seq
+        if seq == self._result_seq or seq == 0:
+            return self._result
+        values = np.empty(result_box.shape)
+        seq = result_box.read(values)
+        if seq is None:
+            return self._result
+
+        frame_id, timestamp, last_time, target_id, cx, cy, count = values[:7].tolist()
+        rows = values[_RESULT_HEADER:].reshape(self._max_tracks, _TRACK_FIELDS)[: int(count)]
+        boxes = rows[:, 0:4]
+        track_ids = rows[:, 4].astype(np.int64)
+        # ワーカーの ObjectTracker.update() と同じく0方向に切り捨てる
+        tracked_objects = [
+            (box[0], box[1], box[2], box[3], track_id)
+            for box, track_id in zip(boxes.astype(int).tolist(), track_ids.tolist())
+        ]
+        frame = next((f for f in list(self._sent_frames) if f.frame_id == int(frame_id)), None)
+        result = _WorkerResult(
+            tracked_objects,
+            None if np.isnan(cx) else (int(cx), int(cy)),
+            frame,
+            None if np.isnan(target_id) else int(target_id),
+            track_ids,
+            boxes,
+            rows[:, 5:7],
+            None if np.isnan(last_time) else last_time,
+        )
+        self._result, self._result_seq = result, seq
+        return result
+
+    def get_detection_results(self):
+        """最新の検出結果を取得する"""
+        result = self._latest()
+        return None if result is None else result.tracked_objects
+
+    def get_detection_frame(self) -> Optional[FrameData]:
+        """最新の検出結果が得られたフレームを取得する"""
+        result = self._latest()
+        return None if result is None else result.frame
+
+    def get_aiming_target(self):
+        """最新の照準対象を取得する"""
+        result = self._latest()
+        return None if result is None else result.aiming_target
+
+    def get_predicted_detection_results(self, timestamp: float):
+        """各トラックの timestamp[ms] (フレームと同じ時計) での位置を外挿した検出結果を取得する"""
+        result = self._latest()
+        if result is None:
+            return []
+        # VectorizedTracker.predict() と同じ等速運動の外挿
+        dt = 0.0
+        if result.last_time is not None:
+            dt = min(max(timestamp / 1000.0 - result.last_time, 0.0), self._max_dt)
+        boxes = result.boxes + np.tile(result.velocities * dt, 2)
+        return [
+            (box[0], box[1], box[2], box[3], track_id)
+            for track_id, box in zip(result.track_ids.tolist(), boxes.astype(int).tolist())
+        ]
+
+    def predict_aiming_target(self, timestamp: float):
+        """照準対象の timestamp[ms] での中心座標を外挿する (照準対象がなければNone)"""
+        result = self._latest()
+        if result is None or result.target_id is None:
+            return None
+        for (x1, y1, x2, y2, track_id) in self.get_predicted_detection_results(timestamp):
+            if track_id == result.target_id:
+                return ((x1 + x2) // 2, (y1 + y2) // 2)
+        return None
+
+    def draw_detection_results(self, frame, detection_results):
+        """検出結果（トラッキング結果）をフレームに描画する"""
+        if detection_results is not None:
+            if self._drawer is None:
+                from core_auto_app.detector.tracker_utils import ObjectTracker
+
+                self._drawer = ObjectTracker()
+            self._drawer.draw_boxes(frame, detection_results)
+        return frame
+
+    def get_stats(self):
+        """送ったフレーム数・検出したフレーム数・読み飛ばしたフレーム数と、最新の推論時間[ms]を返す"""
+        stats = {"sent": self._sent_count, "detected": 0, "skipped": 0, "infer_ms": 0.0}
+        if self._result_box is not None:
+            values = np.empty(self._result_box.shape)
+            if self._result_box.read(values) is not None:
+                stats["infer_ms"], stats["detected"], stats["skipped"] = values[7:10].tolist()
+                stats["detected"], stats["skipped"] = int(stats["detected"]), int(stats["skipped"])
+        return stats
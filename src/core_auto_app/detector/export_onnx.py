@@ -0,0 +1,66 @@
+import argparse
+
+import torch
+
+from core_auto_app.detector.inference_backend import build_yolox_model
+
+
+def parse_args() -> argparse.Namespace:
+    """コマンドライン引数をパースする"""
+    parser = argparse.ArgumentParser(description="export YOLOX weight (.pth) to ONNX")
+    parser.add_argument(
+        "--weight_path",
+        default="/home/nvidia/core_auto_app/models/yolox_s/phase1_2_best_ckpt.pth",
+        type=str,
+        help="path to YOLOX weight file (.pth)",
+    )
+    parser.add_argument(
+        "--output_path",
+        default="/home/nvidia/core_auto_app/models/yolox_s/phase1_2_best_ckpt.onnx",
+        type=str,
+        help="path to write the exported ONNX model",
+    )
+    parser.add_argument(
+        "--input_size",
+        default=[704, 1280],
+        nargs=2,
+        type=int,
+        help="model input size (height width)",
+    )
+    parser.add_argument(
+        "--opset",
+        default=11,
+        type=int,
+        help="ONNX opset version",
+    )
+    args = parser.parse_args()
+    return args
+
+
+def export_onnx(weight_path: str, output_path: str, input_size=(704, 1280), opset: int = 11) -> None:
+    """
+    YOLOXの重みをONNX形式で書き出す
+    推論バックエンド間で後処理を共通化するため、出力はdecode済み (1, N, 5 + num_classes) とする
+    """
+    model = build_yolox_model(weight_path, device="cpu")
+    model.head.decode_in_inference = True
+
+    dummy_input = torch.zeros(1, 3, input_size[0], input_size[1])
+    torch.onnx.export(
+        model,
+        dummy_input,
+        output_path,
+        input_names=["images"],
+        output_names=["output"],
+        opset_version=opset,
+    )
+    print(f"Exported ONNX model to {output_path}")
+
+
+def main():
+    args = parse_args()
+    export_onnx(args.weight_path, args.output_path, tuple(args.input_size), args.opset)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Tuple
+
+import numpy as np
+import torch
+from yolox.exp import get_exp
+
+from core_auto_app.detector.object_class import CLASS_NAMES
+
+# 選択可能な推論バックエンド名
+BACKEND_NAMES = ["cuda", "cpu", "onnx"]
+
+
+def build_yolox_model(model_path: str, device: str = "cpu") -> torch.nn.Module:
+    """
+    学習済みのYOLOX-sモデルを構築して重みを読み込む
+    model_path: 学習済みモデル(pthファイル)へのパス
+    device: モデルを配置するデバイス ("cuda" or "cpu")
+    """
+    exp = get_exp(None, "yolox-s")
+    exp.num_classes = len(CLASS_NAMES)  # クラス数をリソースに合わせる
+    model = exp.get_model()
+    model.eval()
+
+    ckpt = torch.load(model_path, map_location=device)
+    model.load_state_dict(ckpt["model"])
+    model.to(device)
+    return model
+
+
+class InferenceBackend(ABC):
+    """YOLOXの推論エンジンのインターフェース
+
+    入力は前処理済みの (1, 3, H, W) float32 配列、
+    出力はYOLOXの生の推論結果 (1, N, 5 + num_classes) のtorch.Tensor。
+    """
+
+    name = ""
+    # バッチサイズ・画像サイズの異なる入力を推論できるか
+    supports_dynamic_input = False
+
+    @abstractmethod
+    def infer(self, img: np.ndarray) -> torch.Tensor:
+        pass
+
+
+class TorchBackend(InferenceBackend):
+    """PyTorchでYOLOXを推論するバックエンド (CUDA / CPU)"""
+
+    supports_dynamic_input = True
+
+    def __init__(self, model_path: str, device: str = "cuda"):
+        self.name = device
+        self.device = device
+        self.model = build_yolox_model(model_path, device)
+        # GPU上の入力テンソル (毎フレームの確保を避けるため、入力形状ごとに使い回す)
+        self._device_inputs: Dict[Tuple[int, ...], torch.Tensor] = {}
+
+    def infer(self, img: np.ndarray) -> torch.Tensor:
+        # CPUの場合はfrom_numpyでメモリを共有するだけでコピーは発生しない
+        tensor = torch.from_numpy(img)
+        if self.device != "cpu":
+            device_input = self._device_inputs.get(img.shape)
+            if device_input is None:
+                device_input = torch.empty(tensor.shape, dtype=tensor.dtype, device=self.device)
+                self._device_inputs[img.shape] = device_input
+            device_input.copy_(tensor)
+            tensor = device_input
+        with torch.no_grad():
+            return self.model(tensor)
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """エクスポート済みのONNXモデルをONNX RuntimeのCPUで推論するバックエンド
+
+    ONNXモデルは export_onnx.py で decode 済みの出力を持つ形式で書き出したものを想定
+    (入力サイズはエクスポート時に固定されるため、ROI推論には使えない)
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path: str):
+        # onnxruntimeはオプション依存なので、使う場合のみimportする
+        import onnxruntime as ort
+
+        self.session = ort.InferenceSession(
+            model_path, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def infer(self, img: np.ndarray) -> torch.Tensor:
+        outputs = self.session.run(None, {self.input_name: img})
+        return torch.from_numpy(outputs[0])
+
+
+def create_backend(name: str, model_path: str) -> InferenceBackend:
+    """
+    バックエンド名から推論バックエンドを生成する
+    name: "cuda" / "cpu" (PyTorch, pthファイル) または "onnx" (ONNX Runtime, onnxファイル)
+    """
+    if name in ("cuda", "cpu"):
+        return TorchBackend(model_path, device=name)
+    if name == "onnx":
+        return OnnxRuntimeBackend(model_path)
+    raise ValueError(f"Unknown inference backend: {name} (choose from {BACKEND_NAMES})")
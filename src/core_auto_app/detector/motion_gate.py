@@ -0,0 +1,89 @@
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+import cv2
+import numpy as np
+
+from core_auto_app.domain.messages import RobotStateId
+
+
+class MotionGate:
+    """シーンに変化がないときに物体検出の推論を間引くためのクラス
+
+    縮小したグレースケール画像を、最後に推論したフレームと比較し、
+    画素値の平均差分が閾値未満なら推論を省略する (直前のトラッキング結果を使い続ける)。
+    ロボットが待機中の状態 (撃破中など) では、変化に関係なく推論を idle_interval 秒に1回に抑える。
+    """
+
+    def __init__(
+        self,
+        threshold: float = 2.0,
+        max_interval: float = 0.5,
+        idle_interval: float = 1.0,
+        idle_states: Iterable[RobotStateId] = (RobotStateId.DEFEATED,),
+        downscale_size=(160, 90),
+    ):
+        """
+        threshold: 推論を行う画素値の平均差分 (0〜255) の閾値
+        max_interval: 変化がなくても推論を行う最大間隔[秒]
+        idle_interval: 待機中の状態での推論間隔[秒]
+        idle_states: 待機中とみなすロボットの状態
+        downscale_size: 比較に使う縮小画像のサイズ (幅, 高さ)
+        """
+        self.threshold = threshold
+        self.max_interval = max_interval
+        self.idle_interval = idle_interval
+        self.idle_states = set(idle_states)
+        self.downscale_size = downscale_size
+
+        self._reference: Optional[np.ndarray] = None  # 最後に推論したフレームの縮小画像
+        self._small = np.empty((downscale_size[1], downscale_size[0], 3), dtype=np.uint8)
+        self._last_inference_time = 0.0
+
+        self._stats_lock = threading.Lock()
+        self._inferred = 0
+        self._skipped = 0
+
+    def should_infer(self, frame: np.ndarray, robot_state_id: Optional[RobotStateId] = None, now=None) -> bool:
+        """
+        frame: カラー画像 (BGR形式)
+        robot_state_id: ロボットの状態 (Noneなら状態による間引きはしない)
+        now: 現在時刻[秒] (Noneなら time.monotonic())
+        戻り値: 推論を行うべきならTrue
+        """
+        if now is None:
+            now = time.monotonic()
+        elapsed = now - self._last_inference_time
+
+        if robot_state_id in self.idle_states:
+            infer = elapsed >= self.idle_interval
+        elif self._reference is None or elapsed >= self.max_interval:
+            infer = True
+        else:
+            infer = self._difference(frame) >= self.threshold
+
+        with self._stats_lock:
+            if infer:
+                self._inferred += 1
+            else:
+                self._skipped += 1
+        if infer:
+            # 推論するフレームを次の比較の基準にする
+            self._reference = self._downscale(frame).astype(np.int16)
+            self._last_inference_time = now
+        return infer
+
+    def get_stats(self) -> Dict[str, int]:
+        """推論した回数と省略した回数を返す"""
+        with self._stats_lock:
+            return {"inferred": self._inferred, "skipped": self._skipped}
+
+    def _downscale(self, frame: np.ndarray) -> np.ndarray:
+        cv2.resize(frame, self.downscale_size, dst=self._small, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY)
+
+    def _difference(self, frame: np.ndarray) -> float:
+        """基準フレームとの画素値の平均差分"""
+        small = self._downscale(frame).astype(np.int16)
+        return float(np.abs(small - self._reference).mean())
@@ -1,27 +1,49 @@
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
 import torch
 import cv2
 import numpy as np
-from yolox.data.data_augment import preproc
-from yolox.exp import get_exp
-from yolox.utils import postprocess
+from torchvision.ops import nms
 from core_auto_app.detector.object_class import CLASS_NAMES  # 追加
+from core_auto_app.detector.adaptive_resolution import AdaptiveResolutionController
+from core_auto_app.detector.inference_backend import create_backend
+from core_auto_app.detector.preprocess import FramePreprocessor, RoiBatchPreprocessor
 
 class YOLOXDetector:
-    def __init__(self, model_path: str, score_thr: float = 0.8, nmsthre: float = 0.45):
+    def __init__(
+        self,
+        model_path: str,
+        score_thr: float = 0.8,
+        nmsthre: float = 0.45,
+        backend: str = "cuda",
+        target_latency_ms: Optional[float] = None,
+    ):
         """
-        model_path: 学習済みモデル(pthファイル)へのパス
+        model_path: 学習済みモデルへのパス (cuda/cpuはpthファイル、onnxはonnxファイル)
         score_thr: 物体を検出する閾値（デフォルト0.8）
         nmsthre: NMS(重複を減らすための処理)のしきい値
+        backend: 推論バックエンド ("cuda", "cpu", "onnx")
+        target_latency_ms: 推論時間の目標[ms]。指定すると predict() の推論画像サイズを
+            目標を守るように切り替える (入力サイズ可変のバックエンドのみ。Noneなら固定)
         """
-        self.exp = get_exp(None, "yolox-s")
-        self.exp.num_classes = len(CLASS_NAMES)  # クラス数をリソースに合わせる
-        self.model = self.exp.get_model()
-        self.model.eval()
-
-        # モデル重み読み込み
-        ckpt = torch.load(model_path, map_location="cuda")
-        self.model.load_state_dict(ckpt["model"])
-        self.model.to("cuda")
+        self.num_classes = len(CLASS_NAMES)  # クラス数をリソースに合わせる
+        self.input_size = (704, 1280)  # 推論画像サイズ (高さ, 幅)
+        self.backend = create_backend(backend, model_path)
+        self.preprocessor = FramePreprocessor(self.input_size)
+        # 推論時間に応じた推論画像サイズの切り替え (サイズごとの前処理は使うときに作る)
+        self.adaptive_resolution: Optional[AdaptiveResolutionController] = None
+        self._adaptive_preprocessors: Dict[Tuple[int, int], FramePreprocessor] = {}
+        if target_latency_ms is not None:
+            if self.backend.supports_dynamic_input:
+                self.adaptive_resolution = AdaptiveResolutionController(target_latency_ms)
+            else:
+                print(f"Backend {self.backend.name} does not support adaptive input resolution. Using a fixed size.")
+        # 追跡中の物体周辺のみを推論するときの切り出し領域の前処理
+        self.roi_preprocessor = RoiBatchPreprocessor(roi_size=320)
+        # 複数フレームをまとめて推論するときのバッチ入力 (predict_batch() で必要になったときに確保)
+        self._batch_input: Optional[np.ndarray] = None
+        self._batch_preprocessors = []
 
         self.score_thr = score_thr
         self.nmsthre = nmsthre
@@ -32,46 +54,213 @@ class YOLOXDetector:
         self.size_x_thr = 15
         self.size_y_thr = 50
 
-    def predict(self, frame: np.ndarray):
+        # 返す検出結果の最大数 (スコアの高い順)
+        self.max_detections = 1
+
+    def predict(self, frame: np.ndarray, target_classes: Optional[Sequence[int]] = None):
         """
         frame: カメラから取得したカラー画像 (BGR形式)
+        target_classes: 検出対象とするクラスIDのリスト (Noneなら全クラス)
         戻り値: [(x1, y1, x2, y2, score, cls_id), ...] 形式の検出結果リスト
         """
-        img, ratio = preproc(frame, (704, 1280))
-        img = torch.from_numpy(img).unsqueeze(0)
-        img = img.float().to("cuda")
+        if self.adaptive_resolution is None:
+            img, ratio, offset = self.preprocessor(frame)
+            return self.infer(img, ratio, offset, target_classes)
+
+        # 推論 + 後処理の時間を計測し、次のフレームの推論画像サイズを決める
+        img, ratio, offset = self._get_preprocessor(self.adaptive_resolution.current_size)(frame)
+        start = time.perf_counter()
+        detections = self.infer(img, ratio, offset, target_classes)
+        self.adaptive_resolution.record((time.perf_counter() - start) * 1000.0)
+        return detections
+
+    @property
+    def current_input_size(self) -> Tuple[int, int]:
+        """predict() で使う推論画像サイズ (高さ, 幅)"""
+        if self.adaptive_resolution is None:
+            return self.input_size
+        return self.adaptive_resolution.current_size
+
+    def _get_preprocessor(self, size: Tuple[int, int]) -> FramePreprocessor:
+        """推論画像サイズごとの前処理を返す"""
+        if size == tuple(self.input_size):
+            return self.preprocessor
+        if size not in self._adaptive_preprocessors:
+            self._adaptive_preprocessors[size] = FramePreprocessor(size)
+        return self._adaptive_preprocessors[size]
+
+    def warmup(self, iterations: int = 3, frame_shape=(720, 1280, 3)) -> None:
+        """
+        ダミー画像で推論を数回実行し、CUDAの初期化やメモリ確保を起動時に済ませておく
+        (試合中の最初の推論が遅くならないようにする。推論画像サイズを切り替える場合は全サイズで行う)
+        iterations: サイズごとの推論の回数
+        frame_shape: カメラ画像のサイズ (高さ, 幅, チャンネル)
+        """
+        frame = np.zeros(frame_shape, dtype=np.uint8)
+        sizes = [tuple(self.input_size)]
+        if self.adaptive_resolution is not None:
+            sizes = self.adaptive_resolution.resolutions
+        for size in sizes:
+            preprocessor = self._get_preprocessor(size)
+            for _ in range(iterations):
+                img, ratio, offset = preprocessor(frame)
+                self.infer(img, ratio, offset)
+
+    def infer(
+        self,
+        img: np.ndarray,
+        ratio: float,
+        offset: Tuple[int, int],
+        target_classes: Optional[Sequence[int]] = None,
+    ):
+        """
+        前処理済みの入力を推論し、後処理して検出結果を返す (前処理と推論を別スレッドで行う場合に使う)
+        img, ratio, offset: FramePreprocessor の戻り値
+        target_classes: 検出対象とするクラスIDのリスト (Noneなら全クラス)
+        戻り値: predict() と同じ形式の検出結果リスト
+        """
+        outputs = self.backend.infer(img)
+        with torch.no_grad():
+            candidates = self._filter_candidates(outputs[0], ratio, offset, target_classes)
+            return self._select(candidates)
+
+    def predict_batch(
+        self,
+        frames: Sequence[np.ndarray],
+        target_classes: Optional[Sequence[Optional[Sequence[int]]]] = None,
+    ):
+        """
+        複数のフレーム (複数カメラの最新画像など) をまとめて推論する
+        frames: カラー画像 (BGR形式) のリスト
+        target_classes: フレームごとの検出対象クラスIDのリスト (Noneなら全フレームで全クラス)
+        戻り値: フレームごとの predict() と同じ形式の検出結果リストのリスト
+        """
+        if not frames:
+            return []
+        if target_classes is None:
+            target_classes = [None] * len(frames)
+
+        # フレーム数が増えたときのみバッチ入力バッファを確保し直す
+        if len(frames) > len(self._batch_preprocessors):
+            self._batch_input = np.empty((len(frames), 3) + tuple(self.input_size), dtype=np.float32)
+            self._batch_preprocessors = [
+                FramePreprocessor(self.input_size, buffer=self._batch_input[i:i + 1])
+                for i in range(len(frames))
+            ]
+
+        ratios = []
+        offsets = []
+        for frame, preprocessor in zip(frames, self._batch_preprocessors):
+            _, ratio, offset = preprocessor(frame)
+            ratios.append(ratio)
+            offsets.append(offset)
+
+        img = self._batch_input[:len(frames)]
+        if self.backend.supports_dynamic_input:
+            outputs = self.backend.infer(img)
+        else:
+            # バッチサイズ固定のバックエンドは1枚ずつ推論する
+            outputs = torch.cat([self.backend.infer(img[i:i + 1]) for i in range(len(frames))])
+
+        with torch.no_grad():
+            return [
+                self._select(self._filter_candidates(output, ratio, offset, classes))
+                for output, ratio, offset, classes in zip(outputs, ratios, offsets, target_classes)
+            ]
+
+    @property
+    def supports_rois(self) -> bool:
+        """predict_rois() が使えるか (入力サイズ可変のバックエンドのみ対応)"""
+        return self.backend.supports_dynamic_input
+
+    def predict_rois(
+        self,
+        frame: np.ndarray,
+        rois: Sequence[Tuple[int, int, int, int]],
+        target_classes: Optional[Sequence[int]] = None,
+    ):
+        """
+        フレームの一部領域のみを1回のバッチ推論で検出する
+        frame: カメラから取得したカラー画像 (BGR形式)
+        rois: 切り出し領域のリスト [(x1, y1, x2, y2), ...]
+        target_classes: 検出対象とするクラスIDのリスト (Noneなら全クラス)
+        戻り値: predict() と同じ形式の検出結果リスト (座標はフレーム全体の座標系)
+        """
+        if not rois:
+            return []
+        img, ratios, offsets = self.roi_preprocessor(frame, rois)
 
+        outputs = self.backend.infer(img)
         with torch.no_grad():
-            outputs = self.model(img)
-            outputs = postprocess(
-                outputs, 
-                self.exp.num_classes, 
-                self.score_thr, 
-                self.nmsthre, 
-                class_agnostic=True
-            )
-
-        if outputs[0] is None:
+            candidates = [
+                self._filter_candidates(output, ratio, offset, target_classes)
+                for output, ratio, offset in zip(outputs, ratios, offsets)
+            ]
+            candidates = [c for c in candidates if c is not None]
+            if not candidates:
+                return []
+            # 領域が重なっている場合に備えて、全領域の候補をまとめてNMSにかける
+            return self._select(tuple(torch.cat(tensors) for tensors in zip(*candidates)))
+
+    def _filter_candidates(
+        self,
+        output: torch.Tensor,
+        ratio: float,
+        offset: Tuple[int, int],
+        target_classes: Optional[Sequence[int]],
+    ):
+        """
+        YOLOXの生の推論結果 (N, 5 + num_classes) から検出候補を絞り込む
+        スコア・クラス・サイズの条件をまとめてテンソル演算で適用する
+        戻り値: (boxes, int_boxes, scores, class_pred) のテンソル、候補がなければNone
+        """
+        # スコア = objectness * クラス確率 (最大クラス)
+        class_conf, class_pred = torch.max(output[:, 5:5 + self.num_classes], dim=1)
+        scores = output[:, 4] * class_conf
+
+        mask = scores >= self.score_thr
+        if target_classes is not None:
+            class_ids = torch.as_tensor(list(target_classes), device=output.device)
+            mask &= torch.isin(class_pred, class_ids)
+        if not mask.any():
+            return None
+
+        # (cx, cy, w, h) → (x1, y1, x2, y2) に変換し、元画像のスケールに戻す
+        cxcywh = output[mask, :4]
+        boxes = torch.cat([cxcywh[:, :2] - cxcywh[:, 2:] / 2, cxcywh[:, :2] + cxcywh[:, 2:] / 2], dim=1)
+        boxes = boxes / ratio
+        boxes[:, 0::2] += offset[0]
+        boxes[:, 1::2] += offset[1]
+        scores = scores[mask]
+        class_pred = class_pred[mask]
+
+        # 物体の幅または高さが閾値未満なら除外
+        int_boxes = boxes.int()
+        size_mask = ((int_boxes[:, 2] - int_boxes[:, 0]) >= self.size_x_thr) & (
+            (int_boxes[:, 3] - int_boxes[:, 1]) >= self.size_y_thr
+        )
+        if not size_mask.any():
+            return None
+        return boxes[size_mask], int_boxes[size_mask], scores[size_mask], class_pred[size_mask]
+
+    def _select(self, candidates):
+        """
+        検出候補にNMSをかけ、スコアの高い順に max_detections 個を検出結果のリストにする
+        """
+        if candidates is None:
             return []
+        boxes, int_boxes, scores, class_pred = candidates
+
+        # クラスに依存しないNMS (インデックスはスコアの降順で返る)
+        keep = nms(boxes, scores, self.nmsthre)[:self.max_detections]
 
-        bboxes = outputs[0][:, 0:4].cpu() / ratio
-        scores = (outputs[0][:, 4] * outputs[0][:, 5]).cpu()
-        classes = outputs[0][:, 6].cpu().numpy().astype(int)
-
-        results = []
-        for bbox, score, cls_id in zip(bboxes, scores, classes):
-            x1, y1, x2, y2 = bbox.numpy().astype(int)
-            # 物体の幅または高さが閾値未満なら除外
-            if (x2 - x1) < self.size_x_thr or (y2 - y1) < self.size_y_thr:
-                continue
-            results.append((x1, y1, x2, y2, score.item(), cls_id))
-
-        # スコアが0.8以上の検出結果のみを対象とし、最もスコアが高いものを採用
-        valid_results = [det for det in results if det[4] >= self.score_thr]
-        if valid_results:
-            best_detection = max(valid_results, key=lambda det: det[4])
-            return [best_detection]
-        return []
+        int_boxes = int_boxes[keep].cpu().tolist()
+        scores = scores[keep].cpu().tolist()
+        class_pred = class_pred[keep].cpu().tolist()
+        return [
+            (x1, y1, x2, y2, score, cls_id)
+            for (x1, y1, x2, y2), score, cls_id in zip(int_boxes, scores, class_pred)
+        ]
 
     def draw_boxes(self, frame: np.ndarray, detections):
         """
@@ -0,0 +1,218 @@
+import queue
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core_auto_app.detector.preprocess import FramePreprocessor
+from core_auto_app.domain.messages import FrameData
+
+if TYPE_CHECKING:
+    from core_auto_app.detector.object_detector import YOLOXDetector
+    from core_auto_app.detector.tracker_utils import ObjectTracker
+    from core_auto_app.detector.aiming.aiming_target_selector import AimingTargetSelector
+
+
+class DropOldestQueue:
+    """上限付きのスレッド間キュー
+
+    満杯のときに put() すると最も古い要素を捨てるので、後段が遅れても遅延が積み上がらない
+    """
+
+    def __init__(self, maxsize: int = 1):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.dropped = 0  # 捨てた要素の数
+
+    def put(self, item):
+        """要素を追加する。満杯で捨てた要素があればそれを返す"""
+        dropped_item = None
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                dropped_item = self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+        return dropped_item
+
+    def get(self, timeout: Optional[float] = None):
+        """要素を取り出す。timeout秒以内に要素が来なければNoneを返す"""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+
+class StageTimer:
+    """パイプラインの段ごとの処理時間を集計するクラス"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+
+    def record(self, elapsed: float) -> None:
+        with self._lock:
+            self._count += 1
+            self._total += elapsed
+            self._max = max(self._max, elapsed)
+
+    def summary(self, reset: bool = False) -> Tuple[int, float, float]:
+        """
+        戻り値: (処理回数, 平均処理時間[ms], 最大処理時間[ms])
+        reset: Trueなら集計をリセットする
+        """
+        with self._lock:
+            count, total, maximum = self._count, self._total, self._max
+            if reset:
+                self._count = 0
+                self._total = 0.0
+                self._max = 0.0
+        mean = total / count if count else 0.0
+        return count, mean * 1000.0, maximum * 1000.0
+
+
+class DetectionPipeline:
+    """前処理・推論・トラッキングを別スレッドの段に分けて並行に実行する検出パイプライン
+
+    前処理 → [キュー] → 推論+後処理 → [キュー] → トラッキング+照準対象の選択
+    フレームNの推論中にフレームN+1の前処理を行う。キューは満杯なら古い要素を捨てる。
+    """
+
+    STAGES = ("preprocess", "inference", "tracking")
+
+    def __init__(
+        self,
+        detector: "YOLOXDetector",
+        tracker: "ObjectTracker",
+        target_selector: "AimingTargetSelector",
+        source: Callable[[int], Optional[FrameData]],
+        target_classes: Callable[[], Sequence[int]],
+        on_result: Callable[[list, Optional[Tuple[int, int]], FrameData], None],
+        queue_size: int = 1,
+        report_interval: float = 5.0,
+        gate: Optional[Callable[[np.ndarray], bool]] = None,
+    ):
+        """
+        detector, tracker, target_selector: 各段で使う検出器・トラッカー・照準対象選択
+        source: 引数の通し番号より新しいフレームが届くまで待って返す関数 (タイムアウトしたらNone)
+        target_classes: 検出対象のクラスIDのリストを返す関数
+        on_result: トラッキング結果・照準対象・検出したフレームを受け取るコールバック
+        queue_size: 段の間のキューの長さ
+        report_interval: 段ごとの処理時間を表示する間隔[秒] (0以下なら表示しない)
+        gate: カラー画像を受け取り、推論を省略するならFalseを返す関数 (Noneなら全フレームを推論)
+        """
+        self._detector = detector
+        self._tracker = tracker
+        self._target_selector = target_selector
+        self._source = source
+        self._target_classes = target_classes
+        self._on_result = on_result
+        self._report_interval = report_interval
+        self._gate = gate
+
+        self._input_queue = DropOldestQueue(queue_size)
+        self._result_queue = DropOldestQueue(queue_size)
+        # 前処理中・キュー内・推論中の入力が同じバッファを共有しないよう、キュー長 + 2 個の
+        # 前処理バッファを用意し、推論が終わったものと捨てられたものを空きに戻して使い回す
+        self._free_preprocessors = queue.Queue()
+        for _ in range(queue_size + 2):
+            self._free_preprocessors.put(FramePreprocessor(detector.input_size))
+
+        self._timers: Dict[str, StageTimer] = {stage: StageTimer() for stage in self.STAGES}
+        self._is_running = False
+        self._threads = []
+
+    def start(self) -> None:
+        if self._is_running:
+            return
+        self._is_running = True
+        self._threads = [
+            threading.Thread(target=self._preprocess_stage, daemon=True),
+            threading.Thread(target=self._inference_stage, daemon=True),
+            threading.Thread(target=self._tracking_stage, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        if not self._is_running:
+            return
+        self._is_running = False
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def get_stage_timings(self) -> Dict[str, Tuple[int, float, float]]:
+        """段ごとの (処理回数, 平均処理時間[ms], 最大処理時間[ms]) を返す"""
+        return {stage: timer.summary() for stage, timer in self._timers.items()}
+
+    def get_dropped_counts(self) -> Dict[str, int]:
+        """キューごとに捨てた要素の数を返す"""
+        return {"input": self._input_queue.dropped, "result": self._result_queue.dropped}
+
+    def _preprocess_stage(self) -> None:
+        last_report = time.perf_counter()
+        last_frame_id = 0
+        while self._is_running:
+            frame_data = self._source(last_frame_id)
+            if frame_data is None:
+                continue
+            last_frame_id = frame_data.frame_id
+            if self._gate is not None and not self._gate(frame_data.color):
+                continue
+
+            try:
+                preprocessor = self._free_preprocessors.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            start = time.perf_counter()
+            img, ratio, offset = preprocessor(frame_data.color)
+            dropped = self._input_queue.put(
+                (frame_data, preprocessor, img, ratio, offset, tuple(self._target_classes()))
+            )
+            if dropped is not None:
+                self._free_preprocessors.put(dropped[1])
+            self._timers["preprocess"].record(time.perf_counter() - start)
+
+            if self._report_interval > 0 and start - last_report >= self._report_interval:
+                self._report()
+                last_report = start
+
+    def _inference_stage(self) -> None:
+        while self._is_running:
+            item = self._input_queue.get(timeout=0.1)
+            if item is None:
+                continue
+            start = time.perf_counter()
+            frame_data, preprocessor, img, ratio, offset, target_classes = item
+            detections = self._detector.infer(img, ratio, offset, target_classes)
+            self._free_preprocessors.put(preprocessor)
+            self._result_queue.put((frame_data, detections))
+            self._timers["inference"].record(time.perf_counter() - start)
+
+    def _tracking_stage(self) -> None:
+        while self._is_running:
+            item = self._result_queue.get(timeout=0.1)
+            if item is None:
+                continue
+            start = time.perf_counter()
+            frame_data, detections = item
+            tracked_objects = self._tracker.update(detections, frame_data.timestamp)
+            aiming_target = self._target_selector.select_target(tracked_objects)
+            self._on_result(tracked_objects, aiming_target, frame_data)
+            self._timers["tracking"].record(time.perf_counter() - start)
+
+    def _report(self) -> None:
+        """段ごとの処理時間を表示する"""
+        timings = " ".join(
+            f"{stage}={mean:.1f}/{maximum:.1f}ms(n={count})"
+            for stage, (count, mean, maximum) in self.get_stage_timings().items()
+        )
+        dropped = self.get_dropped_counts()
+        print(f"detection pipeline mean/max: {timings} dropped: {dropped}")
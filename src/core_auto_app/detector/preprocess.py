@@ -0,0 +1,174 @@
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+class FramePreprocessor:
+    """YOLOXの入力テンソルを事前確保したバッファ上で作る前処理クラス
+
+    YOLOXのpreprocと同じレターボックス (左上詰めのリサイズ + 114埋め) を行うが、
+    毎フレームの配列確保を避けるため、(1, 3, H, W) float32 の入力バッファを使い回す。
+    入力画像と推論画像のサイズ差が crop_tolerance 以下の場合 (1280x720 → 1280x704 など) は、
+    リサイズせずに中央を切り出す (ビューを取るだけなのでコピーはHWC→CHWの変換1回のみ)。
+
+    注意: 戻り値の配列は次の呼び出しで上書きされる
+    """
+
+    def __init__(
+        self,
+        input_size: Tuple[int, int] = (704, 1280),
+        crop_tolerance: int = 16,
+        pad_value: int = 114,
+        buffer: Optional[np.ndarray] = None,
+    ):
+        """
+        input_size: 推論画像サイズ (高さ, 幅)
+        crop_tolerance: 切り出しで対応する高さ・幅の差の最大値[px] (0なら常にリサイズ)
+        pad_value: レターボックスの余白の値
+        buffer: 書き込み先の (1, 3, H, W) float32 配列 (バッチ入力の一部を渡す場合など。Noneなら確保する)
+        """
+        self.input_size = input_size
+        self.crop_tolerance = crop_tolerance
+        self.pad_value = pad_value
+
+        if buffer is None:
+            buffer = np.empty((1, 3, input_size[0], input_size[1]), dtype=np.float32)
+        self._input = buffer
+        self._resized: Optional[np.ndarray] = None
+        # 直前のフレームサイズとその前処理方法のキャッシュ
+        self._frame_shape = None
+        self._ratio = 1.0
+        self._offset = (0, 0)
+        self._crop: Optional[Tuple[slice, slice]] = None
+
+    def _configure(self, frame_shape) -> None:
+        """フレームサイズに応じて前処理方法を決め、バッファを準備する"""
+        in_h, in_w = self.input_size
+        h, w = frame_shape[:2]
+        self._frame_shape = frame_shape
+
+        diff_h, diff_w = h - in_h, w - in_w
+        if 0 <= diff_h <= self.crop_tolerance and 0 <= diff_w <= self.crop_tolerance:
+            # 中央切り出し: スケールは1、座標は切り出し位置だけずれる
+            top, left = diff_h // 2, diff_w // 2
+            self._crop = (slice(top, top + in_h), slice(left, left + in_w))
+            self._ratio = 1.0
+            self._offset = (left, top)
+            self._resized = None
+            return
+
+        # レターボックス: 余白部分はフレームサイズが変わらない限り書き換わらないので一度だけ埋める
+        self._crop = None
+        self._ratio = min(in_h / h, in_w / w)
+        self._offset = (0, 0)
+        resized_h, resized_w = int(h * self._ratio), int(w * self._ratio)
+        self._resized = np.empty((resized_h, resized_w, 3), dtype=np.uint8)
+        self._input.fill(self.pad_value)
+
+    def __call__(self, frame: np.ndarray) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+        """
+        frame: カメラから取得したカラー画像 (BGR形式, HWC)
+        戻り値: (入力テンソル (1, 3, H, W), 縮小率, 元画像座標へのオフセット (x, y))
+            元画像の座標は 推論画像の座標 / 縮小率 + オフセット で求まる
+        """
+        if frame.shape != self._frame_shape:
+            self._configure(frame.shape)
+
+        if self._crop is not None:
+            src = frame[self._crop]
+        else:
+            cv2.resize(
+                frame,
+                (self._resized.shape[1], self._resized.shape[0]),
+                dst=self._resized,
+                interpolation=cv2.INTER_LINEAR,
+            )
+            src = self._resized
+
+        # HWC(uint8) → CHW(float32) の変換を入力バッファに直接書き込む
+        h, w = src.shape[:2]
+        np.copyto(self._input[0, :, :h, :w], src.transpose(2, 0, 1))
+        return self._input, self._ratio, self._offset
+
+
+class RoiBatchPreprocessor:
+    """フレームから切り出した複数の領域を1つのバッチ入力 (B, 3, S, S) にまとめる前処理クラス
+
+    領域が roi_size より大きい場合は縮小し、正方形でない場合はレターボックスで埋める。
+    入力バッファは最大の領域数分を確保して使い回す。
+
+    注意: 戻り値の配列は次の呼び出しで上書きされる
+    """
+
+    def __init__(self, roi_size: int = 320, max_rois: int = 8, pad_value: int = 114):
+        """
+        roi_size: 推論する正方形の領域サイズ[px] (32の倍数)
+        max_rois: 1回のバッチで推論する領域数の上限
+        pad_value: レターボックスの余白の値
+        """
+        self.roi_size = roi_size
+        self.max_rois = max_rois
+        self.pad_value = pad_value
+        self._input = np.empty((max_rois, 3, roi_size, roi_size), dtype=np.float32)
+
+    def __call__(
+        self, frame: np.ndarray, rois: Sequence[Tuple[int, int, int, int]]
+    ) -> Tuple[np.ndarray, List[float], List[Tuple[int, int]]]:
+        """
+        frame: カメラから取得したカラー画像 (BGR形式, HWC)
+        rois: 切り出し領域のリスト [(x1, y1, x2, y2), ...] (max_rois個を超えた分は無視する)
+        戻り値: (入力テンソル (B, 3, S, S), 領域ごとの縮小率, 領域ごとのオフセット (x, y))
+        """
+        rois = rois[:self.max_rois]
+        ratios = []
+        offsets = []
+        for i, (x1, y1, x2, y2) in enumerate(rois):
+            src = frame[y1:y2, x1:x2]
+            h, w = src.shape[:2]
+            ratio = min(self.roi_size / h, self.roi_size / w, 1.0)
+            if ratio < 1.0:
+                src = cv2.resize(src, (int(w * ratio), int(h * ratio)), interpolation=cv2.INTER_LINEAR)
+                h, w = src.shape[:2]
+            if h < self.roi_size or w < self.roi_size:
+                self._input[i].fill(self.pad_value)
+            np.copyto(self._input[i, :, :h, :w], src.transpose(2, 0, 1))
+            ratios.append(ratio)
+            offsets.append((x1, y1))
+        return self._input[:len(rois)], ratios, offsets
+
+
+def compute_rois(
+    boxes: Sequence[Tuple[int, int, int, int]],
+    motions: Sequence[Tuple[float, float]],
+    frame_shape,
+    roi_size: int = 320,
+    margin: float = 0.5,
+) -> List[Tuple[int, int, int, int]]:
+    """
+    追跡中の物体の周辺に推論領域を設定する
+    boxes: 追跡中の物体のバウンディングボックス [(x1, y1, x2, y2), ...]
+    motions: 物体ごとの1フレームあたりの移動量 [(dx, dy), ...]
+    frame_shape: フレームの形状 (高さ, 幅, ...)
+    roi_size: 領域の最小サイズ[px]
+    margin: 物体サイズに対して上下左右に加える余白の割合
+    戻り値: フレーム内に収めた領域のリスト [(x1, y1, x2, y2), ...]
+    """
+    frame_h, frame_w = frame_shape[:2]
+    rois = []
+    for (x1, y1, x2, y2), (dx, dy) in zip(boxes, motions):
+        # 次のフレームの予測位置を中心に、物体サイズ + 余白 + 移動量 を覆う正方形とする
+        cx = (x1 + x2) / 2 + dx
+        cy = (y1 + y2) / 2 + dy
+        side = max(
+            (x2 - x1) * (1 + 2 * margin) + 2 * abs(dx),
+            (y2 - y1) * (1 + 2 * margin) + 2 * abs(dy),
+            roi_size,
+        )
+        width = int(min(side, frame_w))
+        height = int(min(side, frame_h))
+        # フレームからはみ出す場合は内側にずらす
+        left = int(np.clip(cx - width / 2, 0, frame_w - width))
+        top = int(np.clip(cy - height / 2, 0, frame_h - height))
+        rois.append((left, top, left + width, top + height))
+    return rois
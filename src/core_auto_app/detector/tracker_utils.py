@@ -1,6 +1,7 @@
-from motpy import Detection, MultiObjectTracker
 import cv2
+import numpy as np
 from core_auto_app.detector.object_class import CLASS_NAMES
+from core_auto_app.detector.vectorized_tracker import VectorizedTracker, compute_iou_matrix
 
 def compute_iou(boxA, boxB):
     # boxA, boxB: [x1, y1, x2, y2]
@@ -20,69 +21,94 @@ class ObjectTracker:
     def __init__(self, fps=18.99):
         """
         fps: カメラ映像のフレームレートを想定
-             dt = 1/fps で時間刻みを設定している
+             update() にタイムスタンプを渡さない場合は dt = 1/fps で時間刻みを設定している
         """
-        self.tracker = MultiObjectTracker(
-            dt=1/fps,
-            model_spec={
-                'order_pos': 1, 'dim_pos': 2,
-                'order_size': 0, 'dim_size': 2,
-                'q_var_pos': 5000., 'r_var_pos': 0.1
-            }
-        )
-        self.track_id_counter = 1
-        self.track_ids = {}
-        # トラックごとに最新のクラスIDを保持する辞書
+        # 全トラックの状態を配列で持つトラッカー (運動モデルは以前のmotpyの設定と同じ)
+        self.tracker = VectorizedTracker(dt=1/fps, q_var_pos=5000., r_var_pos=0.1)
+        # トラックごとに最新のクラスIDを保持する辞書 (track_idがキー)
         self.track_cls = {}
+        # トラックごとの前回の中心座標と、1回の更新あたりの移動量 (track_idがキー)
+        self.track_centers = {}
+        self.track_motion = {}
 
-    def update(self, detections):
+    def update(self, detections, timestamp=None):
         """
         detections: [(x1, y1, x2, y2, score, cls_id), ...]
           YOLOXDetector で取得した検出結果をそのまま入れられる形。
-          motpyが必要とするDetection(box=[x1, y1, x2, y2], score=score)に変換。
-        
+        timestamp: 検出したフレームのタイムスタンプ[ms] (FrameData.timestamp)
+          前回の更新からの実際の経過時間で予測する。Noneなら 1/fps 経過したとみなす。
+
         戻り値: [(x1, y1, x2, y2, track_id), ...]
           なお、トラックに紐付いたクラス情報は self.track_cls に記録される。
         """
-        motpy_dets = []
-        for (x1, y1, x2, y2, score, cls_id) in detections:
-            d = Detection(box=[x1, y1, x2, y2], score=score)
-            # 各Detectionにクラス情報を付加
-            d.cls_id = cls_id
-            motpy_dets.append(d)
+        det_array = np.array([det[:4] for det in detections], dtype=np.float64).reshape(-1, 4)
+        det_cls = [det[5] for det in detections]
+
+        # 全トラックをまとめてステップ更新
+        track_ids, track_boxes = self.tracker.step(
+            det_array, None if timestamp is None else timestamp / 1000.0
+        )
+        int_boxes = track_boxes.astype(int)  # int() と同じく0方向に切り捨てる
 
-        # motpyでステップ更新
-        self.tracker.step(motpy_dets)
-        tracks = self.tracker.active_tracks()
+        # 各トラックに対して最も重なりのある検出からクラス情報を取得（IoU行列で一括計算）
+        # IoUが一定以上ならクラス情報として採用（閾値例：0.3）
+        best_det = None
+        best_iou = None
+        if len(det_cls) and len(track_ids):
+            iou = compute_iou_matrix(int_boxes, det_array)
+            best_det = iou.argmax(axis=1)
+            best_iou = iou[np.arange(len(track_ids)), best_det]
 
         results = []
         # 更新ごとにクラス情報のマッピングを再構築
         self.track_cls = {}
-        for track in tracks:
-            if track.id not in self.track_ids:
-                self.track_ids[track.id] = self.track_id_counter
-                self.track_id_counter += 1
-
-            track_id = self.track_ids[track.id]
-            box = list(map(int, track.box))
+        prev_centers = self.track_centers
+        self.track_centers = {}
+        self.track_motion = {}
+        for i, (track_id, box) in enumerate(zip(track_ids.tolist(), int_boxes.tolist())):
             results.append((box[0], box[1], box[2], box[3], track_id))
 
-            # ヒューリスティックにより、各トラックに対して最も重なりのある検出からクラス情報を取得
-            best_iou = 0.0
-            best_cls = None
-            for (x1, y1, x2, y2, score, cls_id) in detections:
-                iou = compute_iou(box, [x1, y1, x2, y2])
-                if iou > best_iou:
-                    best_iou = iou
-                    best_cls = cls_id
-            # IoUが一定以上ならクラス情報として採用（閾値例：0.3）
-            if best_iou > 0.3 and best_cls is not None:
-                self.track_cls[track.id] = best_cls
+            # 前回の更新からの中心座標の移動量を記録
+            center = ((box[0] + box[2]) / 2, (box[1] + box[3]) / 2)
+            prev_center = prev_centers.get(track_id, center)
+            self.track_centers[track_id] = center
+            self.track_motion[track_id] = (center[0] - prev_center[0], center[1] - prev_center[1])
+
+            if best_iou is not None and best_iou[i] > 0.3:
+                self.track_cls[track_id] = det_cls[best_det[i]]
             else:
-                self.track_cls[track.id] = None
+                self.track_cls[track_id] = None
 
         return results
 
+    def predict(self, timestamp):
+        """
+        検出結果で更新せずに、各トラックの timestamp[ms] での位置を外挿する
+        (検出と検出の間に現在時刻での位置を問い合わせる場合に使う。timestampはフレームと同じ時計)
+        戻り値: update() と同じ形式の [(x1, y1, x2, y2, track_id), ...]
+        """
+        track_ids, track_boxes = self.tracker.predict(timestamp / 1000.0)
+        return [
+            (box[0], box[1], box[2], box[3], track_id)
+            for track_id, box in zip(track_ids.tolist(), track_boxes.astype(int).tolist())
+        ]
+
+    def predict_center(self, track_id, timestamp):
+        """
+        指定したトラックの timestamp[ms] での中心座標 (cx, cy) を外挿する (トラックがなければNone)
+        """
+        for (x1, y1, x2, y2, predicted_id) in self.predict(timestamp):
+            if predicted_id == track_id:
+                return ((x1 + x2) // 2, (y1 + y2) // 2)
+        return None
+
+    def get_motions(self, tracked_objects):
+        """
+        tracked_objects: [(x1, y1, x2, y2, track_id), ...]
+        戻り値: 各トラックの1回の更新あたりの移動量 [(dx, dy), ...]
+        """
+        return [self.track_motion.get(track_id, (0.0, 0.0)) for (_, _, _, _, track_id) in tracked_objects]
+
     def draw_boxes(self, frame, tracked_objects):
         """
         tracked_objects: [(x1, y1, x2, y2, track_id), ...]
@@ -92,14 +118,8 @@ class ObjectTracker:
             cx = (x1 + x2) // 2
             cy = (y1 + y2) // 2
             cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            # 逆引きして元のトラックID（motpy内部のID）を取得
-            orig_track_id = None
-            for k, v in self.track_ids.items():
-                if v == track_id:
-                    orig_track_id = k
-                    break
-            if orig_track_id is not None and orig_track_id in self.track_cls and self.track_cls[orig_track_id] is not None:
-                cls_id = self.track_cls[orig_track_id]
+            cls_id = self.track_cls.get(track_id)
+            if cls_id is not None:
                 class_name = CLASS_NAMES[cls_id] if cls_id < len(CLASS_NAMES) else "unknown"
             else:
                 class_name = "unknown"
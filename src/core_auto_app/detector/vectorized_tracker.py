@@ -0,0 +1,267 @@
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # scipyがなければ貪欲法で対応付ける
+    linear_sum_assignment = None
+
+# 状態ベクトル [cx, vx, cy, vy, w, h] のうち観測する要素 (cx, cy, w, h) のインデックス
+_MEASURED = np.array([0, 2, 4, 5])
+_STATE_DIM = 6
+_EPS = 1e-7
+
+
+def compute_iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    全ての組み合わせのIoUを一度に計算する
+    boxes_a: (N, 4) の [x1, y1, x2, y2]
+    boxes_b: (M, 4) の [x1, y1, x2, y2]
+    戻り値: (N, M) のIoU行列
+    """
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    union = np.clip(area_a[:, None] + area_b[None, :] - inter, 0, None)
+    return inter / (union + _EPS)
+
+
+def match_tracks(iou: np.ndarray, min_iou: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    IoUの合計が最大になるようにトラックと検出を1対1で対応付ける (motpyと同じ。scipyがなければ貪欲法)
+    iou: (トラック数, 検出数) のIoU行列
+    戻り値: IoUが min_iou 以上の組の (トラックのインデックス, 検出のインデックス) の配列の組
+    """
+    if iou.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if linear_sum_assignment is None:
+        return match_greedy(iou, min_iou)
+    rows, cols = linear_sum_assignment(-iou)
+    keep = iou[rows, cols] >= min_iou
+    return rows[keep], cols[keep]
+
+
+def match_greedy(iou: np.ndarray, min_iou: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    IoUの大きい組から順にトラックと検出を1対1で対応付ける
+    iou: (トラック数, 検出数) のIoU行列
+    戻り値: (トラックのインデックス, 検出のインデックス) の配列の組
+    """
+    rows, cols = np.nonzero(iou >= min_iou)
+    if len(rows) == 0:
+        return rows, cols
+    order = np.argsort(-iou[rows, cols], kind="stable")
+    used_rows = set()
+    used_cols = set()
+    matched_rows = []
+    matched_cols = []
+    for row, col in zip(rows[order], cols[order]):
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        matched_rows.append(row)
+        matched_cols.append(col)
+    return np.array(matched_rows, dtype=np.int64), np.array(matched_cols, dtype=np.int64)
+
+
+class VectorizedTracker:
+    """全トラックの状態を配列で持ち、カルマンフィルタの予測・更新をまとめて行う多物体トラッカー
+
+    motpyの MultiObjectTracker (等速度モデル + 大きさ一定モデル) と同じ運動モデル・
+    トラックの生成/削除の規則を、トラックごとのオブジェクトを作らずにNumPyの配列演算で実装したもの。
+    トラックと検出の対応付けはIoU行列に対する線形割り当て (scipyがなければ貪欲法) で行う。
+
+    状態ベクトルは [cx, vx, cy, vy, w, h] (中心座標・速度・幅・高さ)。
+    トラックIDは1からの通し番号で、そのまま表示用のIDとして使える。
+
+    step() にフレームのタイムスタンプを渡すと、前回の更新からの実際の経過時間で予測する
+    (推論が遅れたり間引かれたりしても速度の推定がずれない)。predict() で任意の時刻の位置を外挿できる。
+    """
+
+    def __init__(
+        self,
+        dt: float,
+        max_dt: float = 1.0,
+        q_var_pos: float = 5000.0,
+        q_var_size: float = 10.0,
+        r_var_pos: float = 0.1,
+        r_var_size: float = 1.0,
+        p_cov_p0: float = 1000.0,
+        min_iou: float = 0.1,
+        max_staleness: float = 12.0,
+        max_staleness_to_positive_ratio: float = 3.0,
+    ):
+        """
+        dt: タイムスタンプを指定しない場合の更新1回あたりの時間刻み[秒]
+        max_dt: 予測に使う経過時間の上限[秒] (長時間検出が途切れたときに発散しないようにする)
+        q_var_pos, q_var_size: 位置・大きさのプロセスノイズの分散
+        r_var_pos, r_var_size: 位置・大きさの観測ノイズの分散
+        p_cov_p0: 状態の共分散の初期値
+        min_iou: トラックと検出を対応付けるIoUの最小値
+        max_staleness: 検出が対応付かない状態がこの値に達したトラックを削除する
+        max_staleness_to_positive_ratio: 検出が対応付かない度合いと対応付いた回数の比がこの値未満のトラックを出力する
+        """
+        self.dt = dt
+        self.max_dt = max_dt
+        self.q_var_pos = q_var_pos
+        self.q_var_size = q_var_size
+        self.p_cov_p0 = p_cov_p0
+        self.min_iou = min_iou
+        self.max_staleness = max_staleness
+        self.max_staleness_to_positive_ratio = max_staleness_to_positive_ratio
+
+        self._R = np.diag([r_var_pos, r_var_pos, r_var_size, r_var_size])
+        self._identity = np.eye(_STATE_DIM)
+
+        # トラックごとの状態 (行がトラック)
+        self._x = np.zeros((0, _STATE_DIM))
+        self._P = np.zeros((0, _STATE_DIM, _STATE_DIM))
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._staleness = np.zeros(0)
+        self._steps_positive = np.zeros(0, dtype=np.int64)
+        self._next_id = 1
+        self._last_time: Optional[float] = None  # 最後に更新したフレームの時刻[秒]
+        # step() と predict() を別スレッドから呼べるようにする
+        self._lock = threading.Lock()
+
+    def _build_model(self, dt: float) -> Tuple[np.ndarray, np.ndarray]:
+        """時間刻み dt の状態遷移行列 F とプロセスノイズ Q を作る"""
+        F = np.eye(_STATE_DIM)
+        F[0, 1] = F[2, 3] = dt
+        # 位置と速度の離散白色ノイズ (filterpy の Q_discrete_white_noise と同じ)
+        q_pos = self.q_var_pos * np.array([[dt ** 4 / 4, dt ** 3 / 2], [dt ** 3 / 2, dt ** 2]])
+        Q = np.zeros((_STATE_DIM, _STATE_DIM))
+        Q[0:2, 0:2] = q_pos
+        Q[2:4, 2:4] = q_pos
+        Q[4, 4] = Q[5, 5] = self.q_var_size
+        return F, Q
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @staticmethod
+    def _boxes_to_z(boxes: np.ndarray) -> np.ndarray:
+        """[x1, y1, x2, y2] → 観測ベクトル [cx, cy, w, h]"""
+        return np.concatenate([(boxes[:, :2] + boxes[:, 2:]) / 2, boxes[:, 2:] - boxes[:, :2]], axis=1)
+
+    def boxes(self) -> np.ndarray:
+        """全トラックの現在の推定ボックス (N, 4) の [x1, y1, x2, y2]"""
+        center = self._x[:, [0, 2]]
+        size = self._x[:, 4:6]
+        return np.concatenate([center - size / 2, center + size / 2], axis=1)
+
+    def _elapsed(self, timestamp: Optional[float]) -> float:
+        """前回の更新から timestamp[秒] までの経過時間 (タイムスタンプがなければ既定の dt)"""
+        if timestamp is None or self._last_time is None:
+            return self.dt
+        return min(max(timestamp - self._last_time, 0.0), self.max_dt)
+
+    def _predict(self, dt: float) -> None:
+        """全トラックの状態を dt[秒] だけ進める"""
+        F, Q = self._build_model(dt)
+        self._x = self._x @ F.T
+        self._P = F @ self._P @ F.T + Q
+
+    def predict(self, timestamp: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        状態を更新せずに、出力中のトラックの timestamp[秒] でのボックスを等速運動で外挿する
+        (検出と検出の間に、現在時刻での位置を問い合わせる場合に使う)
+        戻り値: (トラックのID (K,), 外挿したボックス (K, 4))
+        """
+        with self._lock:
+            dt = 0.0 if self._last_time is None else self._elapsed(timestamp)
+            active = self._active()
+            boxes = self.boxes()[active]
+            velocity = self._x[active][:, [1, 3]]
+            ids = self._ids[active]
+        boxes += np.tile(velocity * dt, 2)
+        return ids, boxes
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[float]]:
+        """
+        出力中のトラックの外挿に必要な状態を返す (別プロセスで predict() と同じ外挿をする場合に使う)
+        戻り値: (トラックのID (K,), ボックス (K, 4), 速度 (K, 2) [px/秒], 最後に更新したフレームの時刻[秒])
+        """
+        with self._lock:
+            active = self._active()
+            return self._ids[active], self.boxes()[active], self._x[active][:, [1, 3]], self._last_time
+
+    def _active(self) -> np.ndarray:
+        """出力するトラックのマスク"""
+        return self._staleness / self._steps_positive < self.max_staleness_to_positive_ratio
+
+    def _update(self, track_idxs: np.ndarray, z: np.ndarray) -> None:
+        """対応付いたトラックの状態を観測 z (M, 4) でまとめて更新する"""
+        x = self._x[track_idxs]
+        P = self._P[track_idxs]
+        # 観測行列Hは状態の一部を取り出すだけなので、行列積の代わりにインデックスで計算する
+        PHt = P[:, :, _MEASURED]
+        S = PHt[:, _MEASURED, :] + self._R
+        K = PHt @ np.linalg.inv(S)
+        x = x + np.einsum("nij,nj->ni", K, z - x[:, _MEASURED])
+        # 数値的に安定なJosephの式で共分散を更新する
+        I_KH = np.broadcast_to(self._identity, P.shape).copy()
+        I_KH[:, :, _MEASURED] -= K
+        P = I_KH @ P @ I_KH.transpose(0, 2, 1) + K @ self._R @ K.transpose(0, 2, 1)
+        self._x[track_idxs] = x
+        self._P[track_idxs] = P
+
+    def step(self, boxes: np.ndarray, timestamp: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        検出結果で全トラックを更新する
+        boxes: (M, 4) の検出ボックス [x1, y1, x2, y2]
+        timestamp: 検出したフレームの時刻[秒] (Noneなら前回から dt 経過したとみなす)
+        戻り値: (出力するトラックのID (K,), そのボックス (K, 4))
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        with self._lock:
+            self._predict(self._elapsed(timestamp))
+            if timestamp is not None:
+                self._last_time = timestamp
+            return self._associate(boxes)
+
+    def _associate(self, boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """予測済みのトラックと検出を対応付け、トラックを更新・生成・削除する"""
+        track_idxs, det_idxs = match_tracks(compute_iou_matrix(self.boxes(), boxes), self.min_iou)
+        if len(track_idxs):
+            self._update(track_idxs, self._boxes_to_z(boxes[det_idxs]))
+            self._steps_positive[track_idxs] += 1
+            self._staleness[track_idxs] = np.maximum(self._staleness[track_idxs] - 3, 0)
+        matched = np.zeros(len(self._ids), dtype=bool)
+        matched[track_idxs] = True
+
+        # 対応付かなかった検出から新しいトラックを作る
+        new_boxes = np.delete(boxes, det_idxs, axis=0)
+        n_new = len(new_boxes)
+        if n_new:
+            x0 = np.zeros((n_new, _STATE_DIM))
+            x0[:, _MEASURED] = self._boxes_to_z(new_boxes)
+            self._x = np.concatenate([self._x, x0])
+            self._P = np.concatenate([self._P, np.broadcast_to(self._identity * self.p_cov_p0, (n_new, 6, 6))])
+            self._ids = np.concatenate([self._ids, np.arange(self._next_id, self._next_id + n_new)])
+            self._staleness = np.concatenate([self._staleness, np.zeros(n_new)])
+            self._steps_positive = np.concatenate([self._steps_positive, np.ones(n_new, dtype=np.int64)])
+            self._next_id += n_new
+            matched = np.concatenate([matched, np.zeros(n_new, dtype=bool)])
+
+        # 対応付かなかったトラック (作ったばかりのトラックを含む。motpyと同じ) は古くなる
+        self._staleness[~matched] += 1
+
+        # 古くなりすぎたトラックと発散したトラックを削除する
+        keep = (self._staleness < self.max_staleness) & ~np.isnan(self._x).any(axis=1)
+        if not keep.all():
+            self._x = self._x[keep]
+            self._P = self._P[keep]
+            self._ids = self._ids[keep]
+            self._staleness = self._staleness[keep]
+            self._steps_positive = self._steps_positive[keep]
+
+        active = self._active()
+        return self._ids[active], self.boxes()[active]
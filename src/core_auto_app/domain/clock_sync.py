@@ -0,0 +1,47 @@
+from typing import Optional
+
+
+class ClockOffsetEstimator:
+    """デバイスの時計のタイムスタンプとホストの時刻[ms]の差を推定するクラス
+
+    フレームがホストに届いた時刻とデバイスのタイムスタンプの差 (到着時刻 - タイムスタンプ) は、
+    時計の差に転送の遅延を足したものになる。転送の遅延が最も小さかったフレームの差が
+    時計の差に最も近いので、差の最小値を保持する。フレームごとの転送の揺らぎは推定値に入らない。
+    ホストとデバイスの時計の進み方のずれ (ppm 程度) に追従するため、推定値は drift_ms_per_sec ずつ
+    ゆっくり上げ、それより小さい差が届いたらその値に下げる。
+
+    推定値は最小の転送遅延の分だけ実際の時計の差より大きいので、host_time() は撮影時刻より
+    最小の転送遅延だけ遅い時刻になる (揺らぐ部分は含まない)。
+    """
+
+    def __init__(self, drift_ms_per_sec: float = 0.05):
+        """
+        Args:
+            drift_ms_per_sec: 推定値を上げる速さ[ms/秒] (時計の進み方のずれの上限。50ppm なら 0.05)
+        """
+        self.drift_ms_per_sec = drift_ms_per_sec
+        self._offset: Optional[float] = None  # ホストの時刻 - デバイスのタイムスタンプ [ms]
+        self._last_arrival: Optional[float] = None
+
+    @property
+    def offset(self) -> Optional[float]:
+        """推定した時計の差[ms] (未推定ならNone)"""
+        return self._offset
+
+    def update(self, device_timestamp: float, arrival_time: float) -> float:
+        """
+        フレームのタイムスタンプと到着時刻 (ホストの時刻[ms]) から推定値を更新して返す
+        """
+        sample = arrival_time - device_timestamp
+        if self._offset is None:
+            self._offset = sample
+        else:
+            elapsed_sec = max(arrival_time - self._last_arrival, 0.0) / 1000.0
+            self._offset = min(sample, self._offset + self.drift_ms_per_sec * elapsed_sec)
+        self._last_arrival = arrival_time
+        return self._offset
+
+    def reset(self):
+        """推定をやり直す (デバイスを開き直した場合など)"""
+        self._offset = None
+        self._last_arrival = None
@@ -0,0 +1,119 @@
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class _Slot:
+    """フレームのスロット (画像のバッファと、参照している数)"""
+
+    __slots__ = ("array", "refs")
+
+    def __init__(self, array: np.ndarray):
+        self.array = array
+        self.refs = 0
+
+
+class _SlotView:
+    """スロットを参照する読み取り専用の配列の元になるオブジェクト
+
+    NumPy は __array_interface__ を持つオブジェクトから作った配列の base としてこのオブジェクトを保持するので、
+    そこから作られた配列 (スライスを含む) が全て解放されたときにスロットの参照が返される。
+    """
+
+    def __init__(self, ring: "FrameRing", slot: _Slot):
+        self._ring = ring
+        self._slot = slot
+        interface = dict(slot.array.__array_interface__)
+        interface["data"] = (interface["data"][0], True)  # 読み取り専用
+        self.__array_interface__ = interface
+
+    def __del__(self):
+        self._ring._release(self._slot)
+
+
+class FrameRing:
+    """事前に確保したスロットを使い回すフレームのリングバッファ
+
+    - 取得スレッドは acquire() で空いているスロットを受け取って直接書き込み、publish() で最新のフレームにする
+    - 読み出し側は get_latest() / view() で読み取り専用の配列を受け取る (コピーしない)。
+      配列が全て解放されるまでスロットは上書きされないので、複数のスレッドから読んでも壊れない
+    - 書き込みが必要な場合は writable() で明示的にコピーする
+    - 全スロットが参照中の場合は一時的なバッファを確保し、その回数を overflows として数える
+    """
+
+    def __init__(self, num_slots: int = 8):
+        """
+        num_slots: 事前に確保するスロットの数 (取得中・最新・読み出し側が保持する数の合計以上にする)
+        """
+        self._lock = threading.RLock()  # 解放がロック中の同じスレッドのGCで起きてもよいようにRLock
+        self._num_slots = num_slots
+        self._slots: List[_Slot] = []
+        self._shape: Optional[Tuple[int, ...]] = None
+        self._dtype = None
+        self._latest: Optional[_Slot] = None
+        self.overflows = 0
+
+    def _allocate(self, shape, dtype) -> None:
+        """スロットを確保し直す (参照中のスロットは読み出し側が解放するまで残る)"""
+        self._shape = tuple(shape)
+        self._dtype = np.dtype(dtype)
+        self._slots = [_Slot(np.empty(shape, dtype=dtype)) for _ in range(self._num_slots)]
+        if self._latest is not None:
+            self._latest.refs -= 1
+            self._latest = None
+
+    def acquire(self, shape, dtype=np.uint8) -> _Slot:
+        """書き込み用の空いているスロットを取得する (書き込み後は publish() か discard() を呼ぶ)"""
+        with self._lock:
+            if self._shape != tuple(shape) or self._dtype != np.dtype(dtype):
+                self._allocate(shape, dtype)
+            for slot in self._slots:
+                if slot.refs == 0:
+                    slot.refs = 1
+                    return slot
+            self.overflows += 1
+            slot = _Slot(np.empty(shape, dtype=dtype))
+            slot.refs = 1
+            return slot
+
+    def publish(self, slot: _Slot) -> None:
+        """書き込み済みのスロットを最新のフレームにする (取得時の参照は最新のフレームとしての参照になる)"""
+        with self._lock:
+            if self._latest is not None:
+                self._latest.refs -= 1
+            self._latest = slot
+
+    def discard(self, slot: _Slot) -> None:
+        """書き込みに失敗したスロットを返す"""
+        self._release(slot)
+
+    def view(self, slot: _Slot) -> np.ndarray:
+        """スロットの読み取り専用の配列を返す (配列が解放されるまでスロットは上書きされない)"""
+        with self._lock:
+            slot.refs += 1
+        return np.asarray(_SlotView(self, slot))
+
+    def get_latest(self) -> Optional[np.ndarray]:
+        """最新のフレームの読み取り専用の配列を返す (未取得ならNone)"""
+        with self._lock:
+            if self._latest is None:
+                return None
+            return self.view(self._latest)
+
+    def _release(self, slot: _Slot) -> None:
+        with self._lock:
+            slot.refs -= 1
+
+    def get_stats(self):
+        """スロットの数・参照中のスロットの数・空きがなく一時的に確保した回数を返す"""
+        with self._lock:
+            in_use = sum(1 for slot in self._slots if slot.refs > 0)
+            return {"slots": len(self._slots), "in_use": in_use, "overflows": self.overflows}
+
+
+def writable(image: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """画像に書き込む前に呼ぶ (読み取り専用ならコピーし、書き込めるならそのまま返す)"""
+    if image is None or image.flags.writeable:
+        return image
+    return image.copy()
@@ -1,5 +1,7 @@
 from enum import auto, Enum
-from typing import Optional, Tuple
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
 from pydantic import BaseModel
 
 
@@ -20,6 +22,15 @@ class TargetState(BaseModel):
     position: Optional[Tuple[float]]
 
 
+class FrameData(NamedTuple):
+    """カメラから取得したフレームと、その通し番号・タイムスタンプ"""
+
+    frame_id: int  # カメラごとに単調増加する通し番号 (1始まり)
+    timestamp: float  # ms (RealSenseはハードウェアタイムスタンプ、USBカメラはホストの時刻)
+    color: Optional[np.ndarray]
+    depth: Optional[np.ndarray] = None  # RealSenseのデプス画像 (ROIのみ整列するモードでは整列前のもの)
+
+
 class RobotStateId(Enum):
     """ロボットの状態ID"""
 
@@ -46,3 +57,32 @@ class RobotState(BaseModel):
     record_video: bool = False
     ready_to_fire: bool = False
     reserved: int = 0  # 未使用
+
+
+class RobotStateSnapshot(NamedTuple):
+    """ロボットの状態の読み取り専用のスナップショット (項目と単位は RobotState と同じ)
+
+    受信のたびに新しく作って参照ごと差し替えるので、読み出し側はロックもコピーも不要。
+    pydantic の RobotState とはシリアライズなどの境界でのみ to_model() / from_model() で変換する。
+    """
+
+    state_id: RobotStateId = RobotStateId.UNKNOWN
+    pitch_deg: float = 0.0
+    muzzle_velocity: float = 0.0
+    reloaded_left_disks: int = 0
+    reloaded_right_disks: int = 0
+    video_id: int = 0
+    target_panel: bool = False
+    auto_aim: bool = False
+    record_video: bool = False
+    ready_to_fire: bool = False
+    reserved: int = 0
+
+    def to_model(self) -> RobotState:
+        """検証付きの pydantic のモデルに変換する"""
+        return RobotState(**self._asdict())
+
+    @classmethod
+    def from_model(cls, model: RobotState) -> "RobotStateSnapshot":
+        """pydantic のモデルから作る"""
+        return cls(**dict(model))
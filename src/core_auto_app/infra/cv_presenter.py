@@ -5,7 +5,7 @@ import numpy as np
 from PIL import ImageFont, ImageDraw, Image
 
 from core_auto_app.application.interfaces import Presenter
-from core_auto_app.domain.messages import Command, RobotStateId, RobotState
+from core_auto_app.domain.messages import Command, RobotStateId, RobotStateSnapshot
 
 def put_text(img, text, pos, size, color):
     """日本語フォントを画面に描画する関数"""
@@ -55,7 +55,7 @@ class CvPresenter(Presenter):
         # ウィンドウをフルスクリーンに設定
         cv2.setWindowProperty("display", cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
 
-    def show(self, image: Optional[np.array], robot_state: RobotState) -> None:
+    def show(self, image: Optional[np.array], robot_state: RobotStateSnapshot) -> None:
         """画像をウィンドウに表示する
 
         Args:
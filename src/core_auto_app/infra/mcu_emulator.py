@@ -0,0 +1,251 @@
+import math
+import os
+import random
+import select
+import threading
+import tty
+from time import monotonic, sleep
+from typing import Dict, List, Optional, Tuple
+
+from core_auto_app.infra.serial_protocol import BinaryFrameDecoder, MSG_COMMAND, MSG_STATE, encode_frame
+
+
+class McuEmulator:
+    """pty の上でマイコンの代わりにロボットの状態を送り、送信値を受け取るエミュレータ
+
+    link_path に pty のスレーブ側へのシンボリックリンクを作るので、SerialRobotDriver には
+    link_path をポートとして渡す (socat の link= と同じ使い方)。切断を模擬するときは pty を閉じて
+    リンクを消し、disconnect_duration 後に新しい pty を作ってリンクを張り直す。
+
+    バイナリ形式では、最後に受信した送信値の通し番号を状態の予約フィールドで返す。
+    時刻は time.monotonic() [秒]。
+    """
+
+    def __init__(
+        self,
+        link_path: str,
+        protocol: str = "ascii",
+        rate_hz: float = 100.0,
+        burst_size: int = 1,
+        corrupt_rate: float = 0.0,
+        disconnect_interval: float = 0.0,
+        disconnect_duration: float = 0.5,
+        read_delay: float = 0.0,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            link_path: pty のスレーブ側へのシンボリックリンクを作るパス
+            protocol: "ascii" または "binary"
+            rate_hz: ロボットの状態を送る頻度[Hz]
+            burst_size: 何件ずつまとめて送るか (rate_hz は変えずに、burst_size 件を一度に書き込む)
+            corrupt_rate: 状態の1件ごとに、1バイトを壊す確率
+            disconnect_interval: 切断する間隔[秒] (0なら切断しない)
+            disconnect_duration: 切断している時間[秒]
+            read_delay: 送信値を読むたびに待つ時間[秒] (受信の遅いマイコンを模擬する)
+            seed: 乱数のシード
+        """
+        if protocol not in ("ascii", "binary"):
+            raise ValueError(f"Unknown serial protocol: {protocol}")
+        self._link_path = link_path
+        self._protocol = protocol
+        self._rate_hz = rate_hz
+        self._burst_size = max(1, burst_size)
+        self._corrupt_rate = corrupt_rate
+        self._disconnect_interval = disconnect_interval
+        self._disconnect_duration = disconnect_duration
+        self._read_delay = read_delay
+        self._random = random.Random(seed)
+
+        self._lock = threading.Lock()
+        self._master: Optional[int] = None
+        self._slave: Optional[int] = None
+        self._is_running = False
+        self._threads: List[threading.Thread] = []
+
+        self._last_sequence = 0  # 最後に受信した送信値の通し番号
+        self._reconnect_time: Optional[float] = None  # 張り直してから送信値をまだ受信していなければその時刻
+        self.states_sent = 0
+        self.bytes_sent = 0
+        self.corrupted = 0  # 壊して送った状態の数
+        self.dropped = 0  # pty のバッファが一杯で送れなかった状態の数
+        self.commands_received = 0
+        self.disconnects = 0
+        self.recovery_times: List[float] = []  # 張り直してから最初の送信値を受信するまでの時間[秒]
+        self.command_arrivals: Dict[Tuple[int, int, int, int], float] = {}  # 送信値 -> 最初に受信した時刻
+
+    @property
+    def link_path(self) -> str:
+        return self._link_path
+
+    def start(self):
+        """pty を作り、送信と受信のスレッドを開始する"""
+        self._open_pty()
+        self._is_running = True
+        self._threads = [
+            threading.Thread(target=self._send_states, daemon=True),
+            threading.Thread(target=self._receive_commands, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """スレッドを止めて pty を閉じる"""
+        self._is_running = False
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._close_pty()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _open_pty(self):
+        master, slave = os.openpty()
+        tty.setraw(master)
+        tty.setraw(slave)
+        # バッファが一杯でも送信のスレッドが止まらないようにする (実機のUARTも待たずに捨てる)
+        os.set_blocking(master, False)
+        with self._lock:
+            self._master, self._slave = master, slave
+        if os.path.lexists(self._link_path):
+            os.remove(self._link_path)
+        os.symlink(os.ttyname(slave), self._link_path)
+
+    def _close_pty(self):
+        if os.path.lexists(self._link_path):
+            os.remove(self._link_path)
+        with self._lock:
+            master, slave = self._master, self._slave
+            self._master = self._slave = None
+        for fd in (master, slave):
+            if fd is not None:
+                os.close(fd)
+
+    def _make_state(self, index: int) -> bytes:
+        """index 件目のロボットの状態を作る (仰角はゆっくり振れ、装填数は減っては補充される)"""
+        t = index / self._rate_hz
+        pitch = int(round(150 * math.sin(t)))  # 10倍した値
+        muzzle_velocity = 12000 + int(round(200 * math.sin(3.0 * t)))  # 1000倍した値
+        left = 10 - (index // 200) % 11
+        right = 10 - (index // 300) % 11
+        video_id = (index // 500) % 3
+        flags = 0b1000 * ((index // 1000) % 2) | 0b0100 | 0b0001
+        fields = (2, pitch, muzzle_velocity, left, right, video_id, flags, self._last_sequence)
+        if self._protocol == "binary":
+            return encode_frame(MSG_STATE, *fields)
+        return (",".join(str(value) for value in fields) + "\n").encode()
+
+    def _corrupt(self, data: bytes) -> bytes:
+        """ランダムな1バイトを別の値にする"""
+        position = self._random.randrange(len(data))
+        corrupted = bytearray(data)
+        corrupted[position] ^= self._random.randrange(1, 256)
+        return bytes(corrupted)
+
+    def _send_states(self):
+        """rate_hz で状態を送り、disconnect_interval ごとに切断する"""
+        interval = self._burst_size / self._rate_hz
+        next_time = monotonic()
+        next_disconnect = next_time + self._disconnect_interval if self._disconnect_interval > 0 else None
+        index = 0
+        while self._is_running:
+            now = monotonic()
+            if next_disconnect is not None and now >= next_disconnect:
+                self._close_pty()
+                self.disconnects += 1
+                sleep(self._disconnect_duration)
+                self._open_pty()
+                self._reconnect_time = monotonic()
+                next_disconnect = self._reconnect_time + self._disconnect_interval
+                next_time = self._reconnect_time
+                continue
+            if now < next_time:
+                sleep(min(next_time - now, 0.01))
+                continue
+            next_time += interval
+            messages = []
+            for _ in range(self._burst_size):
+                message = self._make_state(index)
+                index += 1
+                if self._corrupt_rate > 0 and self._random.random() < self._corrupt_rate:
+                    message = self._corrupt(message)
+                    self.corrupted += 1
+                messages.append(message)
+            data = b"".join(messages)
+            with self._lock:
+                master = self._master
+                try:
+                    written = os.write(master, data) if master is not None else 0
+                except (BlockingIOError, OSError):
+                    written = 0
+            # 一部しか書けなかった場合は、最後まで書けた状態だけを送れたものとして数える
+            # (途中で切れた状態はそのまま届くので、受信側では壊れたデータに見える)
+            complete, end = 0, 0
+            for message in messages:
+                end += len(message)
+                if end > written:
+                    break
+                complete += 1
+            self.states_sent += complete
+            self.dropped += len(messages) - complete
+            self.bytes_sent += written
+
+    def _receive_commands(self):
+        """送信値を受信し、最初に届いた時刻と通し番号を記録する"""
+        decoder = BinaryFrameDecoder((MSG_COMMAND,))
+        buffer = bytearray()
+        while self._is_running:
+            with self._lock:
+                master = self._master
+            if master is None:
+                sleep(0.01)
+                continue
+            try:
+                readable, _, _ = select.select([master], [], [], 0.05)
+                if not readable:
+                    continue
+                data = os.read(master, 4096)
+            except (BlockingIOError, OSError, ValueError):
+                # 切断のために閉じた fd を使った場合
+                continue
+            now = monotonic()
+            if self._protocol == "binary":
+                commands = [(tuple(fields[:4]), fields[4]) for _, fields in decoder.feed(data)]
+            else:
+                buffer += data
+                end = buffer.rfind(b"\n")
+                lines = buffer[:end].split(b"\n") if end >= 0 else []
+                del buffer[:end + 1]
+                commands = []
+                for line in lines:
+                    try:
+                        commands.append((tuple(int(value) for value in line.split(b",")), 0))
+                    except ValueError:
+                        pass
+            for values, sequence in commands:
+                self.commands_received += 1
+                self.command_arrivals.setdefault(values, now)
+                if sequence:
+                    self._last_sequence = sequence
+            if commands and self._reconnect_time is not None:
+                self.recovery_times.append(now - self._reconnect_time)
+                self._reconnect_time = None
+            if self._read_delay > 0:
+                sleep(self._read_delay)
+
+    def get_stats(self) -> Dict[str, object]:
+        """送った状態・受信した送信値・切断の回数と、切断から回復までの時間[秒]を返す"""
+        return {
+            "states_sent": self.states_sent,
+            "bytes_sent": self.bytes_sent,
+            "corrupted": self.corrupted,
+            "dropped": self.dropped,
+            "commands_received": self.commands_received,
+            "disconnects": self.disconnects,
+            "recovery_times": list(self.recovery_times),
+        }
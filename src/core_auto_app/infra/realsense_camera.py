@@ -3,17 +3,29 @@ import os
 import threading
 import time
 
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 import numpy as np
 import pyrealsense2 as rs
 
 from core_auto_app.application.interfaces import Camera
+from core_auto_app.domain.messages import FrameData, RobotStateId
+from core_auto_app.domain.frame_ring import FrameRing
+from core_auto_app.domain.clock_sync import ClockOffsetEstimator
 
 # 検出用モジュールのインポート
-from core_auto_app.detector.object_detector import YOLOXDetector
-from core_auto_app.detector.tracker_utils import ObjectTracker
+# (torch/YOLOXを読み込むモジュールは起動を遅くするので、検出器を設定するときにimportする)
+from core_auto_app.detector.preprocess import compute_rois
 from core_auto_app.detector.aiming.aiming_target_selector import AimingTargetSelector
+from core_auto_app.detector.aiming.latency_compensation import AimLatencyCompensator, CompensatedAim
+from core_auto_app.detector.aiming.depth_sampling import deproject_pixels, sample_box_depths
+from core_auto_app.detector.aiming.roi_depth import RoiDepthAligner
+
+if TYPE_CHECKING:
+    from core_auto_app.detector.detection_service import DetectionService
+    from core_auto_app.detector.detection_worker import DetectionWorker
+    from core_auto_app.detector.motion_gate import MotionGate
+    from core_auto_app.detector.object_detector import YOLOXDetector
 
 class RealsenseCamera(Camera):
     """RealSenseカメラからカラー画像とデプス画像を取得するクラス
@@ -21,7 +33,37 @@ class RealsenseCamera(Camera):
        最新の検出結果を取得できるようにする
     """
 
-    def __init__(self, record_dir: Optional[str] = None, weight_path: Optional[str] = None):
+    def __init__(
+        self,
+        record_dir: Optional[str] = None,
+        weight_path: Optional[str] = None,
+        detector_backend: str = "cuda",
+        detection_mode: str = "full",
+        full_frame_interval: int = 5,
+        detection_service: Optional["DetectionService"] = None,
+        pipelined_detection: bool = False,
+        motion_gate: Optional["MotionGate"] = None,
+        latency_compensation: bool = False,
+        depth_alignment: str = "full",
+        detection_worker: Optional["DetectionWorker"] = None,
+    ):
+        """
+        Args:
+            record_dir: 録画の保存先ディレクトリ
+            weight_path: YOLOXのモデルファイルのパス (Noneなら検出を行わない。set_detector() で後から設定も可能)
+            detector_backend: 推論バックエンド ("cuda", "cpu", "onnx")
+            detection_mode: "full" なら毎フレーム全体を推論、"roi" なら追跡中の物体の周辺のみを推論する
+            full_frame_interval: "roi" モードで全体を推論する間隔[フレーム]
+            detection_service: 指定すると、自前の検出スレッドの代わりに共有の検出サービスで検出する
+            pipelined_detection: Trueなら前処理・推論・トラッキングを別スレッドの段に分けて並行に実行する ("full" モードのみ)
+            motion_gate: 指定すると、シーンに変化がないときやロボットが待機中のときに推論を間引く
+            latency_compensation: Trueなら照準点を撮影からシリアル送信までの遅延だけ先に外挿する
+            depth_alignment: "full" なら毎フレームのデプス画像全体をカラー画像に整列する。
+                "roi" なら整列前のデプス画像を保持し、標的のROIの深度だけを必要なときに求める
+                (整列したデプス画像は get_images() で要求されたときだけ作る)
+            detection_worker: 指定すると、自前の検出スレッドの代わりに別プロセスの検出ワーカーで検出する
+                (フレーム全体の推論のみ。motion_gate と照準対象の深度は使わない)
+        """
         # パイプラインと設定の初期化（開始はしない）
         self._pipeline = rs.pipeline()
         self._config = rs.config()
@@ -31,6 +73,18 @@ class RealsenseCamera(Camera):
 
         # カラーフレームとデプスフレームを整列させるalignオブジェクト
         self._align = rs.align(align_to=rs.stream.color)
+        if depth_alignment not in ("full", "roi"):
+            raise ValueError(f"Unknown depth alignment: {depth_alignment}")
+        self._depth_alignment = depth_alignment
+        self._roi_depth: Optional[RoiDepthAligner] = None  # "roi" モードでストリーム開始時に作る
+        self._color_intrinsics = None  # カラーストリームの内部パラメータ (ストリーム開始時に取得)
+        # "roi" モードで、要求されたときに整列するための最新のフレームセットと、整列済みのデプス画像
+        self._raw_frames = None
+        self._aligned_depth = None
+        self._aligned_depth_frame_id = 0
+        self._align_lock = threading.Lock()
+        # デプスの整列にかかった時間の集計 (回数, 合計[ms])
+        self._depth_timings = {"align": [0, 0.0], "roi": [0, 0.0]}
 
         self._record_dir = record_dir
         self._is_running = False
@@ -38,34 +92,86 @@ class RealsenseCamera(Camera):
 
         # フレーム取得用の変数
         self._frame_lock = threading.Lock()
-        self._color_frame = None
+        # 新しいフレームの到着を待つための条件変数
+        self._frame_cond = threading.Condition(self._frame_lock)
+        # カラー画像は事前に確保したスロットにコピーし、読み出し側には読み取り専用の配列を渡す
+        # (RealSenseのフレームはすぐにSDKのフレームプールに返す)
+        self._color_ring = FrameRing()
+        self._has_frame = False
         self._depth_frame = None
+        self._frame_id = 0  # フレームの通し番号
+        self._frame_timestamp = 0.0  # ms (RealSenseのハードウェアタイムスタンプ)
+        # タイムスタンプがデバイスの時計の場合の、ホストの時刻[ms]との差 (ホストの時計ならNone)
+        # フレームごとの到着時刻の揺らぎが入らないよう、差の最小値から推定した安定した値を使う
+        self._clock_offset: Optional[float] = None
+        self._clock_estimator = ClockOffsetEstimator()
         self._frame_thread = None
 
         # 検出結果と関連する変数用のロック
         self._detection_lock = threading.Lock()
         self._detection_result = None
+        self._detection_frame: Optional[FrameData] = None  # 検出結果が得られたフレーム
         self._aiming_target = None
 
         # 検出用スレッド
         self._detection_thread = None
+        self._detection_start_lock = threading.Lock()
 
         # パイプライン情報取得のための変数
         self._pipeline_profile = None
 
-        # YOLOX検出用モジュールの初期化（weight_pathが指定されていれば）
+        # YOLOX検出用モジュール（set_detector() で設定する）
         self._detector = None
         self._tracker = None
         self._target_selector = None
-        if weight_path is not None:
-            self._detector = YOLOXDetector(weight_path, score_thr=0.8, nmsthre=0.45)
-            self._tracker = ObjectTracker(fps=30.0)
-            self._target_selector = AimingTargetSelector(image_center=(640, 360))
+
+        # 共有の検出サービスを使う場合は、最新のカラー画像を登録する
+        self._detection_subscription = None
+        if detection_service is not None and detection_worker is not None:
+            raise ValueError("Specify either detection_service or detection_worker, not both")
+        if detection_service is not None:
+            self._detection_subscription = detection_service.subscribe(
+                "realsense", lambda last_frame_id: self.wait_for_frame(last_frame_id, timeout=0)
+            )
+        if detection_worker is not None:
+            # 検出ワーカーは DetectionSubscription と同じ取得用のメソッドを持つので、同様に扱う
+            detection_worker.set_source(lambda last_frame_id: self.wait_for_frame(last_frame_id, timeout=0.1))
+            self._detection_subscription = detection_worker
+            if detection_mode != "full" or pipelined_detection or motion_gate is not None:
+                print("Detection worker supports only sequential full-frame detection without motion gating.")
+
+        # 追跡中の物体周辺のみを推論するモードの設定
+        if detection_mode not in ("full", "roi"):
+            raise ValueError(f"Unknown detection mode: {detection_mode}")
+        self._detection_mode = detection_mode
+        self._full_frame_interval = full_frame_interval
+
+        # 段に分けた検出パイプライン
+        if pipelined_detection and detection_mode != "full":
+            print("Pipelined detection supports only full-frame mode. Falling back to sequential detection.")
+            pipelined_detection = False
+        self._pipelined_detection = pipelined_detection
+        self._detection_pipeline = None
+
+        # シーンの変化とロボットの状態による推論の間引き
+        self._motion_gate = motion_gate
+        self._robot_state_id: Optional[RobotStateId] = None
 
         # 新たに、ターゲットとするパネルの指定フラグを追加
         # False → blue_panel (クラス0) / True → red_panel (クラス1)
         self.target_panel = False
 
+        # 撮影からシリアル送信までの遅延を補償した照準点の計算
+        self._aim_compensator = AimLatencyCompensator(enabled=latency_compensation)
+
+        # weight_pathが指定されていれば検出器を読み込む
+        if weight_path is not None:
+            from core_auto_app.detector.object_detector import YOLOXDetector
+
+            self.set_detector(
+                YOLOXDetector(weight_path, score_thr=0.8, nmsthre=0.45, backend=detector_backend)
+            )
+
         print("init realsense camera")
 
     @property
@@ -83,6 +189,66 @@ class RealsenseCamera(Camera):
            True  → red_panel (クラス1)
         """
         self.target_panel = flag
+        if self._detection_subscription is not None:
+            self._detection_subscription.set_target_panel(flag)
+
+    def set_detector(self, detector: "YOLOXDetector"):
+        """物体検出器を設定する
+
+        起動時間短縮のため、別スレッドで読み込んだ検出器をカメラの開始後に設定してもよい
+        (その場合はこの時点で検出スレッドを開始する)
+        """
+        from core_auto_app.detector.tracker_utils import ObjectTracker
+
+        if self._detector is not None:
+            print("Detector is already set")
+            return
+        if self._detection_mode == "roi" and not detector.supports_rois:
+            print(f"Backend {detector.backend.name} does not support ROI inference. Falling back to full-frame mode.")
+            self._detection_mode = "full"
+        self._tracker = ObjectTracker(fps=30.0)
+        self._target_selector = AimingTargetSelector(image_center=(640, 360))
+        self._detector = detector
+        if self._is_running:
+            self._start_detection()
+
+    def _start_detection(self):
+        """検出スレッドを開始する（YOLOXによる検出とトラッキング）"""
+        from core_auto_app.detector.pipeline import DetectionPipeline
+
+        with self._detection_start_lock:
+            if self._detector is None or self._detection_thread is not None or self._detection_pipeline is not None:
+                return
+            if self._pipelined_detection:
+                self._detection_pipeline = DetectionPipeline(
+                    self._detector,
+                    self._tracker,
+                    self._target_selector,
+                    source=lambda last_frame_id: self.wait_for_frame(last_frame_id, timeout=0.1),
+                    target_classes=lambda: (1,) if self.target_panel else (0,),
+                    on_result=self._set_detection_result,
+                    gate=self._should_infer,
+                )
+                self._detection_pipeline.start()
+            else:
+                self._detection_thread = threading.Thread(target=self.update_detection, daemon=True)
+                self._detection_thread.start()
+
+    def set_robot_state_id(self, state_id: RobotStateId):
+        """外部からロボットの状態を設定する (推論の間引きに使う)"""
+        self._robot_state_id = state_id
+
+    def _should_infer(self, frame) -> bool:
+        """推論を行うべきか (間引きなしなら常にTrue)"""
+        if self._motion_gate is None:
+            return True
+        return self._motion_gate.should_infer(frame, self._robot_state_id)
+
+    def get_motion_gate_stats(self):
+        """推論した回数と間引いた回数を返す (間引きなしならNone)"""
+        if self._motion_gate is None:
+            return None
+        return self._motion_gate.get_stats()
 
     def start(self):
         """カメラストリームを開始させる"""
@@ -90,14 +256,20 @@ class RealsenseCamera(Camera):
             try:
                 print("start realsense stream")
                 self._pipeline_profile = self._pipeline.start(self._config)
+                self._color_intrinsics = (
+                    self._pipeline_profile.get_stream(rs.stream.color).as_video_stream_profile().get_intrinsics()
+                )
+                if self._depth_alignment == "roi":
+                    self._roi_depth = self._create_roi_depth_aligner(self._pipeline_profile)
+                self._enable_global_time(self._pipeline_profile)
+                self._clock_estimator.reset()
+                self._clock_offset = None
                 self._is_running = True
                 # フレーム取得のためのスレッド開始
                 self._frame_thread = threading.Thread(target=self.update_frames, daemon=True)
                 self._frame_thread.start()
-                # 検出スレッド開始（YOLOXによる検出とトラッキング）
-                if self._detector is not None:
-                    self._detection_thread = threading.Thread(target=self.update_detection, daemon=True)
-                    self._detection_thread.start()
+                # 検出スレッド開始（検出器が設定済みの場合）
+                self._start_detection()
             except RuntimeError as err:
                 print(err)
                 self._is_running = False
@@ -113,95 +285,418 @@ class RealsenseCamera(Camera):
                 self._frame_thread.join()
             if self._detection_thread is not None:
                 self._detection_thread.join()
+                self._detection_thread = None
+            if self._detection_pipeline is not None:
+                self._detection_pipeline.stop()
+                self._detection_pipeline = None
             self._pipeline.stop()
             self._config.disable_all_streams()
+            if self._motion_gate is not None:
+                print(f"motion gate: {self.get_motion_gate_stats()}")
+            if self.get_resolution_stats() is not None:
+                print(f"adaptive resolution: {self.get_resolution_stats()}")
+            print(f"depth alignment: {self.get_depth_alignment_stats()}")
+            print(f"frame ring: {self._color_ring.get_stats()}")
             self.recorder = None  # Recorderオブジェクトをリセット
         else:
             print("Realsense camera is not running.")
 
+    @staticmethod
+    def _enable_global_time(profile):
+        """タイムスタンプをSDKがホストの時計に同期させたグローバルタイムにする (対応していないセンサはそのまま)"""
+        for sensor in profile.get_device().query_sensors():
+            try:
+                if sensor.supports(rs.option.global_time_enabled):
+                    sensor.set_option(rs.option.global_time_enabled, 1)
+            except RuntimeError as err:
+                print(f"failed to enable global time: {err}")
+
+    @staticmethod
+    def _create_roi_depth_aligner(profile) -> RoiDepthAligner:
+        """デプスとカラーのストリームの内部・外部パラメータから、ROIの深度を求めるオブジェクトを作る"""
+        depth_profile = profile.get_stream(rs.stream.depth).as_video_stream_profile()
+        color_profile = profile.get_stream(rs.stream.color).as_video_stream_profile()
+        return RoiDepthAligner(
+            depth_profile.get_intrinsics(),
+            color_profile.get_intrinsics(),
+            depth_profile.get_extrinsics_to(color_profile),
+            depth_scale=profile.get_device().first_depth_sensor().get_depth_scale(),
+        )
+
+    def _record_depth_timing(self, name: str, start: float):
+        """デプスの整列にかかった時間を集計する"""
+        timing = self._depth_timings[name]
+        timing[0] += 1
+        timing[1] += (time.perf_counter() - start) * 1000.0
+
     def update_frames(self):
         """カメラからフレームを取得し続けるスレッド用メソッド"""
         while self._is_running:
             frames = self._pipeline.wait_for_frames()
-            # デプスとカラーを整列させたフレームを取得する
-            aligned_frames = self._align.process(frames)
+            if self._depth_alignment == "full":
+                # デプスとカラーを整列させたフレームを取得する
+                start = time.perf_counter()
+                frames = self._align.process(frames)
+                self._record_depth_timing("align", start)
+            else:
+                # 整列は要求されたときに行うので、フレームセットを保持しておく
+                frames.keep()
             # カラーとデプスそれぞれ取り出す
-            color_frame = aligned_frames.get_color_frame()
-            aligned_depth_frame = aligned_frames.get_depth_frame()
+            color_frame = frames.get_color_frame()
+            depth_frame = frames.get_depth_frame()
             # フレームが有効か確認
-            if not aligned_depth_frame or not color_frame:
+            if not depth_frame or not color_frame:
                 continue
             # フレームをNumpy配列に変換
-            depth_image = np.asanyarray(aligned_depth_frame.get_data())
+            depth_image = np.asanyarray(depth_frame.get_data())
             color_image = np.asanyarray(color_frame.get_data())
-            # フレームを保存
-            with self._frame_lock:
-                self._color_frame = color_image
+            slot = self._color_ring.acquire(color_image.shape, color_image.dtype)
+            np.copyto(slot.array, color_image)
+            # フレームを通し番号・タイムスタンプとともに保存し、待機中のスレッドに通知する
+            with self._frame_cond:
+                self._color_ring.publish(slot)
+                self._has_frame = True
                 self._depth_frame = depth_image
+                if self._depth_alignment == "roi":
+                    self._raw_frames = frames
+                self._frame_id += 1
+                self._frame_timestamp = color_frame.get_timestamp()
+                if color_frame.get_frame_timestamp_domain() == rs.timestamp_domain.hardware_clock:
+                    # グローバルタイムが使えずデバイスの時計 (起動からの時間) の場合は、到着時刻との差の
+                    # 最小値でホストの時刻に対応付ける (フレームごとの差をそのまま使うと到着時刻になってしまう)
+                    self._clock_offset = self._clock_estimator.update(self._frame_timestamp, time.time() * 1000.0)
+                self._frame_cond.notify_all()
+            if self._detection_subscription is not None:
+                # 検出サービスの検出スレッドに新しいフレームを知らせる
+                self._detection_subscription.notify_new_frame()
 
     def update_detection(self):
         """Realsenseカメラから取得した最新のカラー画像に対して、非同期でYOLOX検出とトラッキングを実施するスレッド用メソッド"""
+        tracked_objects = []
+        frames_since_full = 0
+        last_frame_id = 0
         while self._is_running:
-            # 取得した最新のフレームをコピーする
-            with self._frame_lock:
-                if self._color_frame is None:
-                    frame = None
-                else:
-                    frame = self._color_frame.copy()
-            if frame is None:
-                time.sleep(0.01)
+            # 未検出の新しいフレームが届くまで待ち、そのコピーを取得する
+            frame_data = self.wait_for_frame(last_frame_id, timeout=0.1)
+            if frame_data is None:
                 continue
+            last_frame_id = frame_data.frame_id
+            frame = frame_data.color
 
-            # 物体検出を実施
-            detections = self._detector.predict(frame)
-            if detections is None:
-                detections = []
+            # シーンに変化がなければ推論を省略し、直前のトラッキング結果を使い続ける
+            if not self._should_infer(frame):
+                continue
 
-            # 【ここで target_panel フラグに応じたフィルタリングを実施】
+            # 物体検出を実施
+            # target_panel フラグに応じたクラスのみをNMS前に残す
             # robot_state.target_panel が False → blue_panel (クラス0)
             # robot_state.target_panel が True  → red_panel  (クラス1)
-            if self.target_panel:
-                filtered_detections = [det for det in detections if det[5] == 1]
+            target_classes = (1,) if self.target_panel else (0,)
+            # ROIモードでは、一定間隔またはトラックを見失ったときのみフレーム全体を推論する
+            if (
+                self._detection_mode == "roi"
+                and tracked_objects
+                and frames_since_full < self._full_frame_interval
+            ):
+                rois = compute_rois(
+                    [obj[:4] for obj in tracked_objects],
+                    self._tracker.get_motions(tracked_objects),
+                    frame.shape,
+                    roi_size=self._detector.roi_preprocessor.roi_size,
+                )
+                detections = self._detector.predict_rois(frame, rois, target_classes=target_classes)
+                frames_since_full += 1
+                if not detections:
+                    # 周辺で見失った場合は次のフレームで全体を推論する
+                    frames_since_full = self._full_frame_interval
             else:
-                filtered_detections = [det for det in detections if det[5] == 0]
-
-            # フィルタ後の検出結果をtrackerに渡す
-            tracked_objects = self._tracker.update(filtered_detections)
-            # 照準対象の決定
-            aiming_target = self._target_selector.select_target(tracked_objects)
+                detections = self._detector.predict(frame, target_classes=target_classes)
+                frames_since_full = 1
+
+            # 検出結果をtrackerに渡す
+            tracked_objects = self._tracker.update(detections, frame_data.timestamp)
+            # 照準対象の決定 (物体までの距離を考慮する場合は各物体の深度も渡す)
+            depths = None
+            if self._target_selector.get_weights()["depth"] and tracked_objects and frame_data.depth is not None:
+                depths = self.get_roi_depths(frame_data.depth, [obj[:4] for obj in tracked_objects])
+            aiming_target = self._target_selector.select_target(tracked_objects, depths)
+            # 小さい・遠い標的を追跡中は高い推論画像サイズを優先する
+            if self._detector.adaptive_resolution is not None:
+                self._update_resolution_target(tracked_objects, frame_data)
 
             # 検出結果と照準対象を保存
-            with self._detection_lock:
-                self._detection_result = tracked_objects
-                self._aiming_target = aiming_target
+            self._set_detection_result(tracked_objects, aiming_target, frame_data)
+
+    def _update_resolution_target(self, tracked_objects, frame_data: FrameData):
+        """照準対象のバウンディングボックスの高さと距離を、推論画像サイズの切り替えに伝える"""
+        target_id = self._target_selector.current_target_id
+        target = next((obj for obj in tracked_objects if obj[4] == target_id), None)
+        if target is None:
+            self._detector.adaptive_resolution.set_target()
+            return
+        x1, y1, x2, y2, _ = target
+        distance_m = None
+        if frame_data.depth is not None:
+            depth = self.get_roi_depths(frame_data.depth, [target[:4]])[0]
+            if not np.isnan(depth):
+                distance_m = float(depth)
+        self._detector.adaptive_resolution.set_target(y2 - y1, distance_m)
+
+    def get_roi_depths(self, depth_image, boxes, shrink: float = 0.5, percentile: float = 50.0) -> np.ndarray:
+        """カラー画像上の各バウンディングボックスの中央部の深度[m]を返す (有効な画素がなければnan)
+
+        Args:
+            depth_image: フレームのデプス画像 ("roi" モードでは整列前のもの)
+            boxes: [(x1, y1, x2, y2), ...]
+            shrink: 深度を取る領域の、ボックスに対する大きさの割合
+            percentile: 有効な深度の分位点 (50で中央値)
+        """
+        start = time.perf_counter()
+        if self._roi_depth is None:
+            depths = sample_box_depths(depth_image, boxes, shrink=shrink, percentile=percentile)
+        else:
+            depths = self._roi_depth.sample_depths(depth_image, boxes, shrink=shrink, percentile=percentile)
+        self._record_depth_timing("roi", start)
+        return depths
 
-            # 少し待機してから次の検出を実施
-            time.sleep(0.01)
+    def get_aligned_depth(self):
+        """カラー画像に整列した最新のデプス画像を返す (未取得ならNone)
+
+        "roi" モードでは要求されたときに整列し、同じフレームの間は結果を使い回す
+        """
+        with self._frame_lock:
+            if self._depth_alignment == "full":
+                return self._depth_frame
+            frames = self._raw_frames
+            frame_id = self._frame_id
+        if frames is None:
+            return None
+        with self._align_lock:
+            if self._aligned_depth_frame_id != frame_id:
+                start = time.perf_counter()
+                aligned_depth_frame = self._align.process(frames).get_depth_frame()
+                self._record_depth_timing("align", start)
+                self._aligned_depth = np.asanyarray(aligned_depth_frame.get_data())
+                self._aligned_depth_frame_id = frame_id
+            return self._aligned_depth
+
+    def get_depth_alignment_stats(self):
+        """デプスの整列の方式と、全体の整列・ROIの深度計算の (回数, 平均処理時間[ms]) を返す
+
+        フレーム数あたりに直すと、"roi" モードで1フレームあたりに節約できた処理時間がわかる
+        """
+        stats = {"mode": self._depth_alignment, "frames": self._frame_id}
+        for name, (count, total_ms) in self._depth_timings.items():
+            stats[name] = (count, total_ms / count if count else 0.0)
+        return stats
+
+    def get_resolution_stats(self):
+        """推論画像サイズの現在値とサイズごとの推論時間を返す (切り替えなしならNone)"""
+        if self._detector is None or self._detector.adaptive_resolution is None:
+            return None
+        return self._detector.adaptive_resolution.get_stats()
+
+    def get_resolution_history(self):
+        """推論時間の履歴 [(時刻[秒], サイズ (高さ, 幅), 推論時間[ms]), ...] を返す (切り替えなしならNone)"""
+        if self._detector is None or self._detector.adaptive_resolution is None:
+            return None
+        return self._detector.adaptive_resolution.get_history()
+
+    def _set_detection_result(self, tracked_objects, aiming_target, frame_data: FrameData):
+        """検出結果と照準対象を、検出したフレームとともに保存する"""
+        with self._detection_lock:
+            self._detection_result = tracked_objects
+            self._aiming_target = aiming_target
+            self._detection_frame = frame_data
+
+    def get_stage_timings(self):
+        """検出パイプラインの段ごとの (処理回数, 平均処理時間[ms], 最大処理時間[ms]) を返す (パイプライン未使用ならNone)"""
+        if self._detection_pipeline is None:
+            return None
+        return self._detection_pipeline.get_stage_timings()
 
     def get_images(self):
         """カラー画像とデプス画像を取得する
 
         Returns:
-            color_image: カラー画像
-            depth_image: デプス画像
+            color_image: カラー画像 (読み取り専用。書き込む場合は frame_ring.writable() でコピーする)
+            depth_image: カラー画像に整列したデプス画像 ("roi" モードでは呼ばれたときに整列する)
+        """
+        with self._frame_lock:
+            color_image = self._color_ring.get_latest()
+        return color_image, self.get_aligned_depth()
+
+    def get_frame(self) -> Optional[FrameData]:
+        """最新のカラー画像とデプス画像を通し番号・タイムスタンプ付きで取得する（未取得ならNone）
+
+        get_images() と同様にコピーはしないので、カラー画像は読み取り専用、デプス画像も書き換えないこと。
+        "roi" モードのデプス画像は整列前のものなので、深度は get_roi_depths() で求める
         """
         with self._frame_lock:
-            color_image = self._color_frame
-            depth_image = self._depth_frame
-        return color_image, depth_image
+            if not self._has_frame:
+                return None
+            return FrameData(self._frame_id, self._frame_timestamp, self._color_ring.get_latest(), self._depth_frame)
+
+    def wait_for_frame(self, last_frame_id: int, timeout: Optional[float] = None) -> Optional[FrameData]:
+        """通し番号が last_frame_id より新しいフレームが届くまで待つ
+
+        Args:
+            last_frame_id: 処理済みのフレームの通し番号 (未処理なら0)
+            timeout: 待機する最大時間[秒] (Noneなら無期限)
+
+        Returns:
+            frame: 新しいフレーム（カラー画像は読み取り専用、デプス画像は共有）。タイムアウトした場合はNone
+        """
+        with self._frame_cond:
+            if not self._frame_cond.wait_for(lambda: self._frame_id > last_frame_id, timeout):
+                return None
+            return FrameData(
+                self._frame_id, self._frame_timestamp, self._color_ring.get_latest(), self._depth_frame
+            )
+
+    def current_timestamp(self) -> float:
+        """フレームのタイムスタンプと同じ時計での現在時刻[ms]"""
+        now = time.time() * 1000.0
+        if self._clock_offset is not None:
+            return now - self._clock_offset
+        # グローバルタイム (ホストの時計に同期したタイムスタンプ) の場合はそのまま比較できる
+        return now
+
+    def get_predicted_detection_results(self, timestamp: Optional[float] = None):
+        """各トラックの位置を timestamp[ms] (Noneなら現在時刻) まで外挿した検出結果を取得する（検出なしならNone）"""
+        if timestamp is None:
+            timestamp = self.current_timestamp()
+        if self._detection_subscription is not None:
+            return self._detection_subscription.get_predicted_detection_results(timestamp)
+        if self._tracker is None:
+            return None
+        return self._tracker.predict(timestamp)
+
+    def host_time(self, timestamp: float) -> float:
+        """フレームのタイムスタンプ[ms]をホストの時刻[ms]に変換する"""
+        if self._clock_offset is not None:
+            return timestamp + self._clock_offset
+        return timestamp
+
+    def set_latency_compensation(self, enabled: bool):
+        """照準点の遅延補償の有効・無効を切り替える (補償あり・なしで命中率を比べる場合など)"""
+        self._aim_compensator.enabled = enabled
+
+    def get_compensated_aiming_target(self, send_delay_ms: Optional[float] = None) -> Optional[CompensatedAim]:
+        """
+        最新の照準対象を、撮影からシリアル送信までの遅延だけ先の時刻に外挿した照準点を取得する
+
+        Args:
+            send_delay_ms: 照準点を設定してからシリアルに書き込むまでの遅延[ms] (Noneなら既定値)
+
+        Returns:
+            aim: 照準点と撮影からの遅延・信頼度（照準対象がなければNone）
+        """
+        if self._detection_subscription is not None:
+            aiming_target = self._detection_subscription.get_aiming_target()
+            frame_data = self._detection_subscription.get_detection_frame()
+        else:
+            with self._detection_lock:
+                aiming_target = self._aiming_target
+                frame_data = self._detection_frame
+        if aiming_target is None or frame_data is None:
+            return None
+        return self._aim_compensator.compensate(
+            aiming_target,
+            frame_data.timestamp,
+            self.current_timestamp(),
+            self._predict_aiming_target,
+            send_delay_ms,
+            capture_time=self.host_time(frame_data.timestamp),
+        )
+
+    def get_aiming_target_position(self, point=None, velocity_interval_ms: float = 100.0):
+        """
+        最新の照準対象のカメラ座標と速度を、デプス画像と照準対象の追跡結果から求める
+
+        Args:
+            point: 照準点 (cx, cy) (遅延を補償した照準点など。Noneなら検出した照準点)
+            velocity_interval_ms: 速度を求めるために外挿する時間の幅[ms]
+
+        Returns:
+            position: カメラ座標 (X, Y, Z)[m] (照準対象がない、または深度が求まらなければNone)
+            velocity: カメラ座標系での速度 (vx, vy, vz)[m/s] (奥行き方向の速度は0とする)
+        """
+        if self._detection_subscription is not None:
+            aiming_target = self._detection_subscription.get_aiming_target()
+            frame_data = self._detection_subscription.get_detection_frame()
+            detection_results = self._detection_subscription.get_detection_results()
+        else:
+            with self._detection_lock:
+                aiming_target = self._aiming_target
+                frame_data = self._detection_frame
+                detection_results = self._detection_result
+        if (
+            aiming_target is None
+            or frame_data is None
+            or frame_data.depth is None
+            or not detection_results
+            or self._color_intrinsics is None
+        ):
+            return None
+        # 照準点は照準対象のバウンディングボックスの中心なので、中心が最も近いものの深度を使う
+        box = min(
+            (obj[:4] for obj in detection_results),
+            key=lambda b: abs((b[0] + b[2]) / 2 - aiming_target[0]) + abs((b[1] + b[3]) / 2 - aiming_target[1]),
+        )
+        depth = float(self.get_roi_depths(frame_data.depth, [box])[0])
+        if np.isnan(depth):
+            return None
+        if point is None:
+            point = aiming_target
+        position = deproject_pixels(self._color_intrinsics, [point], [depth])[0]
+
+        # 画像上の速度を、照準対象の距離でカメラ座標系の速度に換算する
+        velocity = (0.0, 0.0, 0.0)
+        start = self._predict_aiming_target(frame_data.timestamp)
+        end = self._predict_aiming_target(frame_data.timestamp + velocity_interval_ms)
+        if start is not None and end is not None:
+            scale = depth / (velocity_interval_ms / 1000.0)
+            velocity = (
+                (end[0] - start[0]) / self._color_intrinsics.fx * scale,
+                (end[1] - start[1]) / self._color_intrinsics.fy * scale,
+                0.0,
+            )
+        return tuple(position.tolist()), velocity
+
+    def _predict_aiming_target(self, timestamp: float):
+        """照準対象の timestamp[ms] での中心座標を外挿する"""
+        if self._detection_subscription is not None:
+            return self._detection_subscription.predict_aiming_target(timestamp)
+        if self._tracker is None:
+            return None
+        return self._tracker.predict_center(self._target_selector.current_target_id, timestamp)
+
+    def get_detection_frame(self) -> Optional[FrameData]:
+        """最新の検出結果が得られたフレームを取得する（検出結果の描画先に使う）"""
+        if self._detection_subscription is not None:
+            return self._detection_subscription.get_detection_frame()
+        with self._detection_lock:
+            return self._detection_frame
 
     def get_detection_results(self):
         """最新の検出結果を取得する"""
+        if self._detection_subscription is not None:
+            return self._detection_subscription.get_detection_results()
         with self._detection_lock:
             return self._detection_result
 
     def get_aiming_target(self):
         """最新の照準対象を取得する"""
+        if self._detection_subscription is not None:
+            return self._detection_subscription.get_aiming_target()
         with self._detection_lock:
             return self._aiming_target
 
     def draw_detection_results(self, frame, detection_results):
         """検出結果（トラッキング結果）をフレームに描画する"""
+        if self._detection_subscription is not None:
+            return self._detection_subscription.draw_detection_results(frame, detection_results)
         if detection_results is not None:
             self._tracker.draw_boxes(frame, detection_results)
         return frame
@@ -0,0 +1,165 @@
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+from time import monotonic, sleep
+from typing import Dict, Optional
+
+import numpy as np
+
+from core_auto_app.infra.mcu_emulator import McuEmulator
+from core_auto_app.infra.serial_robot_driver import SerialRobotDriver
+
+
+def parse_args() -> argparse.Namespace:
+    """コマンドライン引数をパースする"""
+    parser = argparse.ArgumentParser(description="load test SerialRobotDriver against an emulated MCU on a pty")
+    parser.add_argument("--duration", default=10.0, type=float, help="test duration in seconds")
+    parser.add_argument("--protocol", default="binary", choices=["ascii", "binary"], help="serial protocol")
+    parser.add_argument("--serial_io", default="event", choices=["polling", "event"], help="driver I/O mode")
+    parser.add_argument("--max_send_rate_hz", default=200.0, type=float, help="driver send rate limit (event mode)")
+    parser.add_argument("--rate_hz", default=100.0, type=float, help="rate of robot states sent by the MCU")
+    parser.add_argument("--burst_size", default=1, type=int, help="number of states written at once by the MCU")
+    parser.add_argument("--corrupt_rate", default=0.0, type=float, help="probability of corrupting one byte of a state")
+    parser.add_argument(
+        "--disconnect_interval", default=0.0, type=float, help="interval in seconds between disconnects (0 to disable)"
+    )
+    parser.add_argument("--disconnect_duration", default=0.5, type=float, help="length of a disconnect in seconds")
+    parser.add_argument("--read_delay", default=0.0, type=float, help="delay in seconds after each read by the MCU")
+    parser.add_argument("--update_rate_hz", default=100.0, type=float, help="rate of aim updates set on the driver")
+    parser.add_argument("--seed", default=0, type=int, help="random seed of the MCU emulator")
+    parser.add_argument("--verbose", action="store_true", help="show messages printed by the driver")
+    args = parser.parse_args()
+    return args
+
+
+def percentiles(values_ms) -> Dict[str, Optional[float]]:
+    """p50・p90・p99・最大[ms] を返す (値がなければNone)"""
+    if len(values_ms) == 0:
+        return {"p50_ms": None, "p90_ms": None, "p99_ms": None, "max_ms": None}
+    values = np.asarray(values_ms)
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {"p50_ms": float(p50), "p90_ms": float(p90), "p99_ms": float(p99), "max_ms": float(values.max())}
+
+
+def run_load_test(
+    duration: float = 10.0,
+    protocol: str = "binary",
+    serial_io: str = "event",
+    max_send_rate_hz: float = 200.0,
+    update_rate_hz: float = 100.0,
+    verbose: bool = False,
+    **emulator_options,
+) -> Dict[str, object]:
+    """
+    エミュレータにつないだ SerialRobotDriver に update_rate_hz で照準の更新を設定し続け、
+    受信の頻度・送信値が届くまでの遅延・往復時間・切断からの回復時間をまとめて返す
+
+    Args:
+        duration: 試験する時間[秒]
+        protocol: "ascii" または "binary"
+        serial_io: SerialRobotDriver の io_mode
+        max_send_rate_hz: SerialRobotDriver の max_send_rate_hz
+        update_rate_hz: set_send_values() を呼ぶ頻度[Hz]
+        verbose: Falseならドライバの表示を捨てる
+        emulator_options: McuEmulator に渡す引数 (rate_hz, burst_size, corrupt_rate など)
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        emulator = McuEmulator(os.path.join(tmp_dir, "ttyMCU"), protocol=protocol, **emulator_options)
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        set_times = {}  # 送信値 -> set_send_values() を呼んだ時刻
+        with emulator, output:
+            driver = SerialRobotDriver(
+                emulator.link_path,
+                protocol=protocol,
+                io_mode=serial_io,
+                max_send_rate_hz=max_send_rate_hz,
+                telemetry_interval=0,
+            )
+            try:
+                start = monotonic()
+                interval = 1.0 / update_rate_hz
+                index = 0
+                while monotonic() - start < duration:
+                    index += 1
+                    # 照準点が少しずつ動く想定で、1つ目の値を通し番号にして送信値を区別する
+                    values = (index, 640 + index % 50, 360, 1)
+                    set_times[values] = monotonic()
+                    driver.set_send_values(*values)
+                    sleep(max(start + index * interval - monotonic(), 0.0))
+                elapsed = monotonic() - start
+                sleep(0.2)  # 最後の送信値が届くのを待つ
+                telemetry = driver.get_telemetry()
+            finally:
+                driver.close()
+        emulator_stats = emulator.get_stats()
+        arrivals = emulator.command_arrivals
+
+    latencies = [(arrivals[values] - set_time) * 1000.0 for values, set_time in set_times.items() if values in arrivals]
+    return {
+        "duration_sec": elapsed,
+        "states_sent": emulator_stats["states_sent"],
+        "states_received": telemetry["states_received"],
+        "states_per_sec": telemetry["states_received"] / elapsed,
+        "corrupted": emulator_stats["corrupted"],
+        "parse_errors": telemetry["parse_errors"],
+        "crc_errors": telemetry["crc_errors"],
+        "updates_set": len(set_times),
+        "updates_delivered": len(latencies),
+        "commands_received": emulator_stats["commands_received"],
+        "update_latency_ms": percentiles(latencies),
+        "rtt_ms": telemetry["rtt_ms"],
+        "disconnects": emulator_stats["disconnects"],
+        "reconnects": telemetry["reconnects"],
+        "recovery_ms": percentiles([t * 1000.0 for t in emulator_stats["recovery_times"]]),
+    }
+
+
+def format_report(result: Dict[str, object]) -> str:
+    """run_load_test() の結果を表示用の文字列にする"""
+
+    def ms(stats):
+        return ", ".join(
+            f"{name[:-3]} {'-' if stats[name] is None else f'{stats[name]:.2f}'}"
+            for name in ("p50_ms", "p90_ms", "p99_ms", "max_ms")
+            if name in stats
+        ) + " ms"
+
+    lines = [
+        f"duration          : {result['duration_sec']:.1f} s",
+        f"states            : sent {result['states_sent']}, received {result['states_received']} "
+        f"({result['states_per_sec']:.1f}/s), corrupted {result['corrupted']}, "
+        f"parse errors {result['parse_errors']}, crc errors {result['crc_errors']}",
+        f"aim updates       : set {result['updates_set']}, delivered {result['updates_delivered']}, "
+        f"commands received {result['commands_received']}",
+        f"update latency    : {ms(result['update_latency_ms'])}",
+        f"round trip        : {ms(result['rtt_ms'])} (n={result['rtt_ms']['count']})",
+        f"disconnects       : {result['disconnects']}, reconnects {result['reconnects']}, "
+        f"recovery {ms(result['recovery_ms'])}",
+    ]
+    return "\n".join(lines)
+
+
+def main():
+    args = parse_args()
+    result = run_load_test(
+        duration=args.duration,
+        protocol=args.protocol,
+        serial_io=args.serial_io,
+        max_send_rate_hz=args.max_send_rate_hz,
+        update_rate_hz=args.update_rate_hz,
+        verbose=args.verbose,
+        rate_hz=args.rate_hz,
+        burst_size=args.burst_size,
+        corrupt_rate=args.corrupt_rate,
+        disconnect_interval=args.disconnect_interval,
+        disconnect_duration=args.disconnect_duration,
+        read_delay=args.read_delay,
+        seed=args.seed,
+    )
+    print(format_report(result))
+
+
+if __name__ == "__main__":
+    main()
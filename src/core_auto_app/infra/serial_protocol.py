@@ -0,0 +1,230 @@
+import binascii
+import struct
+from typing import List, Optional, Sequence, Tuple
+
+from core_auto_app.domain.messages import RobotStateId, RobotStateSnapshot
+
+# バイナリ形式のフレーム: 同期ヘッダ (2バイト) + バージョン (1バイト) + 種類 (1バイト) + ペイロード + CRC16 (2バイト)
+# CRC16 は CRC-16/CCITT-FALSE (多項式 0x1021, 初期値 0xFFFF) で、バージョンからペイロードの末尾までにかける
+SYNC = b"\xa5\x5a"
+PROTOCOL_VERSION = 1
+MSG_STATE = 0x01  # マイコン → PC: ロボットの状態
+MSG_COMMAND = 0x02  # PC → マイコン: 送信値
+
+_HEADER = struct.Struct("<2sBB")
+_CRC = struct.Struct("<H")
+# 状態: 状態ID, 仰角[deg]x10, 射出速度[m/s]x1000, 左の装填数, 右の装填数, 表示するカメラ, フラグ, 予約
+# (フラグは ASCII 形式と同じく bit3: ターゲットパネル, bit2: 自動照準, bit1: 録画, bit0: 射出可否)
+_STATE = struct.Struct("<BhiBBBBH")
+# 送信値: 4つの整数 (ASCII 形式の4つの値と同じ) と予約
+_COMMAND = struct.Struct("<4iH")
+_PAYLOADS = {MSG_STATE: _STATE, MSG_COMMAND: _COMMAND}
+# 種類ごとの、バージョンからペイロードの末尾まで (CRCをかける範囲) の形式
+_BODIES = {t: struct.Struct("<BB" + payload.format[1:]) for t, payload in _PAYLOADS.items()}
+
+PROTOCOLS = ("ascii", "binary", "auto")
+_STATE_IDS = {state.value: state for state in RobotStateId}
+_new_snapshot = tuple.__new__
+
+
+def crc16(data) -> int:
+    """CRC-16/CCITT-FALSE を計算する"""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def encode_frame(msg_type: int, *fields) -> bytes:
+    """バイナリ形式のフレームを作る"""
+    body = _BODIES[msg_type].pack(PROTOCOL_VERSION, msg_type, *fields)
+    return b"".join((SYNC, body, _CRC.pack(crc16(body))))
+
+
+def robot_state_from_fields(
+    state_id, pitch, muzzle_velocity, left, right, video_id, flags, reserved
+) -> RobotStateSnapshot:
+    """受信した値 (仰角は10倍、射出速度は1000倍の値) からロボットの状態を作る (状態IDが範囲外なら ValueError)"""
+    state = _STATE_IDS.get(state_id)
+    if state is None:
+        raise ValueError(f"Unknown robot state id: {state_id}")
+    # 受信のたびに呼ばれるので、キーワード引数を使わずに直接タプルを作る
+    return _new_snapshot(
+        RobotStateSnapshot,
+        (
+            state,
+            pitch / 10.0,
+            muzzle_velocity / 1000,
+            left,
+            right,
+            video_id,
+            bool(flags & 0b1000),  # ターゲットパネル
+            bool(flags & 0b0100),  # 自動照準
+            bool(flags & 0b0010),  # 録画
+            bool(flags & 0b0001),  # 射出可否
+            reserved,
+        ),
+    )
+
+
+def parse_ascii_fields(line: bytes) -> Optional[Tuple]:
+    """
+    ASCII 形式の1行 ("状態ID,仰角x10,射出速度x1000,左,右,カメラ,フラグ,予約") を値のタプルにする
+    (項目が足りなければNone。数値でなければ ValueError)
+    """
+    parts = line.decode("ascii").strip().split(",")
+    if len(parts) < 8:
+        return None
+    return (
+        int(parts[0]),
+        float(parts[1]),
+        float(parts[2]),
+        int(parts[3]),
+        int(parts[4]),
+        int(parts[5]),
+        int(parts[6]),
+        int(parts[7]),
+    )
+
+
+class BinaryFrameDecoder:
+    """受信したバイト列からバイナリ形式のフレームを取り出すストリーミングデコーダ
+
+    同期ヘッダを探してフレームの長さだけ溜まったら CRC を確かめる。バージョン・種類・CRC が
+    合わない場合は同期ヘッダの1バイト目だけを捨てて次の同期ヘッダを探すので、壊れたバイトや
+    途中から受信したフレームがあっても次の正しいフレームから読み直せる。
+    """
+
+    def __init__(self, msg_types: Sequence[int] = (MSG_STATE,)):
+        """msg_types: 受け付けるフレームの種類"""
+        # 種類ごとの、同期ヘッダの後ろからCRCまでのフレーム全体の形式 (1回の unpack で読む)
+        self._frames = {t: struct.Struct("<2xBB" + _PAYLOADS[t].format[1:] + "H") for t in msg_types}
+        self._buffer = bytearray()
+        self.frames = 0  # 正しく受信したフレーム数
+        self.crc_errors = 0  # CRC が合わなかったフレーム数
+        self.skipped_bytes = 0  # 同期のために捨てたバイト数
+
+    def feed(self, data: bytes) -> List[Tuple[int, Tuple]]:
+        """
+        受信したバイト列を追加し、揃ったフレームを取り出す
+        戻り値: [(種類, ペイロードの値のタプル), ...]
+        """
+        self._buffer += data
+        data = bytes(self._buffer)
+        size = len(data)
+        frames = self._frames
+        messages = []
+        start = 0
+        while True:
+            sync = data.find(SYNC, start)
+            if sync < 0:
+                # 同期ヘッダの1バイト目で終わっている場合はそれだけ残す
+                keep = 1 if start < size and data[-1] == SYNC[0] else 0
+                self.skipped_bytes += size - start - keep
+                start = size - keep
+                break
+            self.skipped_bytes += sync - start
+            start = sync
+            if size - start < _HEADER.size:
+                break
+            frame = frames.get(data[start + 3])
+            if data[start + 2] != PROTOCOL_VERSION or frame is None:
+                self.skipped_bytes += 1
+                start += 1
+                continue
+            end = start + frame.size
+            if end > size:
+                break
+            values = frame.unpack_from(data, start)
+            if crc16(data[start + 2:end - _CRC.size]) != values[-1]:
+                self.crc_errors += 1
+                self.skipped_bytes += 1
+                start += 1
+                continue
+            messages.append((values[1], values[2:-1]))
+            start = end
+        self.frames += len(messages)
+        del self._buffer[:start]
+        return messages
+
+
+class AsciiCodec:
+    """ASCII 形式 (カンマ区切りの1行) のロボットの状態の受信と送信値の送信"""
+
+    name = "ascii"
+    has_sequence = False  # 送信値に通し番号を入れられるか (ASCII 形式の送信値には予約フィールドがない)
+
+    def __init__(self, max_line_length: int = 256):
+        self._buffer = bytearray()
+        self._max_line_length = max_line_length
+        self.parse_errors = 0  # 読めなかった行の数
+
+    def feed(self, data: bytes) -> List[RobotStateSnapshot]:
+        """受信したバイト列を追加し、改行まで揃った行からロボットの状態を作る"""
+        self._buffer += data
+        end = self._buffer.rfind(b"\n")
+        if end < 0:
+            if len(self._buffer) > self._max_line_length:
+                # 改行が来ないまま溜まり続けるデータは捨てる
+                self.parse_errors += 1
+                self._buffer.clear()
+            return []
+        lines = self._buffer[:end].split(b"\n")
+        del self._buffer[:end + 1]
+        states = []
+        for line in lines:
+            try:
+                fields = parse_ascii_fields(line)
+                if fields is None:
+                    # 必要な項目が揃っていなければスキップ
+                    self.parse_errors += 1
+                    continue
+                states.append(robot_state_from_fields(*fields))
+            except ValueError:  # UnicodeDecodeError も含む
+                self.parse_errors += 1
+        return states
+
+    def encode_command(self, values: Sequence[int]) -> bytes:
+        """送信値を ASCII 形式の1行にする"""
+        val1, val2, val3, val4 = values
+        return f"{val1},{val2},{val3},{val4}\n".encode()
+
+
+class BinaryCodec:
+    """バイナリ形式 (同期ヘッダ・バージョン・固定長のペイロード・CRC16) のロボットの状態の受信と送信値の送信"""
+
+    name = "binary"
+    has_sequence = True  # 送信値の予約フィールドに通し番号を入れられる
+
+    def __init__(self):
+        self._decoder = BinaryFrameDecoder((MSG_STATE,))
+        self.parse_errors = 0  # 値が範囲外だったフレームの数
+
+    @property
+    def decoder(self) -> BinaryFrameDecoder:
+        return self._decoder
+
+    def feed(self, data: bytes) -> List[RobotStateSnapshot]:
+        """受信したバイト列を追加し、揃ったフレームからロボットの状態を作る"""
+        states = []
+        for _, fields in self._decoder.feed(data):
+            try:
+                states.append(robot_state_from_fields(*fields))
+            except ValueError:
+                self.parse_errors += 1
+        return states
+
+    def encode_command(self, values: Sequence[int], reserved: int = 0) -> bytes:
+        """送信値をバイナリ形式のフレームにする"""
+        return encode_frame(MSG_COMMAND, *values, reserved)
+
+
+def create_codecs(protocol: str) -> list:
+    """
+    プロトコル名から受信に使うコーデックのリストを作る
+    "auto" なら両方の形式で受信を試し、最初に正しく受信できた形式に決める (送信は決まるまで ASCII)
+    """
+    if protocol == "ascii":
+        return [AsciiCodec()]
+    if protocol == "binary":
+        return [BinaryCodec()]
+    if protocol == "auto":
+        return [AsciiCodec(), BinaryCodec()]
+    raise ValueError(f"Unknown serial protocol: {protocol}")
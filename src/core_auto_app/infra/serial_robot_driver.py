@@ -1,12 +1,15 @@
-from copy import deepcopy
+import os
+import selectors
 from threading import Thread, Lock
-from time import sleep
-from typing import Optional
+from time import monotonic, sleep, time
+from typing import Dict, Optional, Tuple
 
 import serial
 
 from core_auto_app.application.interfaces import RobotDriver
-from core_auto_app.domain.messages import RobotStateId, RobotState
+from core_auto_app.domain.messages import RobotStateSnapshot
+from core_auto_app.infra.serial_protocol import BinaryCodec, create_codecs
+from core_auto_app.infra.serial_telemetry import SerialTelemetry, format_summary
 
 class SerialRobotDriver(RobotDriver):
     """マイコンと通信しロボットを制御するクラス
@@ -15,6 +18,18 @@ class SerialRobotDriver(RobotDriver):
         port: シリアルポートのデバイス
         baudrate: ボーレート
         timeout: readのタイムアウト[秒]
+        protocol: "ascii" (カンマ区切りの行), "binary" (CRC付きの固定長フレーム),
+            "auto" (マイコンから最初に正しく受信できた形式に合わせる。決まるまでは ASCII で送信する)
+        io_mode: "polling" なら readline 相当の読み込み・送信・10msの待機を繰り返す。
+            "event" なら selectors でシリアルポートを監視し、受信したらすぐに解析し、
+            送信値が変わったらすぐに (max_send_rate_hz を超えない間隔で) 送信する
+        max_send_rate_hz: "event" モードで送信する最大の頻度[Hz]
+        keepalive_interval: "event" モードで送信値が変わらなくても同じ値を送り直す間隔[秒]
+            (マイコン側で通信の途絶を検出できるようにする)
+        telemetry_interval: 通信の状態の要約を表示する間隔[秒] (0なら表示しない。値は get_telemetry() で取得できる)
+
+    バイナリ形式では送信値の予約フィールドに通し番号を入れる。マイコンが受信した最新の番号を
+    ロボットの状態の予約フィールドで返すと、往復時間を計測できる。
     """
 
     def __init__(
@@ -24,25 +39,54 @@ class SerialRobotDriver(RobotDriver):
         parity=serial.PARITY_NONE,
         stopbits=serial.STOPBITS_ONE,
         timeout=0.01,  # 10ms timeout
+        protocol="ascii",
+        io_mode="polling",
+        max_send_rate_hz=200.0,
+        keepalive_interval=0.1,
+        telemetry_interval=5.0,
     ):
         self._port = port
         self._baudrate = baudrate
         self._parity = parity
         self._stopbits = stopbits
         self._timeout = timeout
+        # 受信に使うコーデック ("auto" では形式が決まるまで複数)。送信には先頭のコーデックを使う
+        self._codecs = create_codecs(protocol)
         self._serial: Optional[serial.Serial] = None
+        # 通信の状態の記録 (受信・送信・エラーを1件ずつ表示する代わりに、数えて定期的に要約を表示する)
+        self._telemetry = SerialTelemetry()
+        self._telemetry_interval = telemetry_interval
+        self._next_summary_time = monotonic() + telemetry_interval
+        self._disconnected = False  # 切断されて開き直すのを待っているか
         self._open_serial_port()
 
-        # 初期ロボット状態（排他制御用ロック付き）
-        self._state_lock = Lock()
-        self._robot_state = RobotState()
+        # 最新のロボット状態 (読み取り専用のスナップショットを参照ごと差し替えるのでロックは不要)
+        self._robot_state = RobotStateSnapshot()
 
         # 送信用の値とそのロック
         self._send_lock = Lock()
         self._send_values = (0, 0, 0, 0)  # (val1, val2, val3, val4)
+        # 送信遅延の計測用 (時刻はホストの時刻[ms])
+        self._send_set_time: Optional[float] = None  # 未送信の値を設定した時刻 (送信済みならNone)
+        self._send_capture_time: Optional[float] = None  # 送信する値の元になったフレームの撮影時刻
+        self._send_delay_ms: Optional[float] = None  # 値の設定から書き込みまでの遅延 (指数移動平均)
+        self._capture_latency_ms: Optional[float] = None  # 撮影から書き込みまでの遅延 (指数移動平均)
+        self._latency_smoothing = 0.2
+
+        # "event" モードの送信の制御 (時刻は time.monotonic() [秒])
+        if io_mode not in ("polling", "event"):
+            raise ValueError(f"Unknown serial I/O mode: {io_mode}")
+        self._io_mode = io_mode
+        self._min_send_interval = 1.0 / max_send_rate_hz
+        self._keepalive_interval = keepalive_interval
+        self._send_pending = False  # 最後に書き込んだ値から変わった値が未送信か
+        self._written_values: Optional[Tuple[int, int, int, int]] = None  # 最後に書き込んだ値
+        self._last_write_time = 0.0
+        self._wakeup_r, self._wakeup_w = os.pipe() if io_mode == "event" else (None, None)
 
         self._is_closed = False
-        self._thread = Thread(target=self._update_robot_state, daemon=True)
+        target = self._run_event_loop if io_mode == "event" else self._update_robot_state
+        self._thread = Thread(target=target, daemon=True)
         self._thread.start()
 
     def _open_serial_port(self) -> None:
@@ -56,8 +100,16 @@ class SerialRobotDriver(RobotDriver):
                 timeout=self._timeout,
             )
         except serial.serialutil.SerialException as err:
-            print(err)
+            if self._serial is not None or not self._disconnected:
+                # 開き直しは10msごとに繰り返すので、表示は切断後の最初の1回だけにする
+                print(err)
             self._serial = None
+            self._disconnected = True
+            return
+        if self._disconnected:
+            self._telemetry.record_reconnect()
+            print(f"serial port {self._port} reopened")
+            self._disconnected = False
 
     def _update_robot_state(self) -> None:
         """10ms間隔でシリアル通信の受信と送信を実施する"""
@@ -68,76 +120,225 @@ class SerialRobotDriver(RobotDriver):
                 continue
 
             try:
-                buffer = self._serial.readline()
-                print(f"read state: {buffer}")
+                # 届いているバイトをまとめて読む (なければ1バイト目をタイムアウトまで待つ)
+                buffer = self._serial.read(self._serial.in_waiting or 1)
             except Exception as err:
-                print(err)
-                if self._serial:
-                    self._serial.close()
-                self._serial = None
-                continue
-
-            try:
-                str_data = buffer.decode("ascii")
-            except UnicodeDecodeError as err:
-                print(err)
+                self._telemetry.record_read_error()
+                self._close_serial_port(err)
                 continue
-
-            if "\n" in str_data:
-                try:
-                    str_data = str_data.strip()
-                    parts = str_data.split(",")
-                    if len(parts) < 8:
-                        # 必要な項目が揃っていなければスキップ
-                        continue
-                    new_state = RobotState(
-                        state_id=RobotStateId(int(parts[0])),
-                        pitch_deg=float(parts[1]) / 10.0,
-                        muzzle_velocity=float(parts[2]) / 1000,
-                        reloaded_left_disks=int(parts[3]),
-                        reloaded_right_disks=int(parts[4]),
-                        video_id=int(parts[5]),
-                        target_panel=bool((int(parts[6]) >> 3) & 0b00000001),
-                        auto_aim=bool((int(parts[6]) >> 2) & 0b00000001),
-                        record_video=bool((int(parts[6]) >> 1) & 0b00000001),
-                        ready_to_fire=bool((int(parts[6]) >> 0) & 0b00000001),
-                        reserved=int(parts[7])
-                    )
-                    with self._state_lock:
-                        self._robot_state = new_state
-                except ValueError as err:
-                    print(err)
-                    continue
+            self._receive(buffer)
 
             # 受信後すぐに送信処理を実施（排他制御）
             with self._send_lock:
                 val1, val2, val3, val4 = self._send_values
-            send_str = f"{val1},{val2},{val3},{val4}\n"
+                set_time = self._send_set_time
+                capture_time = self._send_capture_time
+                self._send_set_time = None
+            send_data = self._encode_command((val1, val2, val3, val4))
             try:
-                self._serial.write(send_str.encode())
-                print(f"sent data: {send_str.strip()}")
+                self._serial.write(send_data)
             except Exception as err:
-                print(err)
-                if self._serial:
-                    self._serial.close()
-                self._serial = None
+                self._telemetry.record_write_error()
+                self._close_serial_port(err)
                 continue
+            self._telemetry.record_sent()
+            if set_time is not None:
+                self._record_send_latency(set_time, capture_time)
 
+            self._log_telemetry_if_due()
             sleep(0.01)  # 10ms間隔
 
-    def set_send_values(self, val1: int, val2: int, val3: int, val4:int) -> None:
-        """マイコンへ送信する整数値を更新する"""
+    def _close_serial_port(self, err: Exception) -> None:
+        """通信エラーの後にシリアルポートを閉じる (次のループで開き直す)"""
+        print(err)
+        if self._serial:
+            self._serial.close()
+        self._serial = None
+        self._disconnected = True
+
+    def _run_event_loop(self) -> None:
+        """シリアルポートと送信値の更新を selectors で待ち、届いたらすぐに受信・送信する"""
+        selector = selectors.DefaultSelector()
+        selector.register(self._wakeup_r, selectors.EVENT_READ, "wakeup")
+        registered = None  # selector に登録しているシリアルポート
+        registered_fd = None  # その fd (閉じたポートの fileno() は例外になるので、登録を外すときはこちらを使う)
+        while not self._is_closed:
+            if not self._serial:
+                sleep(0.01)
+                self._open_serial_port()
+                continue
+            if registered is not self._serial:
+                if registered is not None:
+                    selector.unregister(registered_fd)
+                registered_fd = self._serial.fileno()
+                selector.register(registered_fd, selectors.EVENT_READ, "serial")
+                registered = self._serial
+
+            for key, _ in selector.select(self._time_until_send()):
+                if key.data == "wakeup":
+                    os.read(self._wakeup_r, 4096)
+                    continue
+                try:
+                    buffer = self._serial.read(self._serial.in_waiting or 1)
+                except Exception as err:
+                    self._telemetry.record_read_error()
+                    self._close_serial_port(err)
+                    break
+                self._receive(buffer)
+
+            if self._serial and self._time_until_send() == 0.0:
+                self._write_send_values()
+            if not self._serial and registered is not None:
+                selector.unregister(registered_fd)
+                registered = registered_fd = None
+            self._log_telemetry_if_due()
+        selector.close()
+
+    def _time_until_send(self) -> float:
+        """次に送信するまでの時間[秒] (終了を確認するため最大0.1秒)"""
+        elapsed = monotonic() - self._last_write_time
+        interval = self._min_send_interval if self._send_pending else self._keepalive_interval
+        return min(max(interval - elapsed, 0.0), 0.1)
+
+    def _write_send_values(self) -> None:
+        """送信値を書き込む ("event" モード用)"""
         with self._send_lock:
-            self._send_values = (val1, val2, val3, val4)
+            values = self._send_values
+            set_time = self._send_set_time
+            capture_time = self._send_capture_time
+            self._send_set_time = None
+            self._send_pending = False
+            # 書き込み中に設定された値と比べられるよう、書き込む前に更新する
+            self._written_values = values
+            self._last_write_time = monotonic()
+        try:
+            self._serial.write(self._encode_command(values))
+        except Exception as err:
+            self._telemetry.record_write_error()
+            self._close_serial_port(err)
+            return
+        self._telemetry.record_sent()
+        if set_time is not None:
+            self._record_send_latency(set_time, capture_time)
+
+    def _receive(self, buffer: bytes) -> None:
+        """受信したバイト列を解析して最新の状態を差し替え、受信と往復時間を記録する"""
+        states = self._decode(buffer)
+        now = monotonic()
+        self._telemetry.record_received(len(buffer), len(states), now)
+        if states:
+            for state in states:
+                self._telemetry.record_echo(state.reserved, now)
+            self._robot_state = states[-1]
+
+    def _encode_command(self, values: Tuple[int, int, int, int]) -> bytes:
+        """送信値を送信に使う形式にする (予約フィールドがあれば通し番号を入れる)"""
+        codec = self._codecs[0]
+        if codec.has_sequence:
+            return codec.encode_command(values, self._telemetry.next_sequence())
+        return codec.encode_command(values)
+
+    def _decode(self, buffer: bytes):
+        """受信したバイト列からロボットの状態を取り出す ("auto" では最初に受信できた形式に決める)"""
+        for codec in self._codecs:
+            states = codec.feed(buffer)
+            if states:
+                if len(self._codecs) > 1:
+                    print(f"serial protocol: {codec.name}")
+                    self._codecs = [codec]
+                return states
+        return []
+
+    @property
+    def protocol(self) -> str:
+        """受信に使っている形式 ("auto" で決まる前は "auto")"""
+        return self._codecs[0].name if len(self._codecs) == 1 else "auto"
+
+    def set_send_values(
+        self, val1: int, val2: int, val3: int, val4:int, capture_time: Optional[float] = None
+    ) -> None:
+        """マイコンへ送信する整数値を更新する
+
+        Args:
+            capture_time: 値の元になったフレームの撮影時刻 (ホストの時刻[ms])。指定すると撮影から書き込みまでの遅延を計測する
+        """
+        values = (val1, val2, val3, val4)
+        with self._send_lock:
+            if self._io_mode == "event":
+                # 書き込み済みの値と同じなら送らない (変わった値はすぐに送信スレッドを起こして送る)
+                changed = values != self._written_values
+                wakeup = changed and not self._send_pending
+                # 起きた送信スレッドが未送信の値があることを確認できるよう、先にフラグを立てる
+                self._send_pending = changed
+                if wakeup:
+                    os.write(self._wakeup_w, b"\0")
+                if not changed:
+                    self._send_values = values
+                    self._send_set_time = None
+                    return
+            self._send_values = values
+            self._send_set_time = time() * 1000.0
+            self._send_capture_time = capture_time
+
+    def _record_send_latency(self, set_time: float, capture_time: Optional[float]) -> None:
+        """設定された値を初めて書き込んだときの遅延を記録する"""
+        now = time() * 1000.0
+        alpha = self._latency_smoothing
+        delay = now - set_time
+        if self._send_delay_ms is None:
+            self._send_delay_ms = delay
+        else:
+            self._send_delay_ms += alpha * (delay - self._send_delay_ms)
+        if capture_time is not None:
+            latency = now - capture_time
+            if self._capture_latency_ms is None:
+                self._capture_latency_ms = latency
+            else:
+                self._capture_latency_ms += alpha * (latency - self._capture_latency_ms)
+
+    def get_send_delay_ms(self) -> Optional[float]:
+        """値を設定してから書き込むまでの遅延[ms]の平均を返す (未計測ならNone)"""
+        return self._send_delay_ms
+
+    def get_latency_stats(self) -> Dict[str, Optional[float]]:
+        """送信遅延の平均[ms] (値の設定から書き込みまで、撮影から書き込みまで) を返す"""
+        return {"set_to_write_ms": self._send_delay_ms, "capture_to_write_ms": self._capture_latency_ms}
+
+    def get_telemetry(self) -> Dict[str, object]:
+        """通信の状態 (受信・送信の回数と頻度、エラー・切断・再接続の回数、最後に状態を受信してからの時間[秒]、
+        往復時間[ms]のヒストグラム、送信遅延[ms]) を返す"""
+        stats = self._telemetry.get_stats()
+        codecs = self._codecs
+        decoders = [codec.decoder for codec in codecs if isinstance(codec, BinaryCodec)]
+        stats["protocol"] = self.protocol
+        stats["parse_errors"] = sum(codec.parse_errors for codec in codecs)
+        stats["crc_errors"] = sum(decoder.crc_errors for decoder in decoders)
+        stats["skipped_bytes"] = sum(decoder.skipped_bytes for decoder in decoders)
+        stats.update(self.get_latency_stats())
+        return stats
+
+    def _log_telemetry_if_due(self) -> None:
+        """telemetry_interval ごとに通信の状態の要約を表示する"""
+        if not self._telemetry_interval:
+            return
+        now = monotonic()
+        if now >= self._next_summary_time:
+            self._next_summary_time = now + self._telemetry_interval
+            print(f"serial: {format_summary(self.get_telemetry())}")
 
-    def get_robot_state(self) -> RobotState:
-        """最新のロボットの状態を返す"""
-        with self._state_lock:
-            return deepcopy(self._robot_state)
+    def get_robot_state(self) -> RobotStateSnapshot:
+        """最新のロボットの状態を返す (読み取り専用なのでコピーせずに返す)"""
+        return self._robot_state
 
     def close(self):
         print("closing robot driver")
         self._is_closed = True
+        if self._wakeup_w is not None:
+            os.write(self._wakeup_w, b"\0")
         self._thread.join()
+        print(f"serial: {format_summary(self.get_telemetry())}")
         if self._serial:
             self._serial.close()
+        if self._wakeup_w is not None:
+            os.close(self._wakeup_r)
+            os.close(self._wakeup_w)
@@ -0,0 +1,211 @@
+import bisect
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Dict, Optional, Sequence
+
+# 送信値の予約フィールドに入れる通し番号の範囲 (0は番号なし)
+MAX_SEQUENCE = 0xFFFF
+
+
+class LatencyHistogram:
+    """遅延[ms]を固定の区間ごとに数えるヒストグラム
+
+    値を保存しないので、長時間動かしてもメモリも記録の時間も増えない。
+    パーセンタイルは値が入っている区間の上限で近似する。
+    """
+
+    BOUNDS_MS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0, 1000.0)
+
+    def __init__(self, bounds_ms: Sequence[float] = BOUNDS_MS):
+        self._bounds = tuple(bounds_ms)
+        self._counts = [0] * (len(self._bounds) + 1)  # 最後は上限を超えた値
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, value_ms: float) -> None:
+        self._counts[bisect.bisect_left(self._bounds, value_ms)] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        if value_ms > self.max_ms:
+            self.max_ms = value_ms
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q [%] パーセンタイルを返す (値がなければNone)"""
+        if self.count == 0:
+            return None
+        rank = q / 100.0 * self.count
+        cumulative = 0
+        for bound, count in zip(self._bounds, self._counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def get_stats(self) -> Dict[str, object]:
+        """件数・平均・p50・p99・最大[ms] と区間ごとの件数を返す"""
+        buckets = {f"<={bound:g}": count for bound, count in zip(self._bounds, self._counts)}
+        buckets[f">{self._bounds[-1]:g}"] = self._counts[-1]
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else None,
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max_ms if self.count else None,
+            "buckets": buckets,
+        }
+
+
+class SerialTelemetry:
+    """シリアル通信の状態を数えるクラス
+
+    受信・送信・エラー・再接続の回数、1秒ごとの頻度、最後に正しい状態を受信してからの時間、
+    往復時間 (送信値の予約フィールドに入れた通し番号が、ロボットの状態の予約フィールドで返ってくるまでの時間)
+    を記録する。記録は通信スレッドから、get_stats() は別のスレッドから呼んでよい。
+    時刻は time.monotonic() [秒]。
+    """
+
+    RATE_WINDOW = 1.0  # 頻度を計算する間隔[秒]
+
+    def __init__(self, max_pending: int = 256, now: Optional[float] = None):
+        """
+        Args:
+            max_pending: 返事を待つ通し番号の最大数 (超えたら古いものから返事がなかったとみなす)
+            now: 計測を始めた時刻 (Noneなら現在時刻)
+        """
+        self._lock = Lock()
+        self._max_pending = max_pending
+        self._start_time = monotonic() if now is None else now
+        self.bytes_received = 0
+        self.states_received = 0
+        self.commands_sent = 0
+        self.read_errors = 0
+        self.write_errors = 0
+        self.disconnects = 0
+        self.reconnects = 0
+        self._last_state_time: Optional[float] = None
+        # 1秒ごとの頻度
+        self._window_start = self._start_time
+        self._window_counts = (0, 0, 0)  # 区間の開始時点の (受信バイト数, 受信した状態の数, 送信数)
+        self._rates: Dict[str, float] = {"bytes_per_sec": 0.0, "states_per_sec": 0.0, "commands_per_sec": 0.0}
+        # 往復時間
+        self._sequence = 0
+        self._pending: "OrderedDict[int, float]" = OrderedDict()  # 通し番号 -> 送信時刻
+        self.unanswered = 0  # 返事がなかった通し番号の数
+        self._rtt = LatencyHistogram()
+
+    def record_received(self, num_bytes: int, num_states: int, now: Optional[float] = None) -> None:
+        """受信したバイト数と、そこから取り出せた状態の数を記録する"""
+        now = monotonic() if now is None else now
+        with self._lock:
+            self.bytes_received += num_bytes
+            self.states_received += num_states
+            if num_states:
+                self._last_state_time = now
+            self._update_rates(now)
+
+    def record_echo(self, sequence: int, now: Optional[float] = None) -> None:
+        """ロボットの状態の予約フィールドで返ってきた通し番号を記録する"""
+        if sequence == 0:
+            return
+        now = monotonic() if now is None else now
+        with self._lock:
+            sent = self._pending.get(sequence)
+            if sent is None:
+                return
+            # それより前に送った番号は返事がなかったものとする
+            while True:
+                pending_sequence, _ = self._pending.popitem(last=False)
+                if pending_sequence == sequence:
+                    break
+                self.unanswered += 1
+            self._rtt.add((now - sent) * 1000.0)
+
+    def next_sequence(self, now: Optional[float] = None) -> int:
+        """送信値に入れる通し番号 (1〜65535) を払い出し、送信時刻を記録する"""
+        now = monotonic() if now is None else now
+        with self._lock:
+            self._sequence = self._sequence % MAX_SEQUENCE + 1
+            self._pending.pop(self._sequence, None)
+            self._pending[self._sequence] = now
+            if len(self._pending) > self._max_pending:
+                self._pending.popitem(last=False)
+                self.unanswered += 1
+            return self._sequence
+
+    def record_sent(self, now: Optional[float] = None) -> None:
+        """送信値を書き込んだことを記録する"""
+        now = monotonic() if now is None else now
+        with self._lock:
+            self.commands_sent += 1
+            self._update_rates(now)
+
+    def record_read_error(self) -> None:
+        with self._lock:
+            self.read_errors += 1
+            self.disconnects += 1
+
+    def record_write_error(self) -> None:
+        with self._lock:
+            self.write_errors += 1
+            self.disconnects += 1
+
+    def record_reconnect(self) -> None:
+        """切断の後にシリアルポートを開き直せたことを記録する"""
+        with self._lock:
+            self.reconnects += 1
+
+    def _update_rates(self, now: float) -> None:
+        """1秒ごとに頻度を計算し直す (ロックの中で呼ぶ)"""
+        elapsed = now - self._window_start
+        if elapsed < self.RATE_WINDOW:
+            return
+        counts = (self.bytes_received, self.states_received, self.commands_sent)
+        self._rates = {
+            name: (count - start) / elapsed
+            for name, count, start in zip(
+                ("bytes_per_sec", "states_per_sec", "commands_per_sec"), counts, self._window_counts
+            )
+        }
+        self._window_start = now
+        self._window_counts = counts
+
+    def get_stats(self, now: Optional[float] = None) -> Dict[str, object]:
+        """記録した値をまとめて返す"""
+        now = monotonic() if now is None else now
+        with self._lock:
+            self._update_rates(now)
+            since_last_state = None if self._last_state_time is None else now - self._last_state_time
+            return {
+                "uptime_sec": now - self._start_time,
+                "bytes_received": self.bytes_received,
+                "states_received": self.states_received,
+                "commands_sent": self.commands_sent,
+                **self._rates,
+                "read_errors": self.read_errors,
+                "write_errors": self.write_errors,
+                "disconnects": self.disconnects,
+                "reconnects": self.reconnects,
+                "since_last_state_sec": since_last_state,
+                "unanswered": self.unanswered,
+                "rtt_ms": self._rtt.get_stats(),
+            }
+
+
+def format_summary(stats: Dict[str, object]) -> str:
+    """get_stats() の値を1行の要約にする"""
+
+    def ms(value):
+        return "-" if value is None else f"{value:.1f}"
+
+    since = stats["since_last_state_sec"]
+    rtt = stats["rtt_ms"]
+    return (
+        f"rx {stats['states_per_sec']:.0f}/s ({stats['bytes_per_sec']:.0f} B/s), tx {stats['commands_per_sec']:.0f}/s, "
+        f"last state {'-' if since is None else f'{since * 1000.0:.0f}ms'} ago, "
+        f"parse errors {stats.get('parse_errors', 0)}, crc errors {stats.get('crc_errors', 0)}, "
+        f"disconnects {stats['disconnects']}, reconnects {stats['reconnects']}, "
+        f"rtt p50 {ms(rtt['p50_ms'])}ms p99 {ms(rtt['p99_ms'])}ms max {ms(rtt['max_ms'])}ms (n={rtt['count']}), "
+        f"unanswered {stats['unanswered']}"
+    )
@@ -1,23 +1,60 @@
-from typing import Union
+from typing import TYPE_CHECKING, Optional, Union
 import threading
+import time
 
 import cv2
 import numpy as np
 
 from core_auto_app.application.interfaces import ColorCamera
+from core_auto_app.domain.messages import FrameData
+from core_auto_app.domain.frame_ring import FrameRing
+
+if TYPE_CHECKING:
+    from core_auto_app.detector.detection_service import DetectionService
 
 
 class UsbCamera(ColorCamera):
     """USBカメラからカラー画像を取得するクラス（スレッド対応版）"""
 
-    def __init__(self, filename: Union[int, str]):
+    def __init__(
+        self,
+        filename: Union[int, str],
+        detection_service: Optional["DetectionService"] = None,
+        standby_when_inactive: bool = False,
+        fourcc: Optional[str] = None,
+    ):
+        """
+        Args:
+            filename: デバイス番号または動画ファイルのパス
+            detection_service: 指定すると、このカメラの画像も物体検出の対象にする
+            standby_when_inactive: Trueなら表示されていない間は grab() だけを行い、
+                表示に切り替わってから retrieve() でデコードする (検出の対象のカメラは常にデコードする)
+            fourcc: カメラに要求する画素形式 (例: "MJPG"。Noneならカメラの既定)
+        """
         self._filename = filename
+        self._standby_when_inactive = standby_when_inactive
+        self._fourcc = fourcc
+        self._is_active = True  # 表示中か (set_active() で切り替える)
+        self._grab_count = 0  # grab() したフレーム数
+        self._decode_count = 0  # retrieve() でデコードしたフレーム数
         self._capture = None
         self._is_running = False
         self._frame_lock = threading.Lock()
-        self._frame = None
+        # 新しいフレームの到着を待つための条件変数
+        self._frame_cond = threading.Condition(self._frame_lock)
+        # 取得したフレームは事前に確保したスロットに直接書き込み、読み出し側には読み取り専用の配列を渡す
+        self._ring = FrameRing()
+        self._has_frame = False
+        self._frame_id = 0  # フレームの通し番号
+        self._frame_timestamp = 0.0  # ms (ホストの時刻)
         self._thread = None
 
+        self._detection_subscription = None
+        if detection_service is not None:
+            self._detection_subscription = detection_service.subscribe(
+                f"usb_camera_{filename}", lambda last_frame_id: self.wait_for_frame(last_frame_id, timeout=0)
+            )
+
     @property
     def is_running(self):
         return self._is_running
@@ -26,6 +63,9 @@ class UsbCamera(ColorCamera):
         """カメラストリームを開始させる"""
         if not self._is_running:
             self._capture = cv2.VideoCapture(self._filename)
+            if self._fourcc is not None:
+                # V4L2では解像度より先に画素形式を設定する
+                self._capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self._fourcc))
             self._capture.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
             self._capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
             # バッファサイズを1に設定することで、古いフレームを残さず常に最新のフレームのみを取得
@@ -34,7 +74,7 @@ class UsbCamera(ColorCamera):
             # フレーム取得スレッドの開始
             self._thread = threading.Thread(target=self._update_frames, daemon=True)
             self._thread.start()
-            print(f"USB camera {self._filename} started.")
+            print(f"USB camera {self._filename} started. (format: {self._get_fourcc()})")
         else:
             print(f"USB camera {self._filename} is already running.")
 
@@ -48,27 +88,133 @@ class UsbCamera(ColorCamera):
                 self._capture.release()
                 self._capture = None
             self._thread = None
-            print(f"USB camera {self._filename} stopped.")
+            print(
+                f"USB camera {self._filename} stopped. "
+                f"grabbed: {self._grab_count}, decoded: {self._decode_count}, frame ring: {self._ring.get_stats()}"
+            )
         else:
             print(f"USB camera {self._filename} is not running.")
 
+    def _get_fourcc(self) -> str:
+        """カメラと取り決めた画素形式を返す"""
+        code = int(self._capture.get(cv2.CAP_PROP_FOURCC))
+        return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4))
+
+    def set_active(self, active: bool):
+        """表示中かを設定する (待機させる設定の場合、表示されていない間はデコードしない)"""
+        self._is_active = active
+
+    def _should_decode(self) -> bool:
+        """取得したフレームをデコードするか"""
+        return not self._standby_when_inactive or self._is_active or self._detection_subscription is not None
+
     def _update_frames(self):
         """フレームを継続的に取得するスレッド用メソッド"""
+        shape = None
         while self._is_running:
-            ret, frame = self._capture.read()
-            if not ret:
+            # 待機中も grab() は続けて、ドライバのバッファに古いフレームが残らないようにする
+            if not self._capture.grab():
+                continue
+            self._grab_count += 1
+            if not self._should_decode():
                 continue
-            with self._frame_lock:
-                self._frame = frame
+            if shape is None:
+                # 最初のフレームで画像の大きさを調べる
+                ret, frame = self._capture.retrieve()
+                if not ret:
+                    continue
+                shape = frame.shape
+                slot = self._ring.acquire(shape)
+                np.copyto(slot.array, frame)
+            else:
+                # 空いているスロットに直接デコードする
+                slot = self._ring.acquire(shape)
+                ret, frame = self._capture.retrieve(slot.array)
+                if not ret:
+                    self._ring.discard(slot)
+                    continue
+                if frame is not slot.array:
+                    # 画像の大きさが変わった場合は、次のフレームから新しい大きさのスロットを使う
+                    self._ring.discard(slot)
+                    shape = frame.shape
+                    slot = self._ring.acquire(shape)
+                    np.copyto(slot.array, frame)
+            self._decode_count += 1
+            with self._frame_cond:
+                self._ring.publish(slot)
+                self._has_frame = True
+                self._frame_id += 1
+                self._frame_timestamp = time.time() * 1000.0
+                self._frame_cond.notify_all()
+            if self._detection_subscription is not None:
+                # 検出サービスの検出スレッドに新しいフレームを知らせる
+                self._detection_subscription.notify_new_frame()
 
     def get_image(self):
         """最新のカラー画像を取得する
 
         Returns:
-            color_image: カラー画像（numpy.ndarray）
+            color_image: カラー画像（読み取り専用の numpy.ndarray。書き込む場合は frame_ring.writable() でコピーする）
         """
+        return self._ring.get_latest()
+
+    def get_frame(self) -> Optional[FrameData]:
+        """最新のカラー画像を通し番号・タイムスタンプ付きで取得する（未取得ならNone。画像は読み取り専用）"""
         with self._frame_lock:
-            frame = self._frame.copy() if self._frame is not None else None
+            if not self._has_frame:
+                return None
+            return FrameData(self._frame_id, self._frame_timestamp, self._ring.get_latest())
+
+    def wait_for_frame(self, last_frame_id: int, timeout: Optional[float] = None) -> Optional[FrameData]:
+        """
+        通し番号が last_frame_id より新しいフレームが届くまで待ち、それを返す (画像は読み取り専用)
+
+        Args:
+            last_frame_id: 処理済みのフレームの通し番号 (未処理なら0)
+            timeout: 待機する最大時間[秒] (Noneなら無期限)
+
+        Returns:
+            frame: 新しいフレーム（タイムアウトした場合はNone）
+        """
+        with self._frame_cond:
+            if not self._frame_cond.wait_for(lambda: self._frame_id > last_frame_id, timeout):
+                return None
+            return FrameData(self._frame_id, self._frame_timestamp, self._ring.get_latest())
+
+    def set_target_panel(self, flag: bool):
+        """ターゲットパネルフラグを設定する"""
+        if self._detection_subscription is not None:
+            self._detection_subscription.set_target_panel(flag)
+
+    def get_detection_results(self):
+        """最新の検出結果を取得する（検出を行っていない場合はNone）"""
+        if self._detection_subscription is None:
+            return None
+        return self._detection_subscription.get_detection_results()
+
+    def get_aiming_target(self):
+        """最新の照準対象を取得する（検出を行っていない場合はNone）"""
+        if self._detection_subscription is None:
+            return None
+        return self._detection_subscription.get_aiming_target()
+
+    def get_predicted_detection_results(self, timestamp: Optional[float] = None):
+        """
+        各トラックの位置を timestamp[ms] まで外挿した検出結果を取得する（検出を行っていない場合はNone）
+
+        Args:
+            timestamp: 外挿する時刻 (ホストの時刻[ms]。Noneなら現在時刻)
+        """
+        if self._detection_subscription is None:
+            return None
+        if timestamp is None:
+            timestamp = time.time() * 1000.0
+        return self._detection_subscription.get_predicted_detection_results(timestamp)
+
+    def draw_detection_results(self, frame, detection_results):
+        """検出結果（トラッキング結果）をフレームに描画する"""
+        if self._detection_subscription is not None:
+            self._detection_subscription.draw_detection_results(frame, detection_results)
         return frame
 
     def close(self):
@@ -1,13 +1,21 @@
 import argparse
 import os
 import re
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+from typing import Callable, Dict, Optional
 
 from core_auto_app.application.application import Application
-from core_auto_app.infra.cv_presenter import CvPresenter
-from core_auto_app.infra.realsense_camera import RealsenseCamera
-from core_auto_app.infra.serial_robot_driver import SerialRobotDriver
-from core_auto_app.infra.usb_camera import UsbCamera
+from core_auto_app.detector.aiming.ballistics import BallisticSolver
+from core_auto_app.detector.motion_gate import MotionGate
+from core_auto_app.startup import StartupTimer
+
+# torch/YOLOX/pyrealsense2 などの重いモジュールは、起動時間短縮のため
+# run_application() の中で、デバイスの初期化やモデルの読み込みと並行してimportする
+
+# inference_backend.BACKEND_NAMES と同じ (引数の解析だけでtorchをimportしないよう直接書く)
+DETECTOR_BACKENDS = ["cuda", "cpu", "onnx"]
 
 def get_video_number_from_symlink(symlink_path: str) -> int:
     """
@@ -35,6 +43,30 @@ def parse_args() -> argparse.Namespace:
         type=str,
         help="serial port for communicating with robot",
     )
+    parser.add_argument(
+        "--serial_protocol",
+        default="ascii",
+        choices=["ascii", "binary", "auto"],
+        help="ascii: comma-separated lines, binary: fixed-size frames with CRC16, auto: follow the format the robot sends",
+    )
+    parser.add_argument(
+        "--serial_io",
+        default="polling",
+        choices=["polling", "event"],
+        help="polling: read, write and sleep 10 ms in a loop, event: wait on the serial port with selectors and send changed values immediately",
+    )
+    parser.add_argument(
+        "--max_send_rate_hz",
+        default=200.0,
+        type=float,
+        help="maximum rate of sending changed values in the event serial I/O mode",
+    )
+    parser.add_argument(
+        "--serial_telemetry_interval",
+        default=5.0,
+        type=float,
+        help="interval in seconds of printing the serial link summary (0 to disable)",
+    )
     parser.add_argument(
         "--record_dir",
         default="/mnt/ssd1",
@@ -55,25 +87,318 @@ def parse_args() -> argparse.Namespace:
         "--weight_path",
         default="/home/nvidia/core_auto_app/models/yolox_s/phase1_2_best_ckpt.pth",
         type=str,
-        help="path to YOLOX weight file (.pth)"
+        help="path to YOLOX weight file (.pth, or .onnx for the onnx backend)"
+    )
+    parser.add_argument(
+        "--detector_backend",
+        default="cuda",
+        choices=DETECTOR_BACKENDS,
+        help="inference backend of the detector (cuda/cpu: PyTorch, onnx: ONNX Runtime on CPU)",
+    )
+    parser.add_argument(
+        "--detection_mode",
+        default="full",
+        choices=["full", "roi"],
+        help="full: run the detector on every full frame, roi: run it on crops around tracked targets between full frames",
+    )
+    parser.add_argument(
+        "--full_frame_interval",
+        default=5,
+        type=int,
+        help="interval [frames] of full-frame detection in roi mode",
+    )
+    parser.add_argument(
+        "--multi_camera_detection",
+        action="store_true",
+        help="run detection on the RealSense and both USB cameras with one batched detector",
+    )
+    parser.add_argument(
+        "--pipelined_detection",
+        action="store_true",
+        help="run preprocessing, inference and tracking as overlapping pipeline stages (full detection mode only)",
+    )
+    parser.add_argument(
+        "--motion_gate",
+        action="store_true",
+        help="skip detector inference while the scene is static or the robot is defeated",
+    )
+    parser.add_argument(
+        "--motion_threshold",
+        default=2.0,
+        type=float,
+        help="mean absolute difference (0-255) of downscaled frames that triggers inference",
+    )
+    parser.add_argument(
+        "--motion_max_interval",
+        default=0.5,
+        type=float,
+        help="maximum interval [s] between inferences on a static scene",
+    )
+    parser.add_argument(
+        "--latency_compensation",
+        action="store_true",
+        help="extrapolate the aim point by the measured capture-to-serial-write delay using the tracker velocity",
+    )
+    parser.add_argument(
+        "--depth_alignment",
+        default="full",
+        choices=["full", "roi"],
+        help="full: align the whole depth frame to color every frame, roi: align only the target ROIs on demand",
+    )
+    parser.add_argument(
+        "--ballistic_solution",
+        action="store_true",
+        help="send the ballistic pitch and lead angle (deg x10) in the 3rd and 4th values instead of latency and confidence",
+    )
+    parser.add_argument(
+        "--muzzle_velocity",
+        default=15.0,
+        type=float,
+        help="muzzle velocity [m/s] used until the robot reports a measured one",
+    )
+    parser.add_argument(
+        "--drag_coefficient",
+        default=0.0,
+        type=float,
+        help="quadratic air drag coefficient k [1/m] of the projectile (acceleration = -k|v|v)",
+    )
+    parser.add_argument(
+        "--muzzle_offset",
+        default=[0.0, 0.0, 0.0],
+        type=float,
+        nargs=3,
+        help="muzzle position (X right, Y down, Z forward) [m] in the RealSense camera frame",
+    )
+    parser.add_argument(
+        "--camera_tilt_deg",
+        default=0.0,
+        type=float,
+        help="upward tilt [deg] of the RealSense camera when the launcher is level",
+    )
+    parser.add_argument(
+        "--camera_on_launcher",
+        action="store_true",
+        help="the RealSense camera pitches with the launcher; add the received pitch to the camera tilt",
+    )
+    parser.add_argument(
+        "--detection_process",
+        action="store_true",
+        help="run the RealSense detector, tracker and target selector in a separate process fed through shared memory",
+    )
+    parser.add_argument(
+        "--usb_standby",
+        action="store_true",
+        help="only grab() frames on the USB camera that is not displayed and decode them when it becomes the active view",
+    )
+    parser.add_argument(
+        "--usb_fourcc",
+        default=None,
+        type=str,
+        help="pixel format requested from the USB cameras (e.g. MJPG); the camera default is used if omitted",
+    )
+    parser.add_argument(
+        "--target_latency_ms",
+        default=None,
+        type=float,
+        help="switch the detector input resolution (1280x704/960x544/640x352) to keep inference under this latency [ms]",
+    )
+    parser.add_argument(
+        "--warmup_iterations",
+        default=3,
+        type=int,
+        help="number of dummy inferences run before reporting ready",
     )
     args = parser.parse_args()
+    if args.detection_process and args.multi_camera_detection:
+        parser.error("--detection_process cannot be combined with --multi_camera_detection")
     return args
 
+def load_detector(
+    weight_path: str,
+    detector_backend: str,
+    timer: StartupTimer,
+    warmup_iterations: int = 3,
+    target_latency_ms: Optional[float] = None,
+):
+    """物体検出器を読み込み、ウォームアップの推論を行う (バックグラウンドのスレッドで実行する)"""
+    with timer.phase("import detector"):
+        from core_auto_app.detector.object_detector import YOLOXDetector
+    with timer.phase("load model"):
+        detector = YOLOXDetector(
+            weight_path,
+            score_thr=0.8,
+            nmsthre=0.45,
+            backend=detector_backend,
+            target_latency_ms=target_latency_ms,
+        )
+    with timer.phase("warm up detector"):
+        detector.warmup(warmup_iterations)
+    return detector
+
+def open_devices(
+    executor: ThreadPoolExecutor, stack: ExitStack, openers: Dict[str, Callable[[], object]]
+) -> Dict[str, object]:
+    """
+    デバイスを並列に初期化し、開けたものはすべて stack に登録する
+    (どれかの初期化に失敗した場合も、開けたデバイスは stack を抜けるときに閉じられる)
+    openers: デバイス名とデバイスを生成する関数の辞書
+    戻り値: デバイス名とデバイスの辞書
+    """
+    futures = {name: executor.submit(opener) for name, opener in openers.items()}
+    devices = {}
+    error = None
+    for name, future in futures.items():
+        try:
+            devices[name] = stack.enter_context(future.result())
+        except Exception as err:
+            print(f"Failed to open {name}: {err}")
+            error = error or err
+    if error is not None:
+        raise error
+    return devices
+
 def run_application(
     robot_port: str, 
     record_dir: Optional[str], 
     a_camera_device: int, 
     b_camera_device: int,
-    weight_path: str
+    weight_path: Optional[str],
+    detector_backend: str = "cuda",
+    detection_mode: str = "full",
+    full_frame_interval: int = 5,
+    multi_camera_detection: bool = False,
+    pipelined_detection: bool = False,
+    motion_gate: Optional[MotionGate] = None,
+    warmup_iterations: int = 3,
+    target_latency_ms: Optional[float] = None,
+    latency_compensation: bool = False,
+    depth_alignment: str = "full",
+    ballistic_solver: Optional[BallisticSolver] = None,
+    usb_standby: bool = False,
+    usb_fourcc: Optional[str] = None,
+    detection_process: bool = False,
+    serial_protocol: str = "ascii",
+    serial_io: str = "polling",
+    max_send_rate_hz: float = 200.0,
+    serial_telemetry_interval: float = 5.0,
 ) -> None:
-    """アプリケーションを実行する"""
-    with RealsenseCamera(record_dir, weight_path) as realsense_camera, \
-         UsbCamera(a_camera_device) as a_camera, \
-         UsbCamera(b_camera_device) as b_camera, \
-         CvPresenter() as presenter, \
-         SerialRobotDriver(robot_port) as robot_driver:
-        app = Application(realsense_camera, a_camera, b_camera, presenter, robot_driver)
+    """アプリケーションを実行する
+
+    モデルの読み込みとウォームアップをバックグラウンドで行いながら、各デバイスを並列に初期化する。
+    カメラの開始と検出器の準備ができたら段階ごとの所要時間を表示して "ready" を出力する。
+    """
+    timer = StartupTimer()
+
+    def open_realsense_camera():
+        with timer.phase("realsense camera"):
+            from core_auto_app.infra.realsense_camera import RealsenseCamera
+
+            # 検出器は読み込みが終わってから set_detector() で設定する
+            return RealsenseCamera(
+                record_dir,
+                None,
+                detector_backend=detector_backend,
+                detection_mode=detection_mode,
+                full_frame_interval=full_frame_interval,
+                detection_service=detection_service,
+                pipelined_detection=pipelined_detection,
+                motion_gate=motion_gate,
+                latency_compensation=latency_compensation,
+                depth_alignment=depth_alignment,
+                detection_worker=detection_worker,
+            )
+
+    def open_usb_camera(device: int, name: str):
+        with timer.phase(name):
+            from core_auto_app.infra.usb_camera import UsbCamera
+
+            return UsbCamera(device, detection_service, standby_when_inactive=usb_standby, fourcc=usb_fourcc)
+
+    def open_robot_driver():
+        with timer.phase("robot driver"):
+            from core_auto_app.infra.serial_robot_driver import SerialRobotDriver
+
+            return SerialRobotDriver(
+                robot_port,
+                protocol=serial_protocol,
+                io_mode=serial_io,
+                max_send_rate_hz=max_send_rate_hz,
+                telemetry_interval=serial_telemetry_interval,
+            )
+
+    # モデルの読み込みとデバイスの初期化 (最大4つ) を同時に実行する
+    with ThreadPoolExecutor(max_workers=5) as executor, ExitStack() as stack:
+        detector_future = None
+        detection_worker = None
+        if weight_path is not None and detection_process:
+            # 検出器の読み込みとウォームアップもワーカープロセスで行う
+            # (カメラより後に停止するよう、最初に登録する)
+            from core_auto_app.detector.detection_worker import DetectionWorker, create_yolox_detector
+
+            detection_worker = stack.enter_context(
+                DetectionWorker(
+                    partial(create_yolox_detector, weight_path, detector_backend, warmup_iterations, target_latency_ms)
+                )
+            )
+            detection_worker.start()
+        elif weight_path is not None:
+            detector_future = executor.submit(
+                load_detector, weight_path, detector_backend, timer, warmup_iterations, target_latency_ms
+            )
+
+        detection_service = None
+        if multi_camera_detection:
+            # 全カメラの画像を1つの検出器でまとめて推論する（Realsense側の検出スレッドは使わない）
+            from core_auto_app.detector.detection_service import DetectionService
+
+            detection_service = DetectionService()
+
+        devices = open_devices(
+            executor,
+            stack,
+            {
+                "realsense camera": open_realsense_camera,
+                "camera A": lambda: open_usb_camera(a_camera_device, "camera A"),
+                "camera B": lambda: open_usb_camera(b_camera_device, "camera B"),
+                "robot driver": open_robot_driver,
+            },
+        )
+        # ウィンドウはメインスレッドで作成する
+        with timer.phase("presenter"):
+            from core_auto_app.infra.cv_presenter import CvPresenter
+
+            presenter = stack.enter_context(CvPresenter())
+        if detection_service is not None:
+            # カメラより先に停止するよう、最後に登録する
+            stack.enter_context(detection_service)
+
+        app = Application(
+            devices["realsense camera"],
+            devices["camera A"],
+            devices["camera B"],
+            presenter,
+            devices["robot driver"],
+            ballistic_solver=ballistic_solver,
+            send_latency_info=latency_compensation,
+        )
+        with timer.phase("start cameras"):
+            app.start()
+
+        if detector_future is not None:
+            with timer.phase("wait for detector"):
+                detector = detector_future.result()
+            if detection_service is not None:
+                detection_service.set_detector(detector)
+            else:
+                devices["realsense camera"].set_detector(detector)
+        if detection_service is not None:
+            detection_service.start()
+        if detection_worker is not None:
+            with timer.phase("wait for detector"):
+                detection_worker.wait_until_ready()
+
+        print(timer.report())
+        print("ready")
         app.spin()
 
 def main():
@@ -88,7 +413,31 @@ def main():
         robot_port=args.robot_port,
         a_camera_device=a_camera_device,
         b_camera_device=b_camera_device,
-        weight_path=args.weight_path
+        weight_path=args.weight_path,
+        detector_backend=args.detector_backend,
+        detection_mode=args.detection_mode,
+        full_frame_interval=args.full_frame_interval,
+        multi_camera_detection=args.multi_camera_detection,
+        pipelined_detection=args.pipelined_detection,
+        motion_gate=MotionGate(args.motion_threshold, args.motion_max_interval) if args.motion_gate else None,
+        warmup_iterations=args.warmup_iterations,
+        target_latency_ms=args.target_latency_ms,
+        latency_compensation=args.latency_compensation,
+        depth_alignment=args.depth_alignment,
+        ballistic_solver=BallisticSolver(
+            args.muzzle_velocity,
+            args.drag_coefficient,
+            tuple(args.muzzle_offset),
+            camera_tilt_deg=args.camera_tilt_deg,
+            camera_on_launcher=args.camera_on_launcher,
+        ) if args.ballistic_solution else None,
+        usb_standby=args.usb_standby,
+        usb_fourcc=args.usb_fourcc,
+        detection_process=args.detection_process,
+        serial_protocol=args.serial_protocol,
+        serial_io=args.serial_io,
+        max_send_rate_hz=args.max_send_rate_hz,
+        serial_telemetry_interval=args.serial_telemetry_interval,
     )
 
 if __name__ == "__main__":
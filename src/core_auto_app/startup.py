@@ -0,0 +1,47 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+
+class StartupTimer:
+    """起動処理の段階ごとの所要時間を計測するクラス
+
+    並列に実行する段階があるので、各段階の開始・終了時刻を起動開始からの経過時間で記録する。
+    phase() は別スレッドから呼んでもよい。
+    """
+
+    def __init__(self):
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._phases: List[Tuple[str, float, float]] = []  # (段階名, 開始[秒], 終了[秒])
+
+    @contextmanager
+    def phase(self, name: str):
+        """with文で囲んだ処理の所要時間を name として記録する"""
+        start = time.perf_counter() - self._origin
+        try:
+            yield
+        finally:
+            end = time.perf_counter() - self._origin
+            with self._lock:
+                self._phases.append((name, start, end))
+
+    def elapsed(self) -> float:
+        """起動開始からの経過時間[秒]"""
+        return time.perf_counter() - self._origin
+
+    def get_phases(self) -> List[Tuple[str, float, float]]:
+        """記録した (段階名, 開始[秒], 終了[秒]) を開始時刻順に返す"""
+        with self._lock:
+            return sorted(self._phases, key=lambda phase: phase[1])
+
+    def report(self) -> str:
+        """段階ごとの所要時間と起動全体の所要時間を表にした文字列を返す"""
+        phases = self.get_phases()
+        width = max([len(name) for name, _, _ in phases] + [5])
+        lines = ["startup timing:"]
+        for name, start, end in phases:
+            lines.append(f"  {name:<{width}} {start:7.2f}s -> {end:7.2f}s ({end - start:6.2f}s)")
+        lines.append(f"  {'total':<{width}} {self.elapsed():7.2f}s")
+        return "\n".join(lines)
@@ -0,0 +1,56 @@
+from core_auto_app.detector.adaptive_resolution import AdaptiveResolutionController
+
+
+def record_many(controller: AdaptiveResolutionController, latency_ms: float, count: int):
+    for _ in range(count):
+        size = controller.record(latency_ms)
+    return size
+
+
+def test_downscale_when_over_budget():
+    """推論時間が目標を超え続けると1段ずつ小さいサイズに切り替えるテスト"""
+    controller = AdaptiveResolutionController(target_latency_ms=30.0, window=5)
+    assert controller.current_size == (704, 1280)
+
+    assert record_many(controller, 40.0, 5) == (544, 960)
+    assert record_many(controller, 40.0, 4) == (544, 960)  # 切り替え後は window 回計測してから判断する
+    assert record_many(controller, 40.0, 1) == (352, 640)
+    assert record_many(controller, 40.0, 5) == (352, 640)  # 最小サイズより小さくはしない
+
+
+def test_upscale_when_headroom():
+    """大きいサイズでも目標に収まる見込みなら戻すテスト"""
+    controller = AdaptiveResolutionController(target_latency_ms=30.0, window=5)
+    record_many(controller, 40.0, 5)
+    assert controller.current_size == (544, 960)
+
+    # 704x1280 は 544x960 の約1.73倍の画素数: 12ms → 約20.7ms で 30 * 0.8 に収まる
+    assert record_many(controller, 12.0, 5) == (704, 1280)
+
+
+def test_prefer_high_resolution_for_small_target():
+    """小さい標的を追跡中は目標を緩めて高い解像度を保つテスト"""
+    controller = AdaptiveResolutionController(target_latency_ms=30.0, window=5, small_target_budget=1.5)
+    controller.set_target(box_height=40)
+    assert controller.prefers_high_resolution
+    assert record_many(controller, 40.0, 5) == (704, 1280)
+
+    # 近くの大きい標的に変われば通常の目標で判断する
+    controller.set_target(box_height=200, distance_m=1.0)
+    assert record_many(controller, 40.0, 5) == (544, 960)
+
+    controller.set_target(box_height=200, distance_m=6.0)
+    assert controller.prefers_high_resolution
+
+
+def test_history_and_stats():
+    controller = AdaptiveResolutionController(target_latency_ms=30.0, window=2)
+    controller.record(40.0, now=1.0)
+    controller.record(40.0, now=2.0)
+    controller.record(20.0, now=3.0)
+
+    history = controller.get_history()
+    assert history == [(1.0, (704, 1280), 40.0), (2.0, (704, 1280), 40.0), (3.0, (544, 960), 20.0)]
+    stats = controller.get_stats()
+    assert stats["size"] == (544, 960)
+    assert stats["latency_ms"] == {(704, 1280): (2, 40.0), (544, 960): (1, 20.0)}
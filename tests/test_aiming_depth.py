@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from core_auto_app.detector.aiming.depth_sampling import deproject_pixels, sample_box_depths
+
+
+def make_intrinsics(model="none"):
+    return SimpleNamespace(ppx=640.0, ppy=360.0, fx=900.0, fy=900.0, model=model, coeffs=[0.0] * 5)
+
+
+def test_depth_survives_holes():
+    """ボックスの中心や一部が欠損していても、残りの画素から深度が求まるテスト"""
+    rng = np.random.default_rng(0)
+    depth = np.full((720, 1280), 5000, dtype=np.uint16)
+    depth[300:400, 600:660] = 2000
+    depth[rng.random(depth.shape) < 0.4] = 0
+    depth[350, 630] = 0  # 中心の画素
+
+    depths = sample_box_depths(depth, [(600, 300, 660, 400)])
+    assert depths[0] == 2.0
+
+
+def test_all_holes_is_nan():
+    """有効な画素が1つもないボックスだけnanになるテスト"""
+    depth = np.full((100, 100), 1500, dtype=np.uint16)
+    depth[10:30, 10:30] = 0
+    depths = sample_box_depths(depth, [(10, 10, 30, 30), (50, 50, 70, 70)])
+    assert np.isnan(depths[0])
+    assert depths[1] == 1.5
+
+
+def test_percentile_matches_numpy():
+    """分位点が有効な画素に対する np.percentile と一致するテスト"""
+    rng = np.random.default_rng(1)
+    depth = rng.integers(0, 4000, size=(64, 64)).astype(np.uint16)
+    box = (0, 0, 63, 63)
+    depths = sample_box_depths(depth, [box], shrink=1.0, grid_size=64, percentile=20.0, depth_scale=1.0)
+    valid = depth[depth > 0]
+    assert abs(depths[0] - np.percentile(valid, 20.0)) < 1e-6
+
+
+def test_deproject_pinhole():
+    """歪みのない内部パラメータで、ピンホールモデルの逆投影になるテスト"""
+    intrinsics = make_intrinsics("distortion.inverse_brown_conrady")
+    points = deproject_pixels(intrinsics, [(640, 360), (1090, 135)], [1.0, 2.0])
+    np.testing.assert_allclose(points, [(0.0, 0.0, 1.0), (1.0, -0.5, 2.0)])
+
+
+def test_roi_depth_matches_full_alignment():
+    """ROIだけの整列が全体の整列の一部と一致し、視差でずれた標的の深度が求まるテスト"""
+    from core_auto_app.detector.aiming.roi_depth import RoiDepthAligner
+
+    intrinsics = make_intrinsics("brown_conrady")
+    intrinsics.width, intrinsics.height = 1280, 720
+    depth_to_color = SimpleNamespace(rotation=[1, 0, 0, 0, 1, 0, 0, 0, 1], translation=[0.015, 0.0, 0.0])
+    aligner = RoiDepthAligner(intrinsics, intrinsics, depth_to_color)
+
+    depth = np.full((720, 1280), 3000, dtype=np.uint16)
+    depth[300:400, 600:700] = 1500  # カラー画像では 900 * 0.015 / 1.5 = 9px 右にずれる
+    roi = (600, 300, 700, 400)
+    aligned_roi = aligner.align(depth, roi)
+    np.testing.assert_array_equal(aligned_roi, aligner.align(depth)[300:400, 600:700])
+    # 背景は 4.5px ずれるので、その間は手前の物体に隠れていた部分 (欠損) になる
+    assert (aligned_roi[:, 9:] == 1500).all() and (aligned_roi[:, :5] == 3000).all()
+
+    depths = aligner.sample_depths(depth, [roi, (100, 100, 200, 200)])
+    np.testing.assert_allclose(depths, [1.5, 3.0])
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from core_auto_app.detector.aiming.aiming_target_selector import AimingTargetSelector
+
+
+def box(cx, cy, w=40, h=80, t_id=1):
+    return (cx - w // 2, cy - h // 2, cx + w // 2, cy + h // 2, t_id)
+
+
+def test_nearest_to_center_and_tie_breaks():
+    """画像中心に近い物体を選び、同じ距離なら前の対象、次に横幅の大きい物体を優先するテスト"""
+    selector = AimingTargetSelector(hysteresis=0.0)
+    assert selector.select_target([box(900, 360, t_id=1), box(700, 360, t_id=2)]) == (700, 360)
+    assert selector.current_target_id == 2
+
+    # 同じ距離: 横幅の大きい物体
+    selector = AimingTargetSelector(hysteresis=0.0)
+    selector.select_target([box(600, 360, w=40, t_id=1), box(680, 360, w=60, t_id=2)])
+    assert selector.current_target_id == 2
+    # 同じ距離: 前の対象
+    selector.select_target([box(600, 360, w=60, t_id=1), box(680, 360, w=40, t_id=2)])
+    assert selector.current_target_id == 2
+    assert selector.select_target([]) is None and selector.current_target_id is None
+
+
+def test_hysteresis_keeps_previous_target():
+    """ほぼ同じ距離の物体の間では照準が切り替わらず、十分に近い物体には切り替わるテスト"""
+    selector = AimingTargetSelector(hysteresis=0.02)  # 対角線の半分 (約734px) の2% ≒ 15px
+    selector.select_target([box(650, 360, t_id=1), box(700, 360, t_id=2)])
+    assert selector.current_target_id == 1
+    # 2が少しだけ近くなっても1のまま
+    selector.select_target([box(660, 360, t_id=1), box(630, 360, t_id=2)])
+    assert selector.current_target_id == 1
+    # 十分に近くなったら切り替える
+    selector.select_target([box(700, 360, t_id=1), box(640, 360, t_id=2)])
+    assert selector.current_target_id == 2
+
+
+def test_weights_change_at_runtime():
+    """大きさ・深度・追跡の長さの重みを実行中に変えると選ぶ物体が変わるテスト"""
+    selector = AimingTargetSelector(hysteresis=0.0)
+    objects = [box(650, 360, w=20, h=40, t_id=1), box(700, 360, w=100, h=200, t_id=2)]
+    assert selector.select_target(objects) == (650, 360)
+
+    selector.set_weights(size=1.0)
+    assert selector.select_target(objects) == (700, 360)
+
+    selector.set_weights(size=0.0, depth=1.0)
+    assert selector.select_target(objects, depths=[1.0, 8.0]) == (650, 360)
+    assert selector.select_target(objects, depths=[np.nan, 2.0]) == (700, 360)  # 不明は遠いとみなす
+
+    selector = AimingTargetSelector(hysteresis=0.0, weights={"age": 1.0}, age_frames=10)
+    for _ in range(10):
+        selector.select_target([box(700, 360, t_id=1)])
+    assert selector.select_target([box(700, 360, t_id=1), box(650, 360, t_id=2)]) == (700, 360)
+    assert selector.get_weights()["age"] == 1.0
+    with pytest.raises(ValueError):
+        selector.set_weights(unknown=1.0)
@@ -0,0 +1,86 @@
+import math
+
+from core_auto_app.detector.aiming.ballistics import BallisticSolver, BallisticTable
+
+
+def vacuum_pitch(distance, height, velocity, gravity=9.81):
+    """真空中で (distance, height) に届く低い弾道の仰角[deg]と飛翔時間[s]"""
+    v2 = velocity * velocity
+    tan = (v2 - math.sqrt(v2 * v2 - gravity * (gravity * distance * distance + 2 * height * v2))) / (gravity * distance)
+    pitch = math.atan(tan)
+    return math.degrees(pitch), distance / (velocity * math.cos(pitch))
+
+
+def test_table_matches_vacuum_solution():
+    """空気抵抗なしの表が解析解と一致するテスト"""
+    table = BallisticTable(15.0)
+    for distance, height in [(2.0, 0.3), (5.5, 1.2), (8.0, -0.4)]:
+        pitch_deg, flight_time = table.lookup(distance, height)
+        expected_pitch, expected_time = vacuum_pitch(distance, height, 15.0)
+        assert abs(pitch_deg - expected_pitch) < 0.05
+        assert abs(flight_time - expected_time) < 0.005
+    # 届かない距離と表の範囲外
+    assert BallisticTable(5.0).lookup(9.0, 2.0) is None
+    assert table.lookup(20.0, 0.0) is None
+
+
+def test_drag_needs_higher_pitch():
+    vacuum = BallisticTable(15.0).lookup(6.0, 0.5)
+    drag = BallisticTable(15.0, drag_coefficient=0.05).lookup(6.0, 0.5)
+    assert drag[0] > vacuum[0] and drag[1] > vacuum[1]
+
+
+def test_solver_leads_moving_target_and_rebuilds_on_drift():
+    """右に動く標的では右にリードし、射出速度がずれたら表を作り直すテスト"""
+    solver = BallisticSolver(15.0, rebuild_in_background=False)
+    still = solver.solve((0.0, -0.5, 5.0))
+    assert abs(still.yaw_deg) < 1e-9 and still.lead_deg == 0.0
+    moving = solver.solve((0.0, -0.5, 5.0), (2.0, 0.0, 0.0))
+    expected_lead = math.degrees(math.atan2(2.0 * moving.flight_time, 5.0))
+    assert abs(moving.lead_deg - expected_lead) < 0.1
+
+    solver.set_muzzle_velocity(15.2)  # 許容範囲内
+    assert solver.rebuild_count == 0
+    solver.set_muzzle_velocity(12.0)
+    assert solver.rebuild_count == 1 and solver.table_muzzle_velocity == 12.0
+    assert solver.solve((0.0, -0.5, 5.0)).pitch_deg > still.pitch_deg
+
+
+def test_lookup_on_last_grid_row_and_column():
+    """表の最大の距離・高さちょうどの格子点も引けるテスト"""
+    table = BallisticTable(15.0)
+    max_distance, max_height = table.distances[-1], table.heights[-1]
+    for distance, height in [(max_distance, 0.5), (4.0, max_height), (max_distance, max_height)]:
+        pitch_deg, flight_time = table.lookup(distance, height)
+        expected_pitch, expected_time = vacuum_pitch(distance, height, 15.0)
+        assert abs(pitch_deg - expected_pitch) < 0.05
+        assert abs(flight_time - expected_time) < 0.005
+    assert table.lookup(max_distance + table_step(table), 0.5) is None
+    assert table.lookup(4.0, max_height + table_step(table)) is None
+
+
+def table_step(table):
+    return table.distances[1] - table.distances[0]
+
+
+def test_launcher_pitch_rotates_camera_target():
+    """カメラが発射機と一緒に上を向くと、正面の標的はその分高い位置にあるとして解くテスト"""
+    solver = BallisticSolver(15.0, camera_on_launcher=True, rebuild_in_background=False)
+    level = solver.solve((0.0, 0.0, 5.0))
+    solver.set_launcher_pitch(10.0)
+    tilted = solver.solve((0.0, 0.0, 5.0))
+    assert tilted.pitch_deg > level.pitch_deg + 5.0
+
+    # 水平に取り付けたカメラで同じ標的を見た場合と同じ解になる
+    pitch = math.radians(10.0)
+    expected = BallisticSolver(15.0, rebuild_in_background=False).solve(
+        (0.0, -5.0 * math.sin(pitch), 5.0 * math.cos(pitch))
+    )
+    assert abs(tilted.pitch_deg - expected.pitch_deg) < 1e-9
+    assert abs(tilted.flight_time - expected.flight_time) < 1e-9
+
+    # camera_on_launcher でなければ発射機の仰角は使わず、取り付けの仰角だけを使う
+    fixed = BallisticSolver(15.0, camera_tilt_deg=10.0, rebuild_in_background=False)
+    fixed.set_launcher_pitch(25.0)
+    assert fixed.camera_pitch_deg == 10.0
+    assert abs(fixed.solve((0.0, 0.0, 5.0)).pitch_deg - expected.pitch_deg) < 1e-9
@@ -0,0 +1,38 @@
+import random
+
+from core_auto_app.domain.clock_sync import ClockOffsetEstimator
+
+TRUE_OFFSET_MS = 5000.0  # ホストの時刻 - デバイスの時計
+MIN_TRANSPORT_MS = 2.0
+
+
+def test_offset_is_stable_under_arrival_jitter():
+    """到着時刻が揺らいでも推定した時計の差が安定し、host_time・current_timestamp が単調に増えるテスト"""
+    rng = random.Random(0)
+    estimator = ClockOffsetEstimator()
+    offsets, host_times, current_timestamps = [], [], []
+    for i in range(300):
+        device_ts = 1000.0 + i * 1000.0 / 30.0
+        arrival = device_ts + TRUE_OFFSET_MS + MIN_TRANSPORT_MS + rng.uniform(0.0, 15.0)
+        offset = estimator.update(device_ts, arrival)
+        offsets.append(offset)
+        host_times.append(device_ts + offset)  # RealsenseCamera.host_time()
+        current_timestamps.append(arrival - offset)  # RealsenseCamera.current_timestamp()
+
+    assert all(b > a for a, b in zip(host_times, host_times[1:]))
+    assert all(b >= a for a, b in zip(current_timestamps, current_timestamps[1:]))
+    # 数秒で最小の転送遅延に収束し、その後は到着時刻の揺らぎ (15ms) がほとんど入らない
+    settled = offsets[100:]
+    assert max(settled) - min(settled) < 1.0
+    assert TRUE_OFFSET_MS + MIN_TRANSPORT_MS <= min(settled) < TRUE_OFFSET_MS + MIN_TRANSPORT_MS + 1.0
+
+
+def test_offset_follows_clock_drift():
+    """デバイスの時計が遅れていく場合も推定値が追従するテスト"""
+    estimator = ClockOffsetEstimator(drift_ms_per_sec=0.05)
+    for i in range(30 * 120):  # 2分
+        host_capture = i * 1000.0 / 30.0
+        device_ts = host_capture * (1.0 - 20e-6)  # 20ppm 遅い
+        offset = estimator.update(device_ts, host_capture + TRUE_OFFSET_MS + MIN_TRANSPORT_MS)
+    expected = TRUE_OFFSET_MS + MIN_TRANSPORT_MS + host_capture * 20e-6
+    assert abs(offset - expected) < 0.2
@@ -0,0 +1,61 @@
+import threading
+import time
+
+import numpy as np
+
+from core_auto_app.detector.detection_service import DetectionService
+from core_auto_app.domain.messages import FrameData
+
+
+class FakeCamera:
+    """publish() で公開したフレームを wait_for_frame() で返すカメラ"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frame = None
+        self.source_calls = 0
+
+    def publish(self, frame_id):
+        with self._lock:
+            self._frame = FrameData(frame_id, frame_id * 100.0, np.zeros((8, 8, 3), dtype=np.uint8))
+
+    def wait_for_frame(self, last_frame_id, timeout=0):
+        with self._lock:
+            self.source_calls += 1
+            if self._frame is None or self._frame.frame_id <= last_frame_id:
+                return None
+            return self._frame
+
+
+class CountingDetector:
+    """推論した時刻を記録し、何も検出しない検出器"""
+
+    def __init__(self):
+        self.predict_times = []
+
+    def predict_batch(self, frames, target_classes):
+        self.predict_times.append(time.perf_counter())
+        return [[] for _ in frames]
+
+
+def test_service_waits_for_frame_notification():
+    """新しいフレームがなければ取得し直さずに待ち、通知が来たらすぐに検出するテスト"""
+    camera = FakeCamera()
+    detector = CountingDetector()
+    with DetectionService(detector) as service:
+        subscription = service.subscribe("camera", camera.wait_for_frame)
+        service.start()
+        time.sleep(0.3)
+        # 通知がなければ時間切れ (0.1秒) のときだけ取得し直す
+        assert camera.source_calls <= 5
+
+        camera.publish(1)
+        published = time.perf_counter()
+        subscription.notify_new_frame()
+        deadline = published + 1.0
+        while not detector.predict_times and time.perf_counter() < deadline:
+            time.sleep(0.001)
+
+    assert len(detector.predict_times) == 1
+    assert detector.predict_times[0] - published < 0.05
+    assert subscription.get_detection_frame().frame_id == 1
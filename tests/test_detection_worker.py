@@ -0,0 +1,101 @@
+import threading
+import time
+
+import numpy as np
+
+from core_auto_app.detector.detection_worker import DetectionWorker, SeqlockBuffer
+from core_auto_app.domain.messages import FrameData
+
+SHAPE = (48, 64, 3)
+
+
+class BrightBoxDetector:
+    """明るい画素を囲むボックスを1つ返す検出器 (ワーカープロセスの中で作る)"""
+
+    def predict(self, frame, target_classes=None):
+        ys, xs = np.nonzero(frame[:, :, 0] > 128)
+        if len(xs) == 0:
+            return []
+        return [(xs.min(), ys.min(), xs.max() + 1, ys.max() + 1, 0.9, target_classes[0])]
+
+
+def make_frame(frame_id, x):
+    color = np.zeros(SHAPE, dtype=np.uint8)
+    color[10:20, x:x + 10] = 255
+    return FrameData(frame_id, frame_id * 100.0, color)
+
+
+def test_seqlock_rejects_read_during_write():
+    """書き込み中 (seq が奇数) の値は読まないテスト"""
+    writer = SeqlockBuffer((4,), np.float64)
+    reader = SeqlockBuffer((4,), np.float64, writer.name)
+    try:
+        seq = writer.write([1, 2, 3, 4])
+        out = np.empty(4)
+        assert reader.read(out) == seq and out.tolist() == [1, 2, 3, 4]
+        writer._seq[0] += 1  # 書き込みの途中で止まった状態
+        assert reader.read(out) is None
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_worker_tracks_frames_in_another_process():
+    """別プロセスで検出・追跡した結果と、外挿した位置を取得できるテスト"""
+    frames = [make_frame(i, 2 * i) for i in range(1, 11)]
+
+    def source(last_frame_id):
+        time.sleep(0.02)
+        return frames[last_frame_id] if last_frame_id < len(frames) else None
+
+    worker = DetectionWorker(BrightBoxDetector, frame_shape=SHAPE)
+    worker.start()
+    try:
+        assert worker.wait_until_ready(timeout=30.0)
+        worker.set_source(source)
+        deadline = time.time() + 10.0
+        while time.time() < deadline:
+            frame = worker.get_detection_frame()
+            if frame is not None and frame.frame_id == len(frames):
+                break
+            time.sleep(0.01)
+        assert worker.get_detection_frame().frame_id == len(frames)
+        (x1, y1, x2, y2, track_id), = worker.get_detection_results()
+        assert abs(x1 - 20) <= 2 and abs(y1 - 10) <= 2
+        assert worker.get_aiming_target() == ((x1 + x2) // 2, (y1 + y2) // 2)
+        # 右に 2px/100ms で動いているので、1秒後は20px右にある
+        predicted = worker.predict_aiming_target(frames[-1].timestamp + 1000.0)
+        assert predicted[0] - worker.get_aiming_target()[0] > 10
+    finally:
+        worker.stop()
+    assert worker.get_stats()["sent"] == len(frames)
+
+
+def test_worker_detects_posted_frame_promptly():
+    """フレームを置いたらイベントで起きたワーカーがすぐに検出し、複数のスレッドから結果を読めるテスト"""
+    posted = threading.Event()
+    frame = make_frame(1, 5)
+
+    def source(last_frame_id):
+        if last_frame_id >= 1 or not posted.wait(0.1):
+            return None
+        return frame
+
+    worker = DetectionWorker(BrightBoxDetector, frame_shape=SHAPE)
+    worker.start()
+    try:
+        assert worker.wait_until_ready(timeout=30.0)
+        worker.set_source(source)
+        readers = [threading.Thread(target=worker.get_detection_results) for _ in range(4)]
+        start = time.perf_counter()
+        posted.set()
+        for reader in readers:
+            reader.start()
+        while worker.get_detection_frame() is None and time.perf_counter() - start < 5.0:
+            time.sleep(0.001)
+        for reader in readers:
+            reader.join()
+        assert worker.get_detection_frame().frame_id == 1
+        assert time.perf_counter() - start < 0.5
+    finally:
+        worker.stop()
@@ -0,0 +1,70 @@
+import threading
+
+import numpy as np
+
+from core_auto_app.domain.frame_ring import FrameRing, writable
+
+
+def publish(ring, value, shape=(4, 4, 3)):
+    slot = ring.acquire(shape)
+    slot.array.fill(value)
+    ring.publish(slot)
+
+
+def test_views_are_read_only_and_pin_slots():
+    """読み出した配列は読み取り専用で、解放されるまでそのスロットは上書きされないテスト"""
+    ring = FrameRing(num_slots=3)
+    publish(ring, 1)
+    held = ring.get_latest()
+    assert not held.flags.writeable
+    part = held[1:3]  # スライスも同じスロットを参照し続ける
+    del held
+    for value in range(2, 10):
+        publish(ring, value)
+    assert (part == 1).all()
+    assert ring.get_stats()["overflows"] == 0
+
+    copied = writable(part)
+    copied[:] = 0
+    assert copied.flags.writeable and (part == 1).all()
+
+    del part
+    assert ring.get_stats()["in_use"] == 1  # 最新のフレームのみ
+
+
+def test_overflow_when_all_slots_are_held():
+    ring = FrameRing(num_slots=2)
+    publish(ring, 1)
+    held = [ring.get_latest()]
+    publish(ring, 2)
+    held.append(ring.get_latest())
+    publish(ring, 3)  # 空きがないので一時的なバッファを使う
+    assert ring.get_stats()["overflows"] == 1
+    assert [int(h[0, 0, 0]) for h in held] == [1, 2]
+    assert int(ring.get_latest()[0, 0, 0]) == 3
+
+
+def test_concurrent_readers_never_see_torn_frames():
+    """書き込みと複数スレッドの読み出しを並行しても、フレームが途中で書き換わらないテスト"""
+    ring = FrameRing(num_slots=4)
+    publish(ring, 0, shape=(64, 64, 3))
+    stop = threading.Event()
+    errors = []
+
+    def reader():
+        while not stop.is_set():
+            frame = ring.get_latest()
+            first = frame[0, 0, 0]
+            for _ in range(3):
+                if not (frame == first).all():
+                    errors.append(int(first))
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for value in range(1, 2000):
+        publish(ring, value % 256, shape=(64, 64, 3))
+    stop.set()
+    for thread in threads:
+        thread.join()
+    assert errors == []
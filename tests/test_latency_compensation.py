@@ -0,0 +1,46 @@
+from core_auto_app.detector.aiming.latency_compensation import AimLatencyCompensator
+from core_auto_app.detector.tracker_utils import ObjectTracker
+
+
+def make_tracker():
+    """x方向に 500px/s で動く物体を 30ms ごとに検出したトラッカー"""
+    tracker = ObjectTracker(fps=30.0)
+    for i in range(10):
+        timestamp = i * 30.0
+        x = int(100 + 0.5 * timestamp)
+        tracked = tracker.update([(x, 100, x + 40, 180, 0.9, 0)], timestamp)
+    return tracker, tracked[0]
+
+
+def test_extrapolate_to_send_time():
+    """撮影から送信までの遅延だけ先の位置に外挿するテスト"""
+    tracker, (x1, y1, x2, y2, track_id) = make_tracker()
+    detected = ((x1 + x2) // 2, (y1 + y2) // 2)
+    compensator = AimLatencyCompensator(enabled=True, max_horizon_ms=300.0)
+
+    aim = compensator.compensate(
+        detected, 270.0, 330.0, lambda t: tracker.predict_center(track_id, t), send_delay_ms=20.0
+    )
+    assert aim.latency_ms == 80.0  # 撮影 270ms → 送信 350ms
+    assert abs(aim.point[0] - (detected[0] + 40)) <= 2  # 500px/s * 80ms
+    assert aim.point[1] == detected[1]
+    assert abs(aim.confidence - (1.0 - 80.0 / 300.0)) < 1e-9
+    assert aim.capture_time == 270.0
+
+
+def test_disabled_keeps_detected_point():
+    """補償を無効にすると検出位置をそのまま使い、遅延と信頼度は同じように計算するテスト"""
+    tracker, (x1, y1, x2, y2, track_id) = make_tracker()
+    detected = ((x1 + x2) // 2, (y1 + y2) // 2)
+    compensator = AimLatencyCompensator(enabled=False)
+
+    aim = compensator.compensate(detected, 270.0, 330.0, lambda t: tracker.predict_center(track_id, t))
+    assert aim.point == detected
+    assert aim.latency_ms == 70.0  # 送信待ちの遅延は既定値の10ms
+
+
+def test_lost_target_falls_back_to_detection():
+    compensator = AimLatencyCompensator(enabled=True, max_horizon_ms=100.0)
+    aim = compensator.compensate((10, 20), 0.0, 500.0, lambda t: None)
+    assert aim.point == (10, 20)
+    assert aim.confidence == 0.0
@@ -0,0 +1,25 @@
+from core_auto_app.infra.serial_load_test import run_load_test
+
+
+def test_driver_recovers_from_corruption_and_disconnects():
+    """壊れたバイトと切断があっても、ドライバが受信・送信を続けて切断から回復するテスト"""
+    result = run_load_test(
+        duration=1.5,
+        protocol="binary",
+        serial_io="event",
+        update_rate_hz=100.0,
+        rate_hz=200.0,
+        burst_size=4,
+        corrupt_rate=0.05,
+        disconnect_interval=0.6,
+        disconnect_duration=0.2,
+    )
+    assert result["disconnects"] >= 1
+    assert result["reconnects"] >= 1
+    assert result["recovery_ms"]["max_ms"] < 500.0
+    # 壊れた状態以外はほぼ受信でき、照準の更新は切断中以外はすぐに届く
+    assert result["corrupted"] > 0
+    assert result["states_received"] > 0.5 * result["states_sent"]
+    assert result["updates_delivered"] > 0.6 * result["updates_set"]
+    assert result["update_latency_ms"]["p50_ms"] < 10.0
+    assert result["rtt_ms"]["count"] > 0
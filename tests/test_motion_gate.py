@@ -0,0 +1,41 @@
+import numpy as np
+
+from core_auto_app.detector.motion_gate import MotionGate
+from core_auto_app.domain.messages import RobotStateId
+
+
+def make_frame(value: int) -> np.ndarray:
+    return np.full((720, 1280, 3), value, dtype=np.uint8)
+
+
+def test_skip_static_scene():
+    """変化のないシーンでは推論を省略するテスト"""
+    gate = MotionGate(threshold=2.0, max_interval=10.0)
+    frame = make_frame(100)
+
+    assert gate.should_infer(frame, now=0.0)  # 最初のフレームは必ず推論
+    assert not gate.should_infer(frame, now=0.1)
+    assert not gate.should_infer(make_frame(101), now=0.2)  # 閾値未満の変化
+    assert gate.should_infer(make_frame(110), now=0.3)  # 閾値以上の変化
+    assert gate.get_stats() == {"inferred": 2, "skipped": 2}
+
+
+def test_max_interval():
+    """変化がなくても最大間隔ごとに推論するテスト"""
+    gate = MotionGate(threshold=2.0, max_interval=0.5)
+    frame = make_frame(100)
+
+    assert gate.should_infer(frame, now=0.0)
+    assert not gate.should_infer(frame, now=0.4)
+    assert gate.should_infer(frame, now=0.5)
+
+
+def test_idle_state_throttling():
+    """待機中の状態では変化があっても推論を間引くテスト"""
+    gate = MotionGate(threshold=2.0, max_interval=0.5, idle_interval=1.0)
+
+    assert gate.should_infer(make_frame(0), RobotStateId.DEFEATED, now=1.0)
+    assert not gate.should_infer(make_frame(200), RobotStateId.DEFEATED, now=1.5)
+    assert gate.should_infer(make_frame(0), RobotStateId.DEFEATED, now=2.0)
+    # 通常状態に戻れば変化に応じて推論する
+    assert gate.should_infer(make_frame(200), RobotStateId.NORMAL, now=2.1)
@@ -0,0 +1,58 @@
+import os
+import time
+import tty
+
+import pytest
+
+from core_auto_app.domain.messages import RobotStateId
+from core_auto_app.infra.serial_robot_driver import SerialRobotDriver
+
+
+@pytest.fixture()
+def openpty():
+    """pty の組 (マスターのfd, スレーブのデバイス名) を返すフィクスチャ"""
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    try:
+        yield master, os.ttyname(slave)
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+def read_available(master: int, wait: float) -> bytes:
+    """wait秒待ってからマスター側に届いているバイトを読む"""
+    time.sleep(wait)
+    os.set_blocking(master, False)
+    try:
+        return os.read(master, 4096)
+    except BlockingIOError:
+        return b""
+    finally:
+        os.set_blocking(master, True)
+
+
+def test_event_mode_sends_only_changed_values(openpty):
+    """"event" モードで受信した状態をすぐに解析し、変わった送信値だけをすぐに送るテスト"""
+    master, port = openpty
+    driver = SerialRobotDriver(port, io_mode="event", keepalive_interval=10.0)
+    try:
+        # 起動直後の最初の送信 (初期値)
+        assert read_available(master, 0.05) == b"0,0,0,0\n"
+
+        os.write(master, b"2,-15,12000,1,2,1,9,7\n")
+        time.sleep(0.05)
+        assert driver.get_robot_state().state_id == RobotStateId.NORMAL
+
+        driver.set_send_values(1, 2, 3, 4)
+        start = time.perf_counter()
+        assert os.read(master, 4096) == b"1,2,3,4\n"
+        assert time.perf_counter() - start < 0.05
+
+        # 同じ値は keepalive_interval が過ぎるまで送り直さない
+        driver.set_send_values(1, 2, 3, 4)
+        assert read_available(master, 0.05) == b""
+        assert driver.get_send_delay_ms() is not None
+    finally:
+        driver.close()
@@ -0,0 +1,72 @@
+import random
+
+from core_auto_app.domain.messages import RobotState, RobotStateId, RobotStateSnapshot
+from core_auto_app.infra.serial_protocol import (
+    AsciiCodec,
+    BinaryCodec,
+    BinaryFrameDecoder,
+    MSG_COMMAND,
+    MSG_STATE,
+    encode_frame,
+)
+
+STATE_FIELDS = (2, -15, 12000, 1, 2, 1, 0b1001, 7)
+EXPECTED_STATE = RobotStateSnapshot(
+    state_id=RobotStateId.NORMAL,
+    pitch_deg=-1.5,
+    muzzle_velocity=12.0,
+    reloaded_left_disks=1,
+    reloaded_right_disks=2,
+    video_id=1,
+    target_panel=True,
+    ready_to_fire=True,
+    reserved=7,
+)
+
+
+def test_ascii_and_binary_decode_the_same_state():
+    """同じ値を ASCII 形式とバイナリ形式で受信すると同じ状態になり、分割して届いても読めるテスト"""
+    ascii_codec = AsciiCodec()
+    line = b"2,-15,12000,1,2,1,9,7\n"
+    assert ascii_codec.feed(line[:5]) == []
+    assert ascii_codec.feed(line[5:]) == [EXPECTED_STATE]
+
+    binary_codec = BinaryCodec()
+    frame = encode_frame(MSG_STATE, *STATE_FIELDS)
+    assert binary_codec.feed(frame[:7]) == []
+    assert binary_codec.feed(frame[7:] + frame) == [EXPECTED_STATE, EXPECTED_STATE]
+
+    assert ascii_codec.feed(b"2,x,0,0,0,0,0,0\n1,2\n") == []
+    assert ascii_codec.parse_errors == 2
+
+
+def test_binary_decoder_resynchronizes_after_corruption():
+    """壊れたバイトや途中から受信したフレームを捨てて、次の正しいフレームから読み直すテスト"""
+    rng = random.Random(0)
+    frames = [encode_frame(MSG_STATE, i % 6, i, i * 10, 0, 0, 0, 0, i) for i in range(50)]
+    corrupted = bytearray(frames[10])
+    corrupted[8] ^= 0xFF
+    stream = b"\xa5\x5a\x01" + b"".join(frames[:10]) + bytes(corrupted) + frames[10][:9] + b"".join(frames[11:])
+
+    decoder = BinaryFrameDecoder()
+    messages = []
+    position = 0
+    while position < len(stream):
+        size = rng.randint(1, 40)
+        messages += decoder.feed(stream[position:position + size])
+        position += size
+    received = [fields[7] for _, fields in messages]
+    assert received == [i for i in range(50) if i != 10]
+    assert decoder.crc_errors >= 1
+
+    # 受け付けない種類のフレームは読み飛ばす
+    assert decoder.feed(encode_frame(MSG_COMMAND, 1, 2, 3, 4, 0)) == []
+
+
+def test_snapshot_converts_to_and_from_model():
+    """受信したスナップショットと pydantic のモデルを相互に変換できるテスト"""
+    model = EXPECTED_STATE.to_model()
+    assert isinstance(model, RobotState)
+    assert model.pitch_deg == -1.5 and model.target_panel and not model.auto_aim
+    assert RobotStateSnapshot.from_model(model) == EXPECTED_STATE
+    assert RobotStateSnapshot.from_model(RobotState()) == RobotStateSnapshot()
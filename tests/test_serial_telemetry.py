@@ -0,0 +1,43 @@
+from core_auto_app.infra.serial_telemetry import LatencyHistogram, SerialTelemetry, format_summary
+
+
+def test_histogram_percentiles():
+    """ヒストグラムのパーセンタイルが値の入っている区間の上限 (最大値を超えない) になるテスト"""
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) is None
+    for value in [0.8] * 98 + [15.0, 30.0]:
+        histogram.add(value)
+    stats = histogram.get_stats()
+    assert stats["count"] == 100
+    assert stats["p50_ms"] == 1.0
+    assert stats["p99_ms"] == 20.0
+    assert stats["max_ms"] == 30.0
+    assert stats["buckets"]["<=1"] == 98 and stats["buckets"]["<=50"] == 1
+
+
+def test_round_trip_time_and_rates():
+    """返ってきた通し番号から往復時間を求め、返事のない番号と頻度・最終受信からの時間を数えるテスト"""
+    telemetry = SerialTelemetry(max_pending=4, now=10.0)
+    first = telemetry.next_sequence(now=10.0)
+    second = telemetry.next_sequence(now=10.010)
+    telemetry.record_sent(now=10.010)
+    # 2番目の番号が返ってくると、1番目は返事がなかったものとする
+    telemetry.record_echo(second, now=10.015)
+    telemetry.record_echo(first, now=10.020)
+    telemetry.record_echo(0, now=10.020)
+    for i in range(100):
+        telemetry.record_received(19, 1, now=10.0 + i * 0.01)
+
+    stats = telemetry.get_stats(now=11.5)
+    assert stats["rtt_ms"]["count"] == 1
+    assert abs(stats["rtt_ms"]["max_ms"] - 5.0) < 1e-6
+    assert stats["unanswered"] == 1
+    assert stats["states_received"] == 100
+    assert abs(stats["since_last_state_sec"] - 0.51) < 1e-6
+    assert 60.0 < stats["states_per_sec"] < 110.0
+
+    # 返事を待つ番号が上限を超えたら古いものから捨てる
+    for _ in range(6):
+        telemetry.next_sequence(now=12.0)
+    assert telemetry.get_stats(now=12.0)["unanswered"] == 3
+    assert "rtt p50 5.0ms" in format_summary(telemetry.get_stats(now=12.0))
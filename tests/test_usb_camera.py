@@ -0,0 +1,45 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from core_auto_app.infra.usb_camera import UsbCamera
+
+
+@pytest.fixture
+def video_path(tmp_path):
+    path = str(tmp_path / "frames.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("MJPG writer is not available")
+    for i in range(3000):  # 待機中に読み切らない長さにする
+        writer.write(np.full((48, 64, 3), i % 256, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.001)
+    return condition()
+
+
+def test_standby_camera_grabs_without_decoding(video_path):
+    """待機中は grab() だけを行い、表示に切り替えるとデコードしたフレームを返すテスト"""
+    camera = UsbCamera(video_path, standby_when_inactive=True)
+    camera.set_active(False)
+    camera.start()
+    try:
+        assert wait_until(lambda: camera._grab_count > 0)
+        assert camera._decode_count == 0
+        assert camera.get_frame() is None
+
+        camera.set_active(True)
+        frame = camera.wait_for_frame(0, timeout=5.0)
+        assert frame is not None and frame.color.shape == (48, 64, 3)
+        assert not frame.color.flags.writeable
+        assert camera._decode_count > 0
+    finally:
+        camera.stop()
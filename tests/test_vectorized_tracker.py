@@ -0,0 +1,68 @@
+import numpy as np
+
+from core_auto_app.detector.tracker_utils import ObjectTracker, compute_iou
+from core_auto_app.detector.vectorized_tracker import compute_iou_matrix, match_greedy
+
+
+def test_iou_matrix_matches_pairwise_iou():
+    """IoU行列が組ごとのIoU計算と一致するテスト"""
+    boxes_a = [(0, 0, 10, 10), (5, 5, 15, 25), (100, 100, 120, 160)]
+    boxes_b = [(0, 0, 10, 10), (8, 0, 18, 10), (200, 200, 210, 210)]
+    iou = compute_iou_matrix(boxes_a, boxes_b)
+    assert iou.shape == (3, 3)
+    for i, a in enumerate(boxes_a):
+        for j, b in enumerate(boxes_b):
+            assert abs(iou[i, j] - compute_iou(a, b)) < 1e-4
+
+
+def test_match_greedy_is_one_to_one():
+    iou = np.array([[0.9, 0.8], [0.85, 0.05]])
+    rows, cols = match_greedy(iou, min_iou=0.1)
+    assert sorted(zip(rows.tolist(), cols.tolist())) == [(0, 0)]
+
+
+def test_tracker_keeps_ids_and_classes():
+    """移動する物体に同じトラックIDが付き続け、クラス情報を引けるテスト"""
+    tracker = ObjectTracker(fps=30.0)
+    for t in range(10):
+        detections = [
+            (100 + 2 * t, 100, 130 + 2 * t, 180, 0.9, 0),
+            (600, 300 - t, 640, 380 - t, 0.9, 1),
+        ]
+        tracked = tracker.update(detections)
+
+    assert sorted(obj[4] for obj in tracked) == [1, 2]
+    by_id = {obj[4]: obj[:4] for obj in tracked}
+    assert abs(by_id[1][0] - 118) <= 2
+    assert abs(by_id[2][1] - 291) <= 2
+    assert tracker.track_cls == {1: 0, 2: 1}
+    assert tracker.get_motions(tracked)[0][0] > 0
+
+
+def test_tracker_drops_lost_tracks():
+    """検出されなくなったトラックが出力されなくなるテスト"""
+    tracker = ObjectTracker(fps=30.0)
+    tracker.update([(100, 100, 130, 180, 0.9, 0)])
+    for _ in range(20):
+        tracked = tracker.update([])
+    assert tracked == []
+
+
+def test_variable_interval_updates():
+    """更新間隔が不規則でも、タイムスタンプから実際の速度で予測できるテスト"""
+    tracker = ObjectTracker(fps=30.0)
+    speed = 300.0  # px/s
+    timestamps = [0.0, 33.0, 100.0, 120.0, 250.0, 270.0, 400.0, 480.0, 500.0, 650.0]  # ms
+    for timestamp in timestamps:
+        x = 100 + speed * timestamp / 1000.0
+        tracked = tracker.update([(int(x), 100, int(x) + 30, 180, 0.9, 0)], timestamp)
+    assert [obj[4] for obj in tracked] == [1]
+
+    # 最後の検出から 100ms 後の位置は約 30px 先
+    predicted = tracker.predict(750.0)
+    assert len(predicted) == 1
+    expected_x1 = 100 + speed * 0.75
+    assert abs(predicted[0][0] - expected_x1) <= 3
+    assert predicted[0][4] == 1
+    # 予測だけでは状態は変わらない
+    assert tracker.predict(650.0)[0][0] == tracked[0][0]